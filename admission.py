@@ -0,0 +1,216 @@
+"""Admission control for logins and exam starts.
+
+At the start of a sitting every student signs in and starts the exam
+within the same minute. Left alone, each of those requests checks out a
+connection and queries the database at once, and the database slows down
+for everybody. AdmissionController lets at most `limit` of them run at a
+time per process and lines the rest up first come, first served.
+
+A waiting session is not parked on a thread for the whole wait: each
+script run waits a fraction of a second for a slot and otherwise shows the
+student their place in line and an estimated wait, then reruns and asks
+again. A session keeps its place across those reruns by presenting the
+same ticket; a ticket that stops asking for `abandon_after` seconds (the
+tab was closed) loses its place.
+
+Tickets wait in a deque in arrival order, each numbered as it joins, so a
+ticket's place is its number minus the number at the head of the line and
+costs O(1) to work out. Leavers are removed lazily as they reach the head.
+A freed slot wakes only the ticket(s) it goes to, each of which waits on
+its own condition, rather than every waiting thread.
+
+VerifiedLogins remembers a session's successful logins for a few minutes,
+so a student who signs out and back in, or whose login reruns, doesn't
+query users again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+# Smoothing of the average time a slot is held, used for wait estimates
+SERVICE_TIME_ALPHA = 0.2
+
+
+@dataclass(frozen=True)
+class Waiting:
+    """A ticket's place in line: 1 is next."""
+    position: int
+    queued: int
+    eta_seconds: float
+
+
+@dataclass
+class _Ticket:
+    number: int
+    present_until: float
+    cond: threading.Condition
+
+
+class AdmissionController:
+    def __init__(self, limit, abandon_after=10.0, initial_service_seconds=0.2):
+        self.limit = limit
+        self._abandon_after = abandon_after
+        self._service_seconds = initial_service_seconds
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        # (number, ticket) in arrival order; entries whose ticket has left
+        # (or rejoined under a new number) are skipped when they reach the head
+        self._line = deque()
+        self._tickets = {}
+        self._next_number = 0
+        self._stats = {
+            'admitted': 0,
+            'waited': 0,
+            'abandoned': 0,
+        }
+
+    def acquire(self, ticket, timeout):
+        """Take a slot for `ticket`, waiting up to `timeout` seconds for one.
+        Returns False if the ticket is still in line; it keeps its place
+        as long as it asks again within `abandon_after` seconds."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            entry = self._tickets.get(ticket)
+            waited = entry is not None
+            if entry is None:
+                entry = self._join(ticket)
+            # present until this wait ends; a ticket already in line keeps its place
+            entry.present_until = max(deadline, time.monotonic())
+            while True:
+                now = time.monotonic()
+                self._advance(now)
+                if self._position(entry) <= self.limit - len(self._in_flight):
+                    del self._tickets[ticket]
+                    self._in_flight[ticket] = now
+                    self._stats['admitted'] += 1
+                    if waited:
+                        self._stats['waited'] += 1
+                    # more than one slot may be free
+                    self._wake()
+                    return True
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                waited = True
+                entry.cond.wait(remaining)
+
+    def release(self, ticket):
+        with self._lock:
+            started = self._in_flight.pop(ticket, None)
+            if started is not None:
+                held = time.monotonic() - started
+                self._service_seconds += SERVICE_TIME_ALPHA * (held - self._service_seconds)
+            self._wake()
+
+    def cancel(self, ticket):
+        """Give up a ticket's place in line."""
+        with self._lock:
+            if self._tickets.pop(ticket, None) is not None:
+                self._wake()
+
+    def waiting(self, ticket):
+        """Waiting for a ticket in line, or None."""
+        with self._lock:
+            self._advance(time.monotonic())
+            entry = self._tickets.get(ticket)
+            if entry is None:
+                return None
+            position = self._position(entry)
+            # slots free up at limit per service time on average
+            eta = position * self._service_seconds / max(1, self.limit)
+            return Waiting(position, len(self._tickets), eta)
+
+    def _join(self, ticket):
+        entry = _Ticket(self._next_number, 0.0, threading.Condition(self._lock))
+        self._next_number += 1
+        self._tickets[ticket] = entry
+        self._line.append((entry.number, ticket))
+        return entry
+
+    def _live(self, number, ticket):
+        entry = self._tickets.get(ticket)
+        return entry is not None and entry.number == number
+
+    def _advance(self, now):
+        # drop leavers and abandoned tickets off the head of the line
+        while self._line:
+            number, ticket = self._line[0]
+            if self._live(number, ticket):
+                if now - self._tickets[ticket].present_until <= self._abandon_after:
+                    return
+                del self._tickets[ticket]
+                self._stats['abandoned'] += 1
+            self._line.popleft()
+
+    def _position(self, entry):
+        # 1 for the head; an upper bound when tickets behind the head have left
+        return entry.number - self._line[0][0] + 1
+
+    def _wake(self):
+        # wake the tickets that the free slots go to
+        self._advance(time.monotonic())
+        free = self.limit - len(self._in_flight)
+        for number, ticket in self._line:
+            if free <= 0:
+                break
+            if self._live(number, ticket):
+                self._tickets[ticket].cond.notify()
+                free -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['limit'] = self.limit
+            stats['in_flight'] = len(self._in_flight)
+            stats['queued'] = len(self._tickets)
+            stats['service_seconds'] = self._service_seconds
+        return stats
+
+
+class VerifiedLogins:
+    """Short-lived cache of successful logins, scoped to a session:
+    (session, user_type, username, password hash) -> user row. One
+    instance serves a whole process so its size is bounded, but a login
+    verified in one session is never reused by another. Entries expire
+    after `ttl` seconds, so a changed password or removed account stops
+    working within that time."""
+
+    def __init__(self, ttl=300.0, max_entries=10000):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _key(session, user_type, username, password_hash):
+        return hashlib.sha256(f"{session}\0{user_type}\0{username}\0{password_hash}".encode()).hexdigest()
+
+    def get(self, session, user_type, username, password_hash):
+        key = self._key(session, user_type, username, password_hash)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(key, None)
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            return dict(entry[1])
+
+    def put(self, session, user_type, username, password_hash, user):
+        key = self._key(session, user_type, username, password_hash)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, dict(user))
+            self._entries.move_to_end(key)
+            # least recently verified first
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
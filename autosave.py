@@ -0,0 +1,142 @@
+"""Debounced, coalesced autosave of exam answers.
+
+Answer changes from every session in the process are collected in memory,
+keyed by (attempt_id, question_id), so a student flipping between options
+only ever writes the latest choice. A background thread writes everything
+collected through the `flush` callback once changes have been quiet for
+`delay` seconds, or at the latest `max_delay` seconds after the oldest
+unsaved change, so a busy exam hall turns into one multi-row upsert every
+few seconds rather than a write per click.
+
+Unsaved changes live only in memory: a crash loses at most the last
+`max_delay` seconds of answers, which the student still has on screen.
+"""
+import threading
+import time
+
+
+class AnswerSaver:
+    def __init__(self, flush, delay=2.0, max_delay=10.0, retry_delay=2.0):
+        # flush([(attempt_id, question_id, answer or None)]) must raise on failure
+        self._flush = flush
+        self._delay = delay
+        self._max_delay = max_delay
+        self._retry_delay = retry_delay
+        self._pending = {}
+        self._first_change = None
+        self._last_change = None
+        self._cond = threading.Condition()
+        # held while writing, so batches reach the database in order
+        self._write_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self._stats = {
+            'recorded': 0,
+            'written': 0,
+            'batches': 0,
+            'flush_failures': 0,
+            'last_error': None,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='answer-autosave', daemon=True)
+        self._thread.start()
+        return self
+
+    def record(self, attempt_id, question_id, answer):
+        """Queue an answer change; None clears the answer."""
+        now = time.monotonic()
+        with self._cond:
+            self._pending[(attempt_id, question_id)] = answer
+            self._stats['recorded'] += 1
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._cond.notify()
+
+    def pending(self, attempt_id):
+        """Unsaved changes for one attempt, {question_id: answer or None}."""
+        with self._cond:
+            return {q: a for (att, q), a in self._pending.items() if att == attempt_id}
+
+    def _take(self, attempt_id=None):
+        # remove and return pending changes (all of them, or one attempt's)
+        if attempt_id is None:
+            batch, self._pending = self._pending, {}
+        else:
+            keys = [k for k in self._pending if k[0] == attempt_id]
+            batch = {k: self._pending.pop(k) for k in keys}
+        if not self._pending:
+            self._first_change = None
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._flush([(att, q, a) for (att, q), a in batch.items()])
+        except Exception as e:
+            with self._cond:
+                # put the batch back under anything changed since
+                for key, answer in batch.items():
+                    self._pending.setdefault(key, answer)
+                if self._first_change is None:
+                    self._first_change = time.monotonic()
+                self._stats['flush_failures'] += 1
+                self._stats['last_error'] = str(e)
+            return False
+        with self._cond:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+        return True
+
+    def flush_attempt(self, attempt_id):
+        """Write one attempt's pending changes now (e.g. on submit). Returns
+        False if the write failed; the changes then stay queued."""
+        with self._write_lock:
+            with self._cond:
+                batch = self._take(attempt_id)
+            return self._write(batch) if batch else True
+
+    def discard(self, attempt_id):
+        """Drop one attempt's pending changes, e.g. once its final answers
+        were stored with the submitted attempt."""
+        with self._write_lock:
+            with self._cond:
+                self._take(attempt_id)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    return
+                # debounce: wait for a quiet spell, bounded by max_delay
+                while self._pending and not self._stopping:
+                    now = time.monotonic()
+                    due = min(self._last_change + self._delay, self._first_change + self._max_delay)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+            with self._write_lock:
+                with self._cond:
+                    batch = self._take()
+                ok = self._write(batch) if batch else True
+            if not ok:
+                with self._cond:
+                    if self._stopping:
+                        return
+                time.sleep(self._retry_delay)
+
+    def stop(self, timeout=10):
+        """Write what is pending (best effort within `timeout`) and stop."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
@@ -0,0 +1,241 @@
+"""Concurrent-student load test for the data layer in online.py.
+
+Each simulated student runs exam sessions against a seeded local database:
+
+    authenticate -> exam listing -> get_exam_questions -> check_exam_taken
+    -> submit_exam
+
+and a fraction of sessions also run the admin get_all_results() query.
+Per-operation throughput and p50/p95/p99 latency are printed and saved as
+JSON, and a previous run can be passed with --compare to see the change.
+
+    python seed.py
+    python benchmark.py --students 50 --sessions 20 --output bench.json
+    python benchmark.py --students 50 --sessions 20 --compare bench.json
+
+Sessions submit real results, so only run this against a disposable
+database.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import online
+import seed
+
+OPERATIONS = (
+    'authenticate',
+    'get_exam_catalog',
+    'get_all_exams',
+    'get_exam_questions',
+    'check_exam_taken',
+    'submit_exam',
+    'get_all_results',
+)
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {op: [] for op in OPERATIONS}
+        self.errors = {op: 0 for op in OPERATIONS}
+        self.recording = True
+
+    def call(self, op, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            with self._lock:
+                self.errors[op] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            with self._lock:
+                self.samples[op].append(elapsed)
+        return result
+
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile of an ascending list
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def student_session(rec, username, rng, admin_ratio, bypass_cache):
+    user = rec.call('authenticate', online.authenticate, username, seed.SEED_PASSWORD, 'student')
+    if not user:
+        raise RuntimeError(f"login failed for {username}; run seed.py first")
+    student_id = user['id']
+    catalog = rec.call('get_exam_catalog', online.get_exam_catalog, student_id)
+    exams = rec.call('get_all_exams', online.get_all_exams)
+    candidates = [e for e in catalog if not e['taken'] and e['question_count']] or exams
+    if not candidates:
+        raise RuntimeError("no exams in the database; run seed.py first")
+    exam = rng.choice(candidates)
+
+    load_questions = online._load_exam_questions if bypass_cache else online.get_exam_questions
+    questions = rec.call('get_exam_questions', load_questions, exam['id'])
+    rec.call('check_exam_taken', online.check_exam_taken, student_id, exam['id'])
+    answers = {q['id']: rng.choice('ABCD') for q in questions}
+    score = sum(q['marks'] for q in questions if answers[q['id']] == q['correct_answer'])
+    rec.call('submit_exam', online.submit_exam, student_id, exam['id'], score, exam['total_marks'])
+
+    if rng.random() < admin_ratio:
+        rec.call('get_all_results', online.get_all_results)
+
+
+def run(students, sessions, warmup, admin_ratio, bypass_cache, rng_seed):
+    rec = Recorder()
+    failures = []
+    barrier = threading.Barrier(students + 1)
+
+    def worker(n):
+        rng = random.Random(rng_seed + n)
+        username = f"{seed.SEED_USER_PREFIX}{n}"
+        barrier.wait()
+        for _ in range(sessions):
+            try:
+                student_session(rec, username, rng, admin_ratio, bypass_cache)
+            except Exception as e:
+                failures.append(f"{username}: {e}")
+
+    if warmup:
+        rec.recording = False
+        for n in range(min(students, warmup)):
+            student_session(rec, f"{seed.SEED_USER_PREFIX}{n}", random.Random(n), admin_ratio, bypass_cache)
+        rec.recording = True
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(students)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return rec, wall, failures
+
+
+def summarize(rec, wall):
+    report = {}
+    for op in OPERATIONS:
+        samples = sorted(rec.samples[op])
+        if not samples and not rec.errors[op]:
+            continue
+        report[op] = {
+            'count': len(samples),
+            'errors': rec.errors[op],
+            'throughput_per_s': len(samples) / wall if wall else 0.0,
+            'mean_ms': 1000 * sum(samples) / len(samples) if samples else None,
+            'p50_ms': 1000 * percentile(samples, 50) if samples else None,
+            'p95_ms': 1000 * percentile(samples, 95) if samples else None,
+            'p99_ms': 1000 * percentile(samples, 99) if samples else None,
+            'max_ms': 1000 * samples[-1] if samples else None,
+        }
+    return report
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _fmt(value, spec='.2f'):
+    return '-' if value is None else format(value, spec)
+
+
+def print_report(report, baseline=None):
+    header = f"{'operation':<20}{'count':>8}{'err':>5}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    if baseline:
+        header += f"{'p95 vs base':>14}"
+    print(header)
+    print('-' * len(header))
+    for op, row in report.items():
+        line = (f"{op:<20}{row['count']:>8}{row['errors']:>5}{_fmt(row['throughput_per_s'], '.1f'):>10}"
+                f"{_fmt(row['p50_ms']):>10}{_fmt(row['p95_ms']):>10}{_fmt(row['p99_ms']):>10}")
+        if baseline:
+            base = baseline.get(op, {}).get('p95_ms')
+            if base and row['p95_ms'] is not None:
+                line += f"{(row['p95_ms'] - base) / base * 100:>+13.1f}%"
+            else:
+                line += f"{'n/a':>14}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the online.py data layer with concurrent students")
+    parser.add_argument('--students', type=int, default=20, help="concurrent simulated students")
+    parser.add_argument('--sessions', type=int, default=10, help="exam sessions per student")
+    parser.add_argument('--warmup', type=int, default=2, help="unrecorded warm-up sessions")
+    parser.add_argument('--admin-ratio', type=float, default=0.02,
+                        help="fraction of sessions that also run get_all_results()")
+    parser.add_argument('--bypass-cache', action='store_true',
+                        help="load questions straight from the database instead of the read cache")
+    parser.add_argument('--rng-seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON file of an earlier run to compare p95 latency against")
+    args = parser.parse_args(argv)
+
+    if not online.init_database():
+        return 2
+    if not seed.is_seeded():
+        print("The database has no seed data; run seed.py first", file=sys.stderr)
+        return 2
+
+    rec, wall, failures = run(args.students, args.sessions, args.warmup,
+                              args.admin_ratio, args.bypass_cache, args.rng_seed)
+    report = summarize(rec, wall)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['operations']
+
+    total = sum(row['count'] for row in report.values())
+    print(f"{args.students} students x {args.sessions} sessions in {wall:.2f}s "
+          f"({total / wall if wall else 0:.1f} ops/s)\n")
+    print_report(report, baseline)
+    if failures:
+        print(f"\n{len(failures)} failed sessions, first: {failures[0]}")
+
+    if args.output:
+        result = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': _git_revision(),
+                'python': platform.python_version(),
+                'students': args.students,
+                'sessions': args.sessions,
+                'admin_ratio': args.admin_ratio,
+                'bypass_cache': args.bypass_cache,
+                'pool_size': online.POOL_SIZE,
+                'pool_max_overflow': online.POOL_MAX_OVERFLOW,
+                'write_behind': online.WRITE_BEHIND_ENABLED,
+            },
+            'wall_seconds': wall,
+            'failed_sessions': len(failures),
+            'operations': report,
+            'pool': online.get_pool_stats(),
+            'cache': online.get_cache_stats(),
+            'queries': online.get_metrics().query_table(),
+        }
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
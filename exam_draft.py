@@ -0,0 +1,75 @@
+"""Exam drafts for the admin "Create Exam" page.
+
+An exam and its questions are staged in an ExamDraft (online.py keeps it in
+session_state) and written together, in one transaction, when the draft is
+finished; until then nothing touches the database. Questions are validated
+like imported rows (question_import.validate_row), so a staged question and
+an imported one accept the same data.
+
+Methods that can refuse their input return an error message, or None when
+they succeeded.
+"""
+from dataclasses import dataclass, field
+
+import question_import
+
+
+def stage_question(fields):
+    """(question, None) with the fields validated like an imported row, or
+    (None, error). A question is a dict keyed like question_import.COLUMNS."""
+    values, error = question_import.validate_row(fields)
+    if error:
+        return None, error
+    return dict(zip(question_import.COLUMNS, values)), None
+
+
+@dataclass
+class ExamDraft:
+    exam_name: str
+    duration: int
+    total_marks: int
+    questions: list = field(default_factory=list)
+
+    @classmethod
+    def start(cls, exam_name, duration, total_marks):
+        """(draft, None) for a new exam, or (None, error)."""
+        exam_name = (exam_name or '').strip()
+        if not exam_name:
+            return None, "Please enter exam name!"
+        return cls(exam_name, int(duration), int(total_marks)), None
+
+    @property
+    def staged_marks(self):
+        return sum(q['marks'] for q in self.questions)
+
+    def add(self, fields):
+        question, error = stage_question(fields)
+        if error:
+            return error
+        self.questions.append(question)
+        return None
+
+    def replace(self, i, fields):
+        question, error = stage_question(fields)
+        if error:
+            return error
+        self.questions[i] = question
+        return None
+
+    def move(self, i, offset):
+        """Swap question i with its neighbour `offset` places away; a move
+        past either end is ignored."""
+        j = i + offset
+        if 0 <= i < len(self.questions) and 0 <= j < len(self.questions):
+            self.questions[i], self.questions[j] = self.questions[j], self.questions[i]
+
+    def remove(self, i):
+        del self.questions[i]
+
+    def finish(self, save):
+        """Write the exam with all its questions through save(exam_name,
+        duration, total_marks, questions), which returns the new exam id or
+        None when nothing was saved. Returns (exam_id, error)."""
+        if not self.questions:
+            return None, "Please add at least one question before finishing!"
+        return save(self.exam_name, self.duration, self.total_marks, list(self.questions)), None
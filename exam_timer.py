@@ -0,0 +1,54 @@
+"""Exam deadlines and the in-browser countdown.
+
+An attempt's deadline is fixed in the database when the student starts the
+exam (attempts.deadline = started_at + the exam's duration) and read back
+with the attempt, so enforcing it costs one datetime comparison, no query.
+The countdown shown to the student is a few lines of JavaScript that tick
+in the browser: the server renders it once with the seconds left and never
+reruns the script to update it.
+"""
+from datetime import datetime, timedelta
+
+
+def deadline_for(started_at, duration_minutes):
+    return started_at + timedelta(minutes=int(duration_minutes))
+
+
+def seconds_left(deadline, now=None):
+    """Whole seconds until the deadline (negative once it has passed), or
+    None for an attempt without one."""
+    if deadline is None:
+        return None
+    now = now or datetime.now()
+    return int((deadline - now).total_seconds())
+
+
+def is_expired(deadline, grace=0, now=None):
+    """True once the deadline plus `grace` seconds has passed."""
+    left = seconds_left(deadline, now)
+    return left is not None and left < -grace
+
+
+def countdown_html(seconds, warn_seconds=300):
+    """A self-contained countdown from `seconds`, turning red in the last
+    `warn_seconds`. Counting from the remaining time rather than the
+    deadline keeps it right when the browser's clock is off."""
+    return f"""
+<div id="countdown" style="font-family: sans-serif; font-size: 1.25rem; font-weight: 600; padding: 0.25rem 0;"></div>
+<script>
+  const end = Date.now() + {max(0, int(seconds))} * 1000;
+  const el = document.getElementById("countdown");
+  const pad = (n) => String(n).padStart(2, "0");
+  function tick() {{
+    const left = Math.max(0, Math.round((end - Date.now()) / 1000));
+    const h = Math.floor(left / 3600), m = Math.floor(left % 3600 / 60), s = left % 60;
+    el.textContent = left > 0
+      ? "\\u23F1\\uFE0F Time left: " + (h ? h + ":" + pad(m) : m) + ":" + pad(s)
+      : "\\u23F1\\uFE0F Time is up: submit now";
+    el.style.color = left <= {int(warn_seconds)} ? "#d33" : "inherit";
+    if (left === 0) clearInterval(timer);
+  }}
+  const timer = setInterval(tick, 1000);
+  tick();
+</script>
+"""
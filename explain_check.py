@@ -0,0 +1,327 @@
+"""Query-plan regression check for the app's hot queries.
+
+Runs each data helper in online.py against a (seeded) local database,
+captures every SELECT, UPDATE and DELETE it issues, runs EXPLAIN on it
+and fails when a plan does a full table scan or a filesort that the
+scenario does not explicitly allow. Every public Repository method must
+be exercised by a scenario or listed in NOT_EXPLAINED with a reason, so a
+new query can't slip through unchecked. Works with both storage
+backends: MySQL plans are read from EXPLAIN (type=ALL, "Using filesort"),
+SQLite plans from EXPLAIN QUERY PLAN ("SCAN <table>" without an index,
+"USE TEMP B-TREE FOR ORDER BY").
+
+    python seed.py                  # once, against a local database
+    python explain_check.py [-v]
+
+Exits with status 1 when a plan regressed.
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+
+import online
+import question_bank
+import seed
+
+
+@dataclass
+class Scenario:
+    label: str
+    run: object                      # fn(samples) -> None
+    allow_full_scan: tuple = ()      # tables that may be read with type=ALL
+    allow_filesort: bool = False
+    reason: str = ''
+
+
+def _sample_ids():
+    # a student with results and an exam with questions to parameterise queries
+    conn = online.create_connection()
+    if conn is None:
+        raise RuntimeError("no database connection")
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT student_id, exam_id FROM results ORDER BY id LIMIT 1")
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    if row is None:
+        raise RuntimeError("the database has no results; run seed.py first")
+    return {'student_id': row['student_id'], 'exam_id': row['exam_id']}
+
+
+def _draw_sample_paper(exam_id):
+    # two questions from every pool of the exam
+    sizes = online.get_repository().pool_sizes(exam_id)
+    draws = [question_bank.PoolDraw(t, d, 2) for (t, d) in sizes]
+    online.draw_paper(exam_id, 1, question_bank.make_spec(draws, sizes))
+
+
+def _sample_attempt(samples):
+    # the sample student's attempt at the sample exam, opened on first use
+    if 'attempt_id' not in samples:
+        attempt = online.open_attempt(samples['student_id'], {'id': samples['exam_id'], 'duration_minutes': 60})
+        samples['attempt_id'] = attempt['id']
+    return samples['attempt_id']
+
+
+def _replay_submission(samples):
+    # a write-behind replay; the probe result is stored by the first run
+    # only, after which the lookup finds it and nothing is inserted
+    online.get_repository().insert_results_idempotent([{
+        'id': 'explain-check-replay', 'student_id': samples['student_id'], 'exam_id': samples['exam_id'],
+        'score': 0, 'total_marks': 1, 'submitted_at': '2025-01-01 00:00:00',
+    }])
+
+
+def _autosave_answers(samples):
+    # one answer saved and one cleared, written through the autosave worker
+    attempt_id = _sample_attempt(samples)
+    questions = online._load_exam_questions(samples['exam_id'])[:2]
+    online.save_answer(attempt_id, questions[0]['id'], 'A')
+    online.save_answer(attempt_id, questions[-1]['id'], None)
+    if not online.get_answer_saver().flush_attempt(attempt_id):
+        raise RuntimeError("autosave write failed")
+
+
+def _finish_sample_attempt(samples):
+    # submits the sample attempt; later runs only explain the UPDATE
+    attempt_id = _sample_attempt(samples)
+    paper = online._load_exam_questions(samples['exam_id'])
+    online.finish_attempt(attempt_id, paper, {paper[0]['id']: 'A'})
+
+
+def _keyset_pages(fetch_page):
+    # first page plus the following one, so the keyset predicate is explained too
+    _, cursor = fetch_page(None)
+    if cursor is not None:
+        fetch_page(cursor)
+
+
+SCENARIOS = [
+    Scenario('authenticate', lambda s: online.authenticate(f"{seed.SEED_USER_PREFIX}0", seed.SEED_PASSWORD, 'student')),
+    Scenario('get_all_exams', lambda s: online._load_all_exams(),
+             allow_full_scan=('exams',), allow_filesort=True,
+             reason="loads the whole (small, cached) exam list"),
+    Scenario('get_exam_catalog', lambda s: online.get_exam_catalog(s['student_id']),
+             allow_full_scan=('exams',), allow_filesort=True,
+             reason="lists every exam once per student page"),
+    Scenario('count_exams', lambda s: online.count_exams()),
+    Scenario('get_exams_page', lambda s: _keyset_pages(lambda after: online.get_exams_page(after, 20))),
+    Scenario('get_exam_questions', lambda s: online._load_exam_questions(s['exam_id'])),
+    Scenario('get_pool_sizes', lambda s: online.get_repository().pool_sizes(s['exam_id'])),
+    Scenario('draw_paper', lambda s: _draw_sample_paper(s['exam_id'])),
+    Scenario('check_exam_taken', lambda s: online.check_exam_taken(s['student_id'], s['exam_id'])),
+    Scenario('get_student_results', lambda s: online.get_student_results(s['student_id'])),
+    Scenario('get_all_results', lambda s: online.get_all_results(),
+             allow_full_scan=('results', 'users', 'exams'), allow_filesort=True,
+             reason="unpaginated full export kept for legacy callers"),
+    Scenario('get_results_summary[all]', lambda s: online.get_results_summary(),
+             allow_full_scan=('results',), allow_filesort=True,
+             reason="aggregates over every result; histogram sort is over <=101 groups"),
+    Scenario('get_results_summary[exam]', lambda s: online.get_results_summary(exam_id=s['exam_id']),
+             allow_filesort=True, reason="histogram sort is over <=101 groups"),
+    Scenario('get_results_summary[student]', lambda s: online.get_results_summary(student_id=s['student_id']),
+             allow_filesort=True, reason="histogram sort is over <=101 groups"),
+    Scenario('get_results_by_exam', lambda s: online.get_results_by_exam(),
+             allow_full_scan=('results',), allow_filesort=True,
+             reason="groups every result by exam"),
+    Scenario('get_results_page', lambda s: _keyset_pages(lambda after: online.get_results_page(after, 50))),
+    Scenario('get_results_page[exam]', lambda s: _keyset_pages(
+        lambda after: online.get_results_page(after, 50, exam_id=s['exam_id']))),
+    Scenario('iter_results', lambda s: list(online.get_repository().iter_results()),
+             allow_full_scan=('results',), reason="an unfiltered export reads every result"),
+    Scenario('iter_results[exam]', lambda s: list(online.get_repository().iter_results(exam_id=s['exam_id']))),
+    Scenario('get_exam_leaderboard', lambda s: online.get_exam_leaderboard(s['exam_id'], 10)),
+    Scenario('get_item_analysis', lambda s: online.get_item_analysis(s['exam_id'])),
+    Scenario('find_student_id', lambda s: online.find_student_id(f"{seed.SEED_USER_PREFIX}0")),
+    Scenario('open_attempt', _sample_attempt),
+    Scenario('load_attempt_answers', lambda s: online.load_attempt_answers(_sample_attempt(s))),
+    Scenario('set_attempt_paper', lambda s: online.get_repository().set_attempt_paper(
+        _sample_attempt(s), 1, question_bank.make_spec([], {}))),
+    Scenario('insert_results_idempotent', _replay_submission),
+    Scenario('autosave_answers', _autosave_answers),
+    Scenario('finish_attempt', _finish_sample_attempt),
+]
+
+# Repository methods no scenario runs: nothing they issue needs a plan
+NOT_EXPLAINED = {
+    'run_migrations': "schema changes, run once per deployment",
+    'analyze': "statistics refresh",
+    'register_student': "single-row insert",
+    'create_exam': "inserts only",
+    'import_questions': "inserts only",
+    'rebuild_pools': "admin maintenance, rewrites the exam's pools",
+    'set_exam_blueprint': "single-row update by primary key",
+    'delete_exam': "deletes by primary key, cascading",
+    'insert_result': "inserts only",
+    'rebuild_leaderboards': "admin maintenance, rewrites the score distributions",
+}
+
+
+def _record_calls(*repositories):
+    """Wrap the repositories' public methods to note which ones run; returns
+    (the set of names called, a function undoing the wrapping)."""
+    called = set()
+    names = [name for name in dir(type(repositories[0]))
+             if not name.startswith('_') and callable(getattr(type(repositories[0]), name))]
+
+    def recorder(name, method):
+        def call(*args, **kwargs):
+            called.add(name)
+            return method(*args, **kwargs)
+        return call
+
+    for repository in repositories:
+        for name in names:
+            setattr(repository, name, recorder(name, getattr(repository, name)))
+
+    def undo():
+        for repository in repositories:
+            for name in names:
+                delattr(repository, name)
+    return called, undo
+
+
+def unexplained_methods(repository, called):
+    """Public repository methods neither run by a scenario nor listed in
+    NOT_EXPLAINED."""
+    return sorted(
+        name for name in dir(type(repository))
+        if not name.startswith('_') and callable(getattr(type(repository), name))
+        and name not in called and name not in NOT_EXPLAINED
+    )
+
+
+def capture_statements(scenario, samples):
+    statements = []
+
+    def listener(sql, params):
+        if sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((sql, params))
+
+    online.add_statement_listener(listener)
+    try:
+        scenario.run(samples)
+    finally:
+        online.remove_statement_listener(listener)
+    return statements
+
+
+def explain(sql, params):
+    conn = online.create_connection()
+    if conn is None:
+        raise RuntimeError("no database connection")
+    cursor = conn.cursor(dictionary=True)
+    prefix = "EXPLAIN QUERY PLAN " if online.STORAGE_BACKEND == 'sqlite' else "EXPLAIN "
+    cursor.execute(prefix + sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+
+_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_SQL_KEYWORDS = {'where', 'join', 'left', 'inner', 'on', 'order', 'group', 'limit', 'using'}
+
+
+def _table_aliases(sql):
+    # SQLite plans name tables by their alias; map aliases back to tables
+    aliases = {}
+    for table, alias in _ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def sqlite_plan_problems(scenario, sql, plan):
+    problems = []
+    aliases = _table_aliases(sql)
+    for row in plan:
+        detail = row.get('detail') or ''
+        match = re.match(r"SCAN (\w+)(.*)", detail)
+        if match:
+            table = aliases.get(match.group(1))
+            # unknown names are materialised subqueries, judged by their own rows
+            if table and 'INDEX' not in match.group(2) and table not in scenario.allow_full_scan:
+                problems.append(f"full table scan on {table}")
+        if 'USE TEMP B-TREE FOR ORDER BY' in detail and not scenario.allow_filesort:
+            problems.append("sort in a temporary b-tree (filesort)")
+    return problems
+
+
+def plan_problems(scenario, plan):
+    problems = []
+    for row in plan:
+        table = row.get('table') or ''
+        extra = row.get('Extra') or ''
+        # derived tables (<derived2>) are materialised subqueries, judged by their own rows
+        if table.startswith('<'):
+            continue
+        if row.get('type') == 'ALL' and table not in scenario.allow_full_scan:
+            problems.append(f"full table scan on {table} (~{row.get('rows')} rows)")
+        if 'Using filesort' in extra and not scenario.allow_filesort:
+            problems.append(f"filesort on {table}")
+    return problems
+
+
+def _format_plan(plan):
+    if online.STORAGE_BACKEND == 'sqlite':
+        return "\n".join(f"      {row.get('detail')}" for row in plan)
+    return "\n".join(
+        f"      {row.get('table')}: type={row.get('type')} key={row.get('key')} "
+        f"rows={row.get('rows')} extra={row.get('Extra')}"
+        for row in plan
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN every app query and fail on full scans or filesorts")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print every plan")
+    args = parser.parse_args(argv)
+
+    if not online.init_database():
+        return 2
+    samples = _sample_ids()
+    repository = online.get_repository()
+    # autosave and write-behind flush through their own repository
+    called, undo = _record_calls(repository, online.get_worker_repository())
+    failures = 0
+    try:
+        failures += _check_scenarios(samples, args.verbose)
+    finally:
+        undo()
+    for name in unexplained_methods(repository, called):
+        print(f"FAIL Repository.{name}: no scenario runs it; add one or list it in NOT_EXPLAINED")
+        failures += 1
+    print(f"\n{failures} plan regression(s)" if failures else "\nAll query plans OK")
+    return 1 if failures else 0
+
+
+def _check_scenarios(samples, verbose):
+    failures = 0
+    for scenario in SCENARIOS:
+        statements = capture_statements(scenario, samples)
+        if not statements:
+            print(f"FAIL {scenario.label}: no statement was captured")
+            failures += 1
+            continue
+        for sql, params in statements:
+            plan = explain(sql, params)
+            if online.STORAGE_BACKEND == 'sqlite':
+                problems = sqlite_plan_problems(scenario, sql, plan)
+            else:
+                problems = plan_problems(scenario, plan)
+            status = "FAIL" if problems else "ok  "
+            print(f"{status} {scenario.label}: {' '.join(sql.split())[:100]}")
+            if problems:
+                failures += 1
+                for problem in problems:
+                    print(f"    - {problem}")
+            if problems or verbose:
+                print(_format_plan(plan))
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Export exam results to CSV or Parquet from the command line.
+
+Rows are streamed from the database through a server-side cursor and
+written batch by batch, so memory use stays flat even for millions of
+results.
+
+    python export_results.py --format csv --output results.csv
+    python export_results.py --format parquet --output results.parquet \\
+        --exam-id 3 --from 2025-01-01 --to 2025-06-30
+    python export_results.py --exam-id 3 > exam3.csv
+"""
+import argparse
+import sys
+import time
+from datetime import date
+
+import online
+import results_export
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream exam results to CSV or Parquet")
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--output', help="output file (CSV defaults to stdout)")
+    parser.add_argument('--exam-id', type=int, help="only this exam")
+    parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                        help="submitted on or after this date (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                        help="submitted on or before this date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet':
+        if args.output is None:
+            parser.error("--output is required for Parquet")
+        if 'parquet' not in results_export.available_formats():
+            parser.error("Parquet export needs pyarrow (pip install pyarrow)")
+    if not online.init_database():
+        return 2
+
+    filters = dict(exam_id=args.exam_id, date_from=args.date_from, date_to=args.date_to)
+    start = time.perf_counter()
+    if args.format == 'parquet':
+        count = online.export_results(args.output, 'parquet', **filters)
+    elif args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            count = online.export_results(f, 'csv', **filters)
+    else:
+        count = online.export_results(sys.stdout, 'csv', **filters)
+    print(f"Exported {count} results in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
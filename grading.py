@@ -0,0 +1,144 @@
+"""Grading engine for multiple-choice exams.
+
+Answer keys are compiled once per exam into flat NumPy arrays, so a single
+submission or a whole batch of submissions is graded with a few array
+operations instead of a Python loop over question dicts. Nothing here
+depends on Streamlit or the database, so it can be used from scripts, e.g.
+to re-grade every submission of an exam after a key correction.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+OPTIONS = ('A', 'B', 'C', 'D')
+_OPTION_INDEX = {opt: i for i, opt in enumerate(OPTIONS)}
+
+# Encoded value for a question that was left unanswered
+UNANSWERED = -1
+
+
+@dataclass(frozen=True)
+class GradingRules:
+    """Scoring rules applied on top of an answer key.
+
+    negative_marking: fraction of a question's marks deducted for an answer
+        that earns no credit (0.25 deducts a quarter). Unanswered questions
+        are never penalised.
+    partial_credit: {question_id: {option: fraction}} for options that earn
+        part of the marks, e.g. {12: {'B': 0.5}}. The correct option always
+        earns full marks.
+    floor_at_zero: clamp negative totals to zero.
+    """
+    negative_marking: float = 0.0
+    partial_credit: dict = field(default_factory=dict)
+    floor_at_zero: bool = True
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    question_ids: np.ndarray   # int64, one per question in paper order
+    correct: np.ndarray        # int8 option index (0-3)
+    marks: np.ndarray          # float64 marks per question
+    index: dict                # question_id -> position in the arrays
+
+    @property
+    def total_marks(self):
+        return float(self.marks.sum())
+
+    def __len__(self):
+        return len(self.question_ids)
+
+
+@dataclass(frozen=True)
+class GradeResult:
+    score: float
+    max_score: float
+    correct: int
+    wrong: int
+    unanswered: int
+
+
+def compile_answer_key(questions):
+    """Build an AnswerKey from question rows (dicts with id, correct_answer, marks)."""
+    n = len(questions)
+    question_ids = np.empty(n, dtype=np.int64)
+    correct = np.empty(n, dtype=np.int8)
+    marks = np.empty(n, dtype=np.float64)
+    for i, q in enumerate(questions):
+        question_ids[i] = q['id']
+        correct[i] = _OPTION_INDEX[q['correct_answer']]
+        marks[i] = q['marks'] if q['marks'] is not None else 1
+    index = {int(qid): i for i, qid in enumerate(question_ids)}
+    for arr in (question_ids, correct, marks):
+        arr.setflags(write=False)
+    return AnswerKey(question_ids, correct, marks, index)
+
+
+def encode_answers(key, answers):
+    """Turn {question_id: 'A'..'D' or None} into an int8 vector aligned with
+    the key. Answers to questions not in the key are ignored."""
+    vec = np.full(len(key), UNANSWERED, dtype=np.int8)
+    for qid, choice in answers.items():
+        pos = key.index.get(int(qid))
+        if pos is not None and choice in _OPTION_INDEX:
+            vec[pos] = _OPTION_INDEX[choice]
+    return vec
+
+
+def _credit_matrix(key, rules):
+    # (questions x options) fraction of marks earned per option
+    credit = np.zeros((len(key), len(OPTIONS)), dtype=np.float64)
+    credit[np.arange(len(key)), key.correct] = 1.0
+    for qid, options in rules.partial_credit.items():
+        pos = key.index.get(int(qid))
+        if pos is None:
+            continue
+        for opt, fraction in options.items():
+            if _OPTION_INDEX[opt] != key.correct[pos]:
+                credit[pos, _OPTION_INDEX[opt]] = fraction
+    return credit
+
+
+def grade_batch(key, responses, rules=None):
+    """Grade a (submissions x questions) int8 response matrix.
+
+    Returns a dict of arrays, one value per submission: score, correct,
+    wrong and unanswered.
+    """
+    rules = rules or GradingRules()
+    responses = np.atleast_2d(np.asarray(responses, dtype=np.int8))
+    if responses.shape[1] != len(key):
+        raise ValueError(
+            f"response matrix has {responses.shape[1]} columns, answer key has {len(key)} questions"
+        )
+    answered = responses != UNANSWERED
+    credit = _credit_matrix(key, rules)
+    # gather the credit of the chosen option; unanswered cells read column 0
+    # and are masked out below
+    earned_fraction = credit[np.arange(len(key)), np.where(answered, responses, 0)]
+    earned_fraction = np.where(answered, earned_fraction, 0.0)
+    wrong = answered & (earned_fraction == 0.0)
+
+    scores = earned_fraction @ key.marks
+    if rules.negative_marking:
+        scores = scores - rules.negative_marking * (wrong @ key.marks)
+    if rules.floor_at_zero:
+        scores = np.maximum(scores, 0.0)
+    return {
+        'score': scores,
+        'correct': (answered & (responses == key.correct)).sum(axis=1),
+        'wrong': wrong.sum(axis=1),
+        'unanswered': (~answered).sum(axis=1),
+    }
+
+
+def grade(key, answers, rules=None):
+    """Grade one submission given as {question_id: 'A'..'D'}."""
+    result = grade_batch(key, encode_answers(key, answers), rules)
+    return GradeResult(
+        score=float(result['score'][0]),
+        max_score=key.total_marks,
+        correct=int(result['correct'][0]),
+        wrong=int(result['wrong'][0]),
+        unanswered=int(result['unanswered'][0]),
+    )
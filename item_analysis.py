@@ -0,0 +1,149 @@
+"""Per-question statistics over every submitted attempt of an exam.
+
+Each submitted attempt keeps its responses as one packed row: the ids of
+the questions on its paper (little-endian int32) and the chosen options
+(int8, grading.OPTIONS index or grading.UNANSWERED), aligned. An exam's
+attempts are unpacked into one (attempts x questions) int8 response matrix,
+NOT_PRESENTED where a question was not on the attempt's paper, and every
+statistic is a handful of whole-matrix NumPy operations, so 100k attempts
+take seconds rather than minutes:
+
+  difficulty      - share of the attempts shown the question that answered
+                    it correctly (the classical p-value; higher is easier)
+  discrimination  - point-biserial correlation between getting the question
+                    right and the attempt's score on the rest of its paper
+  distractors     - share of attempts choosing each option, and omitting
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from grading import OPTIONS, UNANSWERED
+
+# Matrix cell for a question that was not on the attempt's paper
+NOT_PRESENTED = -2
+
+# Thresholds for flagging questions worth a look
+TOO_EASY = 0.95
+TOO_HARD = 0.20
+LOW_DISCRIMINATION = 0.20
+# a wrong option chosen by fewer attempts than this does no work
+WEAK_DISTRACTOR = 0.05
+
+# Attempts per block when accumulating statistics
+BLOCK_ROWS = 20_000
+
+_OPTION_INDEX = {opt: i for i, opt in enumerate(OPTIONS)}
+_ID_DTYPE = np.dtype('<i4')
+
+
+def pack_responses(question_ids, answers):
+    """(question_ids, responses) bytes for one attempt: the paper's question
+    ids in order and the answers ({question_id: 'A'..'D'}) aligned to them."""
+    ids = np.asarray(question_ids, dtype=_ID_DTYPE)
+    codes = np.fromiter(
+        (_OPTION_INDEX.get(answers.get(int(qid)), UNANSWERED) for qid in ids),
+        dtype=np.int8, count=len(ids)
+    )
+    return ids.tobytes(), codes.tobytes()
+
+
+def unpack_responses(question_ids, responses):
+    return np.frombuffer(question_ids, dtype=_ID_DTYPE), np.frombuffer(responses, dtype=np.int8)
+
+
+def response_matrix(key, packed):
+    """(attempts x questions) int8 matrix aligned with an answer key from
+    packed (question_ids, responses) rows. Questions no longer in the key
+    are dropped."""
+    packed = list(packed)
+    n = len(packed)
+    matrix = np.full((n, len(key)), NOT_PRESENTED, dtype=np.int8)
+    if not n or not len(key):
+        return matrix
+    ids = np.frombuffer(b''.join(p[0] for p in packed), dtype=_ID_DTYPE)
+    codes = np.frombuffer(b''.join(p[1] for p in packed), dtype=np.int8)
+    rows = np.repeat(np.arange(n), [len(p[1]) for p in packed])
+    # map question ids to key columns
+    order = np.argsort(key.question_ids)
+    sorted_ids = key.question_ids[order]
+    pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    known = sorted_ids[pos] == ids
+    matrix[rows[known], order[pos[known]]] = codes[known]
+    return matrix
+
+
+@dataclass(frozen=True)
+class ItemStats:
+    question_ids: np.ndarray    # one entry per question, in key order
+    presented: np.ndarray       # attempts that were shown the question
+    difficulty: np.ndarray      # proportion correct (NaN if never presented)
+    discrimination: np.ndarray  # point-biserial vs rest score (NaN if undefined)
+    option_shares: np.ndarray   # (questions x options) share choosing each option
+    omitted: np.ndarray         # share leaving it unanswered
+    attempts: int
+
+
+def analyse(key, matrix, block_rows=BLOCK_ROWS):
+    """ItemStats for a response matrix aligned with `key`."""
+    q = len(key)
+    m = key.marks
+    n = np.zeros(q)
+    sums = {name: np.zeros(q) for name in ('x', 'xe', 'e', 'e2')}
+    choices = np.zeros((q, len(OPTIONS)))
+    omitted = np.zeros(q)
+    # rest score: the attempt's marks on every other question. With E the
+    # marks earned on the whole paper and x the 0/1 correctness of question
+    # j, rest = E - x * m_j, so the sums the correlation needs expand into
+    # per-question sums of x, x*E, E and E^2 over the attempts shown j,
+    # accumulated block by block to bound the float temporaries
+    for start in range(0, matrix.shape[0], block_rows):
+        block = matrix[start:start + block_rows]
+        presented = (block != NOT_PRESENTED).astype(np.float64)
+        correct = (block == key.correct).astype(np.float64)
+        earned = correct @ m
+        n += presented.sum(axis=0)
+        sums['x'] += correct.sum(axis=0)
+        sums['xe'] += correct.T @ earned
+        sums['e'] += presented.T @ earned
+        sums['e2'] += presented.T @ (earned * earned)
+        for i in range(len(OPTIONS)):
+            choices[:, i] += (block == i).sum(axis=0)
+        omitted += (block == UNANSWERED).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sum_x = sums['x']
+        sum_t = sums['e'] - m * sum_x
+        sum_t2 = sums['e2'] - 2 * m * sums['xe'] + m * m * sum_x
+        sum_xt = sums['xe'] - m * sum_x
+        cov = n * sum_xt - sum_x * sum_t
+        var = (n * sum_x - sum_x * sum_x) * (n * sum_t2 - sum_t * sum_t)
+        discrimination = np.where(var > 0, cov / np.sqrt(np.where(var > 0, var, 1.0)), np.nan)
+        return ItemStats(
+            question_ids=key.question_ids,
+            presented=n.astype(np.int64),
+            difficulty=sum_x / n,
+            discrimination=discrimination,
+            option_shares=choices / n[:, None],
+            omitted=omitted / n,
+            attempts=matrix.shape[0],
+        )
+
+
+def flags(stats, key, i):
+    """Short notes on question i of ItemStats, empty when nothing stands out."""
+    notes = []
+    if not stats.presented[i]:
+        return notes
+    if stats.difficulty[i] >= TOO_EASY:
+        notes.append("too easy")
+    elif stats.difficulty[i] <= TOO_HARD:
+        notes.append("too hard")
+    if np.isnan(stats.discrimination[i]) or stats.discrimination[i] < LOW_DISCRIMINATION:
+        notes.append("negative discrimination: check the key" if stats.discrimination[i] < 0
+                     else "weak discrimination")
+    weak = [OPTIONS[o] for o in range(len(OPTIONS))
+            if o != key.correct[i] and stats.option_shares[i, o] < WEAK_DISTRACTOR]
+    if weak:
+        notes.append(f"unused distractor(s) {', '.join(weak)}")
+    return notes
@@ -0,0 +1,63 @@
+"""Per-exam leaderboards kept up to date as results are written.
+
+Students are ranked on their percentage, since papers drawn from question
+pools may carry different totals. Every result stores it as an integer in
+basis points (results.score_bp, 0..10000), and exam_score_counts keeps the
+exam's score distribution, (exam_id, score_bp) -> submissions, updated in
+the same transaction as the result insert. So:
+
+  top-K           - an index range scan of (exam_id, score_bp DESC), K rows
+  rank/percentile - one aggregate over the exam's distribution, whose size
+                    is bounded by the number of distinct scores, not by the
+                    number of results
+
+Submissions that tie share a rank (1, 2, 2, 4). The distribution can be
+rebuilt from results at any time (`python rebuild_leaderboards.py`), e.g.
+after a backfill or a manual correction of scores.
+"""
+from dataclasses import dataclass
+
+BP_SCALE = 10000
+
+
+def score_bp(score, total_marks):
+    """A score as an integer percentage in basis points (0..10000)."""
+    if not total_marks:
+        return 0
+    # truncate toward zero like SQL integer division (negative marking can
+    # leave a score below zero)
+    bp = abs(int(score)) * BP_SCALE // abs(int(total_marks))
+    return bp if (score < 0) == (total_marks < 0) else -bp
+
+
+@dataclass(frozen=True)
+class Standing:
+    """Where a score sits in an exam's distribution."""
+    rank: int
+    submissions: int
+    percentile: float
+
+
+def standing(above, equal, total):
+    """Standing from the number of submissions scoring higher than, and
+    the same as, a score. The percentile is the percentile rank: the share
+    of submissions below the score, counting ties as half."""
+    if not total:
+        return None
+    below = total - above - equal
+    return Standing(
+        rank=above + 1,
+        submissions=total,
+        percentile=round(100.0 * (below + 0.5 * equal) / total, 1),
+    )
+
+
+def competition_ranks(rows, key='score_bp'):
+    """Add a 'rank' to leaderboard rows sorted best first; ties share one."""
+    previous = None
+    for position, row in enumerate(rows, start=1):
+        if row[key] != previous:
+            rank = position
+            previous = row[key]
+        row['rank'] = rank
+    return rows
@@ -0,0 +1,372 @@
+"""Query and page-render instrumentation for the exam app.
+
+Every statement executed through online._ConnWrapper is timed and counted
+under its fingerprint (the SQL with literals and placeholders replaced by
+`?`, so one helper's query is one series however it is parameterised).
+Each Streamlit rerun is timed as a whole and per named section
+(login_page, admin_interface, ...), together with the number of queries
+it issued.
+
+The registry is process wide and thread safe. Per-rerun figures are kept
+per thread, which matches Streamlit running each session's script in its
+own thread; statements issued outside a rerun (e.g. by the write-behind
+worker) only count towards the process totals.
+
+render_prometheus() returns everything in the Prometheus text exposition
+format; write_textfile() and serve_http() publish it for a node_exporter
+textfile collector or a direct scrape.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger('online_exam.slow_query')
+
+# Histogram bucket upper bounds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Fingerprints beyond this many distinct statements are counted as 'other'
+MAX_FINGERPRINTS = 500
+OTHER_FINGERPRINT = 'other'
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS_RE = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalised form of a statement: literals and placeholders become ?,
+    IN lists and multi-row VALUES collapse, whitespace is squeezed."""
+    fp = _STRING_RE.sub('?', sql)
+    fp = _PLACEHOLDER_RE.sub('?', fp)
+    fp = _NUMBER_RE.sub('?', fp)
+    fp = _SPACE_RE.sub(' ', fp).strip()
+    fp = _IN_LIST_RE.sub('(?+)', fp)
+    fp = _ROWS_RE.sub('(?+)', fp)
+    return fp
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class _QueryStats:
+    __slots__ = ('calls', 'errors', 'rows', 'execute_seconds', 'fetch_seconds', 'max_seconds', 'slow', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.execute_seconds = 0.0
+        self.fetch_seconds = 0.0
+        self.max_seconds = 0.0
+        self.slow = 0
+        self.histogram = _Histogram(DURATION_BUCKETS)
+
+
+class _Rerun:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.sections = {}
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.summary = None
+
+
+class MetricsRegistry:
+    def __init__(self, slow_query_seconds=None, recent_slow=50):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._sections = {}
+        self._reruns = _Histogram(DURATION_BUCKETS)
+        self._rerun_queries = _Histogram(QUERY_COUNT_BUCKETS)
+        self._recent_slow = deque(maxlen=recent_slow)
+        self._collectors = []
+        self._local = threading.local()
+        self._textfile_written = None
+        self.started = time.time()
+
+    # -- queries --------------------------------------------------------
+
+    def _query_stats(self, fp):
+        stats = self._queries.get(fp)
+        if stats is None:
+            if len(self._queries) >= MAX_FINGERPRINTS:
+                fp = OTHER_FINGERPRINT
+                stats = self._queries.get(fp)
+            if stats is None:
+                stats = self._queries[fp] = _QueryStats()
+        return stats
+
+    def record_query(self, fp, seconds, error=False):
+        """A statement finished executing (fetching is recorded separately)."""
+        with self._lock:
+            stats = self._query_stats(fp)
+            stats.calls += 1
+            stats.execute_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.histogram.observe(seconds)
+            if error:
+                stats.errors += 1
+        rerun = getattr(self._local, 'rerun', None)
+        if rerun is not None:
+            rerun.queries += 1
+            rerun.db_seconds += seconds
+
+    def record_fetch(self, fp, seconds, rows):
+        with self._lock:
+            stats = self._query_stats(fp)
+            stats.fetch_seconds += seconds
+            stats.rows += rows
+        rerun = getattr(self._local, 'rerun', None)
+        if rerun is not None:
+            rerun.db_seconds += seconds
+
+    def is_slow(self, seconds):
+        return self.slow_query_seconds is not None and seconds >= self.slow_query_seconds
+
+    def record_slow(self, fp, seconds, sql):
+        """Log a statement whose execute + fetch time crossed the threshold.
+        Parameters are never logged (they can hold password hashes)."""
+        rerun = getattr(self._local, 'rerun', None)
+        entry = {
+            'at': time.time(),
+            'seconds': seconds,
+            'fingerprint': fp,
+            'rerun': rerun.label if rerun is not None else None,
+        }
+        with self._lock:
+            self._query_stats(fp).slow += 1
+            self._recent_slow.append(entry)
+        log.warning("slow query (%.1f ms): %s", seconds * 1000, _SPACE_RE.sub(' ', sql).strip()[:500])
+
+    # -- reruns ---------------------------------------------------------
+
+    @contextmanager
+    def rerun(self, label):
+        """Time one script run on this thread. Yields the run record, whose
+        `summary` dict is filled in when the block exits (even by raising,
+        as st.rerun() and st.stop() do)."""
+        current = _Rerun(label)
+        self._local.rerun = current
+        try:
+            yield current
+        finally:
+            self._local.rerun = None
+            elapsed = time.perf_counter() - current.started
+            with self._lock:
+                self._reruns.observe(elapsed)
+                self._rerun_queries.observe(current.queries)
+            current.summary = {
+                'label': label,
+                'at': time.time(),
+                'seconds': elapsed,
+                'queries': current.queries,
+                'db_seconds': current.db_seconds,
+                'sections': dict(current.sections),
+            }
+
+    @contextmanager
+    def section(self, name):
+        """Time a named part of the current rerun (also works outside one)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                hist = self._sections.get(name)
+                if hist is None:
+                    hist = self._sections[name] = _Histogram(DURATION_BUCKETS)
+                hist.observe(elapsed)
+            rerun = getattr(self._local, 'rerun', None)
+            if rerun is not None:
+                rerun.sections[name] = rerun.sections.get(name, 0.0) + elapsed
+
+    # -- reading --------------------------------------------------------
+
+    def add_collector(self, fn):
+        """Register fn() -> [(name, type, help, value)] for extra gauges and
+        counters (pool, cache, queue stats) in the Prometheus output."""
+        self._collectors.append(fn)
+
+    def query_table(self):
+        """Per-fingerprint statistics, slowest total time first."""
+        with self._lock:
+            rows = [
+                {
+                    'fingerprint': fp,
+                    'calls': s.calls,
+                    'errors': s.errors,
+                    'slow': s.slow,
+                    'rows': s.rows,
+                    'total_ms': (s.execute_seconds + s.fetch_seconds) * 1000,
+                    'mean_ms': (s.execute_seconds + s.fetch_seconds) * 1000 / s.calls if s.calls else 0.0,
+                    'p95_ms': (s.histogram.quantile(0.95) or 0.0) * 1000,
+                    'max_ms': s.max_seconds * 1000,
+                }
+                for fp, s in self._queries.items()
+            ]
+        rows.sort(key=lambda r: r['total_ms'], reverse=True)
+        return rows
+
+    def section_table(self):
+        with self._lock:
+            rows = [
+                {
+                    'section': name,
+                    'runs': h.count,
+                    'mean_ms': h.total * 1000 / h.count if h.count else 0.0,
+                    'p95_ms': (h.quantile(0.95) or 0.0) * 1000,
+                }
+                for name, h in self._sections.items()
+            ]
+        rows.sort(key=lambda r: r['section'])
+        return rows
+
+    def recent_slow_queries(self):
+        with self._lock:
+            return list(reversed(self._recent_slow))
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, hist, labels=''):
+            cumulative = 0
+            sep = ',' if labels else ''
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+            suffix = f"{{{labels}}}" if labels else ''
+            lines.append(f"{name}_sum{suffix} {_format_value(hist.total)}")
+            lines.append(f"{name}_count{suffix} {hist.count}")
+
+        with self._lock:
+            queries = sorted(self._queries.items())
+            header('exam_db_query_duration_seconds', 'histogram',
+                   'Statement execute time by fingerprint (fetching excluded).')
+            for fp, s in queries:
+                histogram('exam_db_query_duration_seconds', s.histogram, f'fingerprint="{_escape(fp)}"')
+            for name, attr, kind, help_text in (
+                ('exam_db_query_fetch_seconds_total', 'fetch_seconds', 'counter', 'Time spent fetching rows by fingerprint.'),
+                ('exam_db_query_rows_total', 'rows', 'counter', 'Rows fetched by fingerprint.'),
+                ('exam_db_query_errors_total', 'errors', 'counter', 'Statements that raised, by fingerprint.'),
+                ('exam_db_slow_queries_total', 'slow', 'counter', 'Statements over the slow-query threshold, by fingerprint.'),
+            ):
+                header(name, kind, help_text)
+                for fp, s in queries:
+                    lines.append(f'{name}{{fingerprint="{_escape(fp)}"}} {_format_value(getattr(s, attr))}')
+
+            header('exam_rerun_duration_seconds', 'histogram', 'Wall-clock time of a Streamlit script run.')
+            histogram('exam_rerun_duration_seconds', self._reruns)
+            header('exam_rerun_queries', 'histogram', 'Statements issued by one Streamlit script run.')
+            histogram('exam_rerun_queries', self._rerun_queries)
+            header('exam_rerun_section_duration_seconds', 'histogram', 'Wall-clock time of a named page section.')
+            for name, hist in sorted(self._sections.items()):
+                histogram('exam_rerun_section_duration_seconds', hist, f'section="{_escape(name)}"')
+
+        header('exam_process_start_time_seconds', 'gauge', 'Start time of the process since the Unix epoch.')
+        lines.append(f"exam_process_start_time_seconds {_format_value(self.started)}")
+        for collect in list(self._collectors):
+            try:
+                samples = list(collect())
+            except Exception:
+                continue
+            for name, kind, help_text, value in samples:
+                header(name, kind, help_text)
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path, min_interval=0):
+        """Atomically write the Prometheus text to `path` ({pid} is replaced
+        by the process id, so several workers can share a directory).
+        Skipped, returning None, if the last write was under `min_interval`
+        seconds ago."""
+        now = time.monotonic()
+        with self._lock:
+            if self._textfile_written is not None and now - self._textfile_written < min_interval:
+                return None
+            self._textfile_written = now
+        path = path.replace('{pid}', str(os.getpid()))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+        return path
+
+    def serve_http(self, port, host='0.0.0.0'):
+        """Serve /metrics from a daemon thread. Returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
@@ -1,34 +1,420 @@
+import time
+# start of this script run, for the startup budget
+_SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
-import mysql.connector
-from mysql.connector import Error
+import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import atexit
 import hashlib
-import pandas as pd
+import logging
+import os
+import tempfile
+import uuid
+import threading
 from datetime import datetime
 
-# try optional fallback driver
-try:
-    import pymysql
-except Exception:
-    pymysql = None
+import admission
+import autosave
+import exam_draft
+import exam_timer
+import metrics
+import question_bank
+import question_import
+import shared_cache
+import startup
+import storage
+import write_behind
+
+# Imported at first use (see startup.py): pandas only renders admin tables,
+# numpy (grading, item_analysis) is first needed on submit, pyarrow
+# (results_export) only for Parquet exports. mysql.connector is imported at
+# the first MySQL connection, and the PyMySQL fallback driver only when the
+# fallback is taken.
+pd = startup.lazy_import('pandas')
+grading = startup.lazy_import('grading')
+item_analysis = startup.lazy_import('item_analysis')
+results_export = startup.lazy_import('results_export')
+mysql_connector = startup.lazy_import('mysql.connector')
+pymysql = startup.lazy_import('pymysql')
+
+# Background threads (write-behind, autosave) report here, not through st.*
+log = logging.getLogger('online_exam')
+
+# Storage backend: 'mysql' (default) or 'sqlite' for an embedded database file
+STORAGE_BACKEND = os.environ.get('EXAM_STORAGE', 'mysql').lower()
+SQLITE_PATH = os.environ.get('EXAM_SQLITE_PATH', 'online_exam.db')
+
+# Database settings (override with environment variables)
+DB_CONFIG = {
+    'host': os.environ.get('EXAM_DB_HOST', 'localhost'),
+    'port': int(os.environ.get('EXAM_DB_PORT', '3306')),
+    'database': os.environ.get('EXAM_DB_NAME', 'online_exam'),
+    'user': os.environ.get('EXAM_DB_USER', 'root'),
+    'password': os.environ.get('EXAM_DB_PASSWORD', 'juned6504'),
+}
+
+# Read replicas: comma-separated host[:port] (MySQL, same database and
+# credentials as the primary) or file paths (SQLite, opened read-only).
+# Hot read-only queries go to them round-robin, writes to the primary. A
+# session that has written reads from the primary for EXAM_READ_YOUR_WRITES
+# seconds, which must exceed the replicas' usual lag.
+DB_REPLICAS = [r.strip() for r in os.environ.get('EXAM_DB_REPLICAS', '').split(',') if r.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('EXAM_READ_YOUR_WRITES', '5'))
+# Seconds a replica that failed to connect is skipped
+REPLICA_RETRY_SECONDS = float(os.environ.get('EXAM_REPLICA_RETRY', '30'))
+# Seconds to wait for a busy replica's pool before trying the next replica
+# (and finally the primary); a busy replica is not marked down
+REPLICA_ACQUIRE_TIMEOUT = float(os.environ.get('EXAM_REPLICA_ACQUIRE_TIMEOUT', '0.05'))
+
+# Connection pool settings (override with environment variables)
+POOL_SIZE = int(os.environ.get('EXAM_DB_POOL_SIZE', '5'))
+POOL_MAX_OVERFLOW = int(os.environ.get('EXAM_DB_POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = float(os.environ.get('EXAM_DB_POOL_TIMEOUT', '10'))
+
+# Seconds a process waits for another one's schema migrations (MySQL lock)
+MIGRATION_LOCK_TIMEOUT = int(os.environ.get('EXAM_MIGRATION_LOCK_TIMEOUT', '60'))
+
+# Admission control for logins and exam starts (see admission.py): at most
+# EXAM_ADMISSION_LIMIT of them use the database at once per process (0
+# disables), the rest wait in line. A script run waits up to
+# EXAM_ADMISSION_WAIT seconds for its turn, keeping the script thread short,
+# before showing the student their place and rerunning; a place not asked
+# for in EXAM_ADMISSION_ABANDON seconds is given up.
+ADMISSION_LIMIT = int(os.environ.get('EXAM_ADMISSION_LIMIT', str(POOL_SIZE)))
+ADMISSION_WAIT = float(os.environ.get('EXAM_ADMISSION_WAIT', '0.25'))
+ADMISSION_ABANDON = float(os.environ.get('EXAM_ADMISSION_ABANDON', '10'))
+# Seconds a session's successful login is remembered, so signing in again
+# in the same session skips users; at most EXAM_LOGIN_CACHE_SIZE are kept
+LOGIN_CACHE_TTL = float(os.environ.get('EXAM_LOGIN_CACHE_TTL', '300'))
+LOGIN_CACHE_SIZE = int(os.environ.get('EXAM_LOGIN_CACHE_SIZE', '10000'))
+
+# Maximum number of exam lists / question lists kept by the read cache
+CACHE_MAX_ENTRIES = int(os.environ.get('EXAM_CACHE_MAX_ENTRIES', '256'))
+
+# Where the read cache keeps its versions and values (see shared_cache.py).
+# 'process' is only correct with a single worker; deployments with several
+# Streamlit processes use 'sqlite' (workers on one host) or 'redis' (any
+# Redis-protocol server at EXAM_CACHE_URL) so invalidations reach them all.
+CACHE_BACKEND = os.environ.get('EXAM_CACHE_BACKEND', 'process').lower()
+CACHE_PATH = os.environ.get('EXAM_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'online_exam_cache.db'))
+CACHE_URL = os.environ.get('EXAM_CACHE_URL', 'redis://localhost:6379/0')
+# Seconds a value stays in the shared store; versions never expire
+CACHE_TTL = int(os.environ.get('EXAM_CACHE_TTL', '600'))
+# Key prefix, so several deployments can share one cache server
+CACHE_NAMESPACE = os.environ.get('EXAM_CACHE_NAMESPACE', DB_CONFIG['database'])
+
+# Rows per executemany() batch in bulk question imports, and how many
+# per-row errors an import report keeps
+IMPORT_BATCH_SIZE = int(os.environ.get('EXAM_IMPORT_BATCH_SIZE', '500'))
+IMPORT_MAX_REPORTED_ERRORS = 200
+
+# Optional write-behind for exam submissions: acknowledge once journaled to
+# local disk, insert into results from a background worker in groups
+WRITE_BEHIND_ENABLED = os.environ.get('EXAM_WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_JOURNAL_DIR = os.environ.get('EXAM_WRITE_BEHIND_DIR', 'submission_journal')
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('EXAM_WRITE_BEHIND_BATCH_SIZE', '500'))
+WRITE_BEHIND_LINGER = float(os.environ.get('EXAM_WRITE_BEHIND_LINGER', '0.2'))
+
+# Answer autosave: changes are written once they have been quiet for
+# EXAM_AUTOSAVE_DELAY seconds, and never later than EXAM_AUTOSAVE_MAX_DELAY
+AUTOSAVE_DELAY = float(os.environ.get('EXAM_AUTOSAVE_DELAY', '2'))
+AUTOSAVE_MAX_DELAY = float(os.environ.get('EXAM_AUTOSAVE_MAX_DELAY', '10'))
+
+# Rows fetched per round trip when streaming a results export, and where
+# exports prepared for download in the admin UI are written
+EXPORT_BATCH_SIZE = int(os.environ.get('EXAM_EXPORT_BATCH_SIZE', '5000'))
+EXPORT_DIR = os.environ.get('EXAM_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'online_exam_exports'))
+
+# Rows per page of the admin "View Results" grid
+RESULTS_PAGE_SIZE = int(os.environ.get('EXAM_RESULTS_PAGE_SIZE', '50'))
+
+# Entries on an exam's leaderboard in the admin "View Results" page
+LEADERBOARD_SIZE = int(os.environ.get('EXAM_LEADERBOARD_SIZE', '10'))
+
+# Fraction of a question's marks deducted for a wrong answer (0 disables)
+NEGATIVE_MARKING = float(os.environ.get('EXAM_NEGATIVE_MARKING', '0'))
+
+# Default number of exams per page on the admin "View Exams" page
+ADMIN_EXAMS_PAGE_SIZE = int(os.environ.get('EXAM_ADMIN_PAGE_SIZE', '20'))
+
+# Questions shown per page while taking an exam (1 = one at a time)
+EXAM_QUESTIONS_PER_PAGE = int(os.environ.get('EXAM_QUESTIONS_PER_PAGE', '10'))
+
+# Exam deadlines (see exam_timer.py). Submissions up to EXAM_DEADLINE_GRACE
+# seconds after the deadline are accepted, covering the click in flight.
+# Past that, EXAM_LATE_SUBMISSIONS=cap submits the answers given before the
+# deadline (the paper locks when it passes); =reject records no result.
+DEADLINE_GRACE = int(os.environ.get('EXAM_DEADLINE_GRACE', '30'))
+LATE_SUBMISSIONS = os.environ.get('EXAM_LATE_SUBMISSIONS', 'cap').lower()
+
+# Query and rerun instrumentation (see metrics.py). EXAM_METRICS=0 stops
+# timing individual statements; EXAM_SLOW_QUERY_MS=0 turns slow-query
+# logging off. The Prometheus text is written to EXAM_METRICS_FILE (at most
+# every EXAM_METRICS_FILE_INTERVAL seconds) and/or served on EXAM_METRICS_PORT.
+METRICS_ENABLED = os.environ.get('EXAM_METRICS', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('EXAM_SLOW_QUERY_MS', '250'))
+METRICS_FILE = os.environ.get('EXAM_METRICS_FILE')
+METRICS_FILE_INTERVAL = float(os.environ.get('EXAM_METRICS_FILE_INTERVAL', '15'))
+METRICS_PORT = int(os.environ.get('EXAM_METRICS_PORT', '0'))
+
+# Seconds the first script run of a worker process may take (imports,
+# migrations, first connections, first page); a slower one is logged with
+# the lazy imports it paid for. 0 disables the check.
+STARTUP_BUDGET = float(os.environ.get('EXAM_STARTUP_BUDGET', '2'))
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within POOL_TIMEOUT."""
+
+# Process-wide pool of raw driver connections. Idle connections are reused
+# (most recently returned first), up to `size` are kept open and up to
+# `max_overflow` extra ones are opened under load and closed on return.
+class _ConnectionPool:
+    def __init__(self, connect, size, max_overflow, timeout):
+        self._connect = connect
+        self._size = size
+        self._max_overflow = max_overflow
+        self._timeout = timeout
+        self._idle = []
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'failed_health_checks': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    def acquire(self, timeout=None):
+        """A (connection, driver) entry, waiting up to `timeout` seconds (the
+        pool's timeout by default) for one to become free."""
+        timeout = self._timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = start + timeout
+        entry = None
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._opened < self._size + self._max_overflow:
+                    # reserve a slot, the connection is opened outside the lock
+                    self._opened += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"no database connection available after {timeout:g}s "
+                        f"({self._opened} open)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        if entry is not None and not self._is_alive(entry):
+            with self._cond:
+                self._stats['failed_health_checks'] += 1
+            self._discard(entry[0], keep_slot=True)
+            entry = None
+        if entry is None:
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._cond.notify()
+                raise
+
+        wait = time.perf_counter() - start
+        with self._cond:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._stats['wait_seconds_total'] += wait
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait)
+        return entry
+
+    def release(self, entry):
+        conn = entry[0]
+        try:
+            # end the implicit transaction so the next borrower gets a fresh snapshot
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            if len(self._idle) < self._size:
+                self._idle.append(entry)
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def _is_alive(self, entry):
+        conn, driver = entry
+        try:
+            if driver == 'sqlite':
+                conn.execute("SELECT 1")
+            else:
+                conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn, keep_slot=False):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        if not keep_slot:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['max_overflow'] = self._max_overflow
+            stats['open'] = self._opened
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._opened - len(self._idle)
+        checkouts = stats['checkouts']
+        stats['wait_seconds_avg'] = stats['wait_seconds_total'] / checkouts if checkouts else 0.0
+        return stats
+
+# Callbacks invoked as fn(sql, params) after every statement executed through
+# _ConnWrapper cursors (used by tools such as explain_check.py).
+_statement_listeners = []
+
+def add_statement_listener(fn):
+    _statement_listeners.append(fn)
+
+def remove_statement_listener(fn):
+    if fn in _statement_listeners:
+        _statement_listeners.remove(fn)
 
-# Connection wrapper so existing code can call conn.cursor(dictionary=True)
+# Cursor proxy that times statements into the metrics registry and notifies
+# statement listeners. Cursors are only proxied while metrics are enabled or
+# a listener is registered.
+class _CursorWrapper:
+    def __init__(self, cursor, registry=None):
+        self._cursor = cursor
+        self._registry = registry
+        self._sql = None
+        self._fingerprint = None
+        self._elapsed = 0.0
+        self._slow_logged = False
+
+    def _timed_execute(self, method, sql, args):
+        if self._registry is None:
+            return method(*args)
+        self._sql = sql
+        self._fingerprint = metrics.fingerprint(sql)
+        self._slow_logged = False
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        except Exception:
+            self._registry.record_query(self._fingerprint, time.perf_counter() - start, error=True)
+            raise
+        self._elapsed = time.perf_counter() - start
+        self._registry.record_query(self._fingerprint, self._elapsed)
+        self._check_slow()
+        return result
+
+    def _check_slow(self):
+        if not self._slow_logged and self._registry.is_slow(self._elapsed):
+            self._slow_logged = True
+            self._registry.record_slow(self._fingerprint, self._elapsed, self._sql)
+
+    def _timed_fetch(self, method, many, *args):
+        if self._registry is None or self._fingerprint is None:
+            return method(*args)
+        start = time.perf_counter()
+        rows = method(*args)
+        seconds = time.perf_counter() - start
+        count = len(rows) if many else int(rows is not None)
+        self._elapsed += seconds
+        self._registry.record_fetch(self._fingerprint, seconds, count)
+        self._check_slow()
+        return rows
+
+    def execute(self, sql, params=None):
+        args = (sql,) if params is None else (sql, params)
+        result = self._timed_execute(self._cursor.execute, sql, args)
+        for fn in list(_statement_listeners):
+            fn(sql, params)
+        return result
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        result = self._timed_execute(self._cursor.executemany, sql, (sql, seq_params))
+        for fn in list(_statement_listeners):
+            for params in seq_params:
+                fn(sql, params)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone, False)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(self._cursor.fetchmany, True, *args)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall, True)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+# Connection wrapper so existing code can call conn.cursor(dictionary=True).
+# close() hands the connection back to the pool instead of closing it.
 class _ConnWrapper:
-    def __init__(self, conn, is_pymysql=False):
+    def __init__(self, conn, driver='mysql-connector', pool=None, registry=None):
         self._conn = conn
-        self._is_pymysql = is_pymysql
+        self._driver = driver
+        self._pool = pool
+        self._registry = registry
 
-    def cursor(self, dictionary=False):
-        if self._is_pymysql:
-            # return a PyMySQL DictCursor when dictionary=True
-            return self._conn.cursor(pymysql.cursors.DictCursor if dictionary else None)
+    def cursor(self, dictionary=False, stream=False):
+        # stream=True returns an unbuffered, server-side cursor whose rows are
+        # read from the network as they are fetched; the connection can't run
+        # anything else until the cursor is exhausted or closed
+        if self._driver == 'pymysql':
+            if stream:
+                cursor = self._conn.cursor(pymysql.cursors.SSDictCursor if dictionary else pymysql.cursors.SSCursor)
+            else:
+                # return a PyMySQL DictCursor when dictionary=True
+                cursor = self._conn.cursor(pymysql.cursors.DictCursor if dictionary else None)
+        elif self._driver == 'sqlite':
+            # sqlite3 cursors already step through results lazily
+            cursor = storage.SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+        elif stream:
+            cursor = self._conn.cursor(dictionary=dictionary, buffered=False)
         else:
-            return self._conn.cursor(dictionary=dictionary)
+            cursor = self._conn.cursor(dictionary=dictionary)
+        if self._registry is not None or _statement_listeners:
+            return _CursorWrapper(cursor, self._registry)
+        return cursor
 
     def commit(self):
         return self._conn.commit()
 
+    def rollback(self):
+        return self._conn.rollback()
+
     def close(self):
-        return self._conn.close()
+        if self._conn is None:
+            return None
+        conn, self._conn = self._conn, None
+        if self._pool is not None:
+            return self._pool.release((conn, self._driver))
+        return conn.close()
 
 # Safe rerun helper (works across Streamlit versions)
 def safe_rerun():
@@ -41,327 +427,1074 @@ def safe_rerun():
         st.stop()
 
 # Database connection
-def create_connection():
+def _open_raw_connection(replica=None):
     """Try mysql-connector (with mysql_native_password). If it fails due to
-    caching_sha2_password, fall back to PyMySQL (install with `pip install PyMySQL`)."""
+    caching_sha2_password, fall back to PyMySQL (install with `pip install PyMySQL`).
+    With EXAM_STORAGE=sqlite open the embedded database file instead.
+    `replica` is an entry of DB_REPLICAS; None opens the primary.
+    Returns a (connection, driver) pair and raises on failure."""
+    if STORAGE_BACKEND == 'sqlite':
+        if replica is not None:
+            return storage.connect_sqlite(replica, read_only=True), 'sqlite'
+        return storage.connect_sqlite(SQLITE_PATH), 'sqlite'
+    host, port = DB_CONFIG['host'], DB_CONFIG['port']
+    if replica is not None:
+        host, _, replica_port = replica.partition(':')
+        port = int(replica_port or port)
     try:
-        conn = mysql.connector.connect(
-            host='localhost',
-            database='online_exam',
-            user='root',
-            password='juned6504',
+        conn = mysql_connector.connect(
+            host=host,
+            port=port,
+            database=DB_CONFIG['database'],
+            user=DB_CONFIG['user'],
+            password=DB_CONFIG['password'],
             auth_plugin='mysql_native_password',
             use_pure=True
         )
-        return _ConnWrapper(conn, is_pymysql=False)
+        return conn, 'mysql-connector'
     except Exception as e:
         err = str(e)
         # If connector doesn't support caching_sha2_password try PyMySQL fallback
-        if ('caching_sha2_password' in err or 'Authentication plugin' in err) and pymysql:
+        if ('caching_sha2_password' in err or 'Authentication plugin' in err) and startup.available('pymysql'):
             try:
                 pconn = pymysql.connect(
-                    host='localhost',
-                    user='root',
-                    password='juned6504',
-                    db='online_exam',
+                    host=host,
+                    port=port,
+                    user=DB_CONFIG['user'],
+                    password=DB_CONFIG['password'],
+                    db=DB_CONFIG['database'],
                     cursorclass=pymysql.cursors.DictCursor,
                     autocommit=False
                 )
-                return _ConnWrapper(pconn, is_pymysql=True)
+                return pconn, 'pymysql'
             except Exception as e2:
-                st.error(f"Fallback PyMySQL connection failed: {e2}")
-                return None
+                raise RuntimeError(f"Fallback PyMySQL connection failed: {e2}") from e2
+        raise
+
+# One pool per server process, shared by every Streamlit session
+@st.cache_resource
+def get_connection_pool():
+    return _ConnectionPool(_open_raw_connection, POOL_SIZE, POOL_MAX_OVERFLOW, POOL_TIMEOUT)
+
+def get_pool_stats():
+    return get_connection_pool().stats()
+
+class _ReplicaRouter:
+    """Round-robin over the replica pools, skipping a replica for a while
+    after it fails to connect. A replica whose pool is merely busy is passed
+    over after `acquire_timeout` seconds, for this read only."""
+
+    def __init__(self, replicas, retry_after, acquire_timeout):
+        self._pools = [
+            (name, _ConnectionPool(lambda name=name: _open_raw_connection(name), POOL_SIZE, POOL_MAX_OVERFLOW, POOL_TIMEOUT))
+            for name in replicas
+        ]
+        self._retry_after = retry_after
+        self._acquire_timeout = acquire_timeout
+        self._down_until = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'replica_failures': 0, 'replica_busy': 0}
+
+    def acquire(self):
+        """(pool, (connection, driver)) from a healthy replica, or None."""
+        with self._lock:
+            now = time.monotonic()
+            start = self._next
+            self._next = (self._next + 1) % len(self._pools)
+            order = [self._pools[(start + i) % len(self._pools)] for i in range(len(self._pools))]
+            order = [(name, pool) for name, pool in order if self._down_until.get(name, 0) <= now]
+        for name, pool in order:
+            try:
+                entry = pool.acquire(self._acquire_timeout)
+            except PoolTimeout:
+                # saturated, not down: try the next one right away
+                with self._lock:
+                    self._stats['replica_busy'] += 1
+                continue
+            except Exception:
+                with self._lock:
+                    self._down_until[name] = time.monotonic() + self._retry_after
+                    self._stats['replica_failures'] += 1
+                continue
+            with self._lock:
+                self._stats['replica_reads'] += 1
+            return pool, entry
+        return None
+
+    def count_primary_read(self):
+        with self._lock:
+            self._stats['primary_reads'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            down = {name for name, until in self._down_until.items() if until > time.monotonic()}
+        stats['replicas'] = {name: dict(pool.stats(), down=name in down) for name, pool in self._pools}
+        return stats
+
+# None without replicas
+@st.cache_resource
+def get_replica_router():
+    return _ReplicaRouter(DB_REPLICAS, REPLICA_RETRY_SECONDS, REPLICA_ACQUIRE_TIMEOUT) if DB_REPLICAS else None
+
+def _cache_backend():
+    if CACHE_BACKEND == 'sqlite':
+        return shared_cache.SQLiteBackend(CACHE_PATH)
+    if CACHE_BACKEND == 'redis':
+        return shared_cache.RESPBackend.from_url(CACHE_URL)
+    return None
+
+# Shared by every session in the process, like the connection pool; with a
+# shared backend, versions and values are also shared between processes
+@st.cache_resource
+def get_read_cache():
+    return shared_cache.ReadCache(CACHE_MAX_ENTRIES, _cache_backend(), CACHE_TTL, CACHE_NAMESPACE)
+
+def get_cache_stats():
+    return get_read_cache().stats()
+
+def _resource_metrics():
+    # pool, cache and queue figures for the Prometheus output
+    pool = get_pool_stats()
+    cache = get_cache_stats()
+    samples = [
+        ('exam_db_pool_open_connections', 'gauge', 'Connections currently open by the pool.', pool['open']),
+        ('exam_db_pool_in_use_connections', 'gauge', 'Connections currently checked out.', pool['in_use']),
+        ('exam_db_pool_checkouts_total', 'counter', 'Connections handed out by the pool.', pool['checkouts']),
+        ('exam_db_pool_waits_total', 'counter', 'Checkouts that had to wait for a connection.', pool['waits']),
+        ('exam_db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting.', pool['timeouts']),
+        ('exam_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for connections.', pool['wait_seconds_total']),
+        ('exam_read_cache_hits_total', 'counter', 'Read cache hits.', cache['hits']),
+        ('exam_read_cache_misses_total', 'counter', 'Read cache misses.', cache['misses']),
+        ('exam_read_cache_entries', 'gauge', 'Entries held by the read cache.', cache['entries']),
+        ('exam_read_cache_shared_hits_total', 'counter', 'Read cache hits served from the shared store.', cache['shared_hits']),
+        ('exam_read_cache_backend_errors_total', 'counter', 'Failed shared cache store operations.', cache['backend_errors']),
+    ]
+    saver = get_answer_saver().stats()
+    samples += [
+        ('exam_autosave_pending_answers', 'gauge', 'Answer changes not yet written.', saver['pending']),
+        ('exam_autosave_written_total', 'counter', 'Answer changes written by autosave.', saver['written']),
+        ('exam_autosave_batches_total', 'counter', 'Autosave write batches.', saver['batches']),
+        ('exam_autosave_flush_failures_total', 'counter', 'Failed autosave batches.', saver['flush_failures']),
+    ]
+    first_run = get_startup_timer().stats()['first_run_seconds']
+    if first_run is not None:
+        samples.append(('exam_startup_first_run_seconds', 'gauge',
+                        'Wall-clock time of the first script run of the process.', first_run))
+    controller = get_admission_controller()
+    if controller is not None:
+        stats = controller.stats()
+        samples += [
+            ('exam_admission_in_flight', 'gauge', 'Logins and exam starts using the database now.', stats['in_flight']),
+            ('exam_admission_queued', 'gauge', 'Sessions waiting in line to log in or start an exam.', stats['queued']),
+            ('exam_admission_admitted_total', 'counter', 'Logins and exam starts admitted.', stats['admitted']),
+            ('exam_admission_waited_total', 'counter', 'Admissions that had to wait in line.', stats['waited']),
+            ('exam_admission_abandoned_total', 'counter', 'Places in line given up by sessions that left.', stats['abandoned']),
+        ]
+    logins = get_verified_logins().stats()
+    samples += [
+        ('exam_login_cache_hits_total', 'counter', 'Logins answered from the verified-login cache.', logins['hits']),
+        ('exam_login_cache_misses_total', 'counter', 'Logins checked against the database.', logins['misses']),
+    ]
+    replicas = get_replica_stats()
+    if replicas is not None:
+        samples += [
+            ('exam_db_replica_reads_total', 'counter', 'Read-only queries served by a replica.', replicas['replica_reads']),
+            ('exam_db_primary_reads_total', 'counter', 'Read-only queries sent to the primary while replicas are configured.', replicas['primary_reads']),
+            ('exam_db_replica_failures_total', 'counter', 'Replica checkouts that failed.', replicas['replica_failures']),
+            ('exam_db_replica_busy_total', 'counter', 'Reads that passed over a replica whose pool was busy.', replicas['replica_busy']),
+        ]
+    queue = get_submission_queue()
+    if queue is not None:
+        stats = queue.stats()
+        samples += [
+            ('exam_submission_queue_pending', 'gauge', 'Journaled submissions not yet in the database.', stats['pending']),
+            ('exam_submission_queue_flushed_total', 'counter', 'Submissions written by the write-behind worker.', stats['flushed']),
+            ('exam_submission_queue_flush_failures_total', 'counter', 'Failed write-behind batches.', stats['flush_failures']),
+        ]
+    return samples
+
+# One metrics registry per process; also starts the /metrics endpoint when
+# EXAM_METRICS_PORT is set
+@st.cache_resource
+def get_metrics():
+    registry = metrics.MetricsRegistry(slow_query_seconds=SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS > 0 else None)
+    registry.add_collector(_resource_metrics)
+    if METRICS_PORT:
+        registry.serve_http(METRICS_PORT)
+    return registry
+
+# Times the first script run of the process against STARTUP_BUDGET
+@st.cache_resource
+def get_startup_timer():
+    return startup.StartupTimer(STARTUP_BUDGET)
+
+def export_metrics():
+    """Refresh the Prometheus text file, if one is configured (throttled)."""
+    if METRICS_FILE:
+        try:
+            get_metrics().write_textfile(METRICS_FILE, METRICS_FILE_INTERVAL)
+        except OSError:
+            # best effort: a bad path must not break the page
+            pass
+
+def _flush_submissions(repository, records):
+    # called from the write-behind worker thread; failures raise so the
+    # worker retries the batch
+    repository.insert_results_idempotent(records)
+
+# One queue per process; replays journals left behind by crashed processes
+# when it starts. None when write-behind is disabled.
+@st.cache_resource
+def get_submission_queue():
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    repository = get_worker_repository()
+    queue = write_behind.WriteBehindQueue(
+        WRITE_BEHIND_JOURNAL_DIR, lambda records: _flush_submissions(repository, records),
+        batch_size=WRITE_BEHIND_BATCH_SIZE, linger=WRITE_BEHIND_LINGER
+    ).start()
+    atexit.register(queue.stop)
+    return queue
+
+def _flush_answers(repository, changes):
+    # called from the autosave worker thread; failures raise so it retries
+    repository.save_answers(changes)
+
+# One autosave worker per process, shared by every session
+@st.cache_resource
+def get_answer_saver():
+    repository = get_worker_repository()
+    saver = autosave.AnswerSaver(
+        lambda changes: _flush_answers(repository, changes), delay=AUTOSAVE_DELAY, max_delay=AUTOSAVE_MAX_DELAY
+    ).start()
+    atexit.register(saver.stop)
+    return saver
+
+# One admission controller per process; None when admission control is off
+@st.cache_resource
+def get_admission_controller():
+    if ADMISSION_LIMIT <= 0:
+        return None
+    return admission.AdmissionController(ADMISSION_LIMIT, abandon_after=ADMISSION_ABANDON)
+
+@st.cache_resource
+def get_verified_logins():
+    return admission.VerifiedLogins(LOGIN_CACHE_TTL, LOGIN_CACHE_SIZE)
+
+def _render_waiting(placeholder, waiting, activity):
+    placeholder.info(
+        f"⏳ Lots of students are {activity} right now. You are number {waiting.position} in line, "
+        f"about {int(waiting.eta_seconds) + 1}s to go. Keep this page open, it carries on by itself."
+    )
+
+def run_admitted(activity, fn, *args):
+    """fn(*args) once this session is admitted. While it waits in line the
+    student sees their place and the script reruns to ask again, so this
+    only returns after fn has run."""
+    controller = get_admission_controller()
+    if controller is None or not _in_session():
+        return fn(*args)
+    ticket = st.session_state.get('admission_ticket')
+    if ticket is None:
+        ticket = st.session_state.admission_ticket = uuid.uuid4().hex
+    status = st.empty()
+    waiting = st.session_state.get('admission_waiting')
+    if waiting is not None:
+        _render_waiting(status, waiting, activity)
+    if not controller.acquire(ticket, ADMISSION_WAIT):
+        waiting = controller.waiting(ticket)
+        st.session_state.admission_waiting = waiting
+        if waiting is not None:
+            _render_waiting(status, waiting, activity)
+        st.rerun()
+    st.session_state.pop('admission_waiting', None)
+    status.empty()
+    try:
+        return fn(*args)
+    finally:
+        controller.release(ticket)
+
+# Queued in this process or in any worker sharing WRITE_BEHIND_JOURNAL_DIR
+def submission_pending(student_id, exam_id):
+    queue = get_submission_queue()
+    return queue is not None and queue.is_pending(student_id, exam_id)
+
+# Cache scopes: the exam list, and one question list per exam
+EXAMS_SCOPE = 'exams'
+
+def _questions_scope(exam_id):
+    return ('questions', int(exam_id))
+
+def create_connection():
+    """Check a connection out of the process-wide pool. Callers keep using
+    conn.close(), which returns it to the pool."""
+    pool = get_connection_pool()
+    try:
+        conn, driver = pool.acquire()
+        return _ConnWrapper(conn, driver=driver, pool=pool, registry=get_metrics() if METRICS_ENABLED else None)
+    except PoolTimeout as e:
+        st.error(f"Database is busy, please try again: {e}")
+        return None
+    except RuntimeError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        if STORAGE_BACKEND == 'sqlite':
+            st.error(f"Error opening SQLite database {SQLITE_PATH}: {e}")
         else:
             st.error(f"Error connecting to MySQL: {e}")
+        return None
+
+# Read-your-writes: a write marks the session, and its reads stay on the
+# primary until the replicas have caught up. Only the write helpers below
+# mark it; reads that merely use the primary (attempt state, cache misses)
+# don't. Threads outside a script run (autosave, write-behind) have no
+# session and are never marked.
+def _in_session():
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+def _stick_to_primary():
+    if DB_REPLICAS and READ_YOUR_WRITES_SECONDS > 0 and _in_session():
+        st.session_state.primary_reads_until = time.time() + READ_YOUR_WRITES_SECONDS
+
+def _reads_from_primary():
+    return _in_session() and st.session_state.get('primary_reads_until', 0) > time.time()
+
+def create_read_connection():
+    """A connection for a read-only query: from a replica unless there are
+    none, this session has just written, or no replica is reachable."""
+    router = get_replica_router()
+    if router is None:
+        return create_connection()
+    if not _reads_from_primary():
+        acquired = router.acquire()
+        if acquired is not None:
+            pool, (conn, driver) = acquired
+            return _ConnWrapper(conn, driver=driver, pool=pool, registry=get_metrics() if METRICS_ENABLED else None)
+    router.count_primary_read()
+    return create_connection()
+
+def _worker_connector(pool, registry):
+    # connect() for background threads: there is no page to st.error() on,
+    # so failures are logged and the repository call raises for a retry
+    def connect():
+        try:
+            conn, driver = pool.acquire()
+        except Exception as e:
+            log.warning("Background database write could not get a connection: %s", e)
             return None
+        return _ConnWrapper(conn, driver=driver, pool=pool, registry=registry)
+    return connect
+
+def get_replica_stats():
+    router = get_replica_router()
+    return router.stats() if router is not None else None
+
+def _make_repository(connect, connect_read=None):
+    admin_hash = hash_password('jnx@6504')
+    if STORAGE_BACKEND == 'sqlite':
+        return storage.SQLiteRepository(connect, admin_hash, connect_read=connect_read)
+    return storage.MySQLRepository(connect, admin_hash, lock_timeout=MIGRATION_LOCK_TIMEOUT,
+                                   connect_read=connect_read)
+
+# Repository for the configured backend; every helper below goes through it
+@st.cache_resource
+def get_repository():
+    return _make_repository(create_connection, connect_read=create_read_connection)
+
+# Repository for worker threads (write-behind, autosave), built while a
+# script run is active and handed to the worker, so the thread never
+# touches st.* itself
+@st.cache_resource
+def get_worker_repository():
+    return _make_repository(_worker_connector(get_connection_pool(), get_metrics() if METRICS_ENABLED else None))
+
+# Schema migrations are defined per backend in storage.py and applied once
+# per process, under a lock that other processes wait on
+def run_migrations():
+    """Apply pending migrations and return the versions applied."""
+    return get_repository().run_migrations()
+
+# Cached for the life of the process, so schema work happens once per worker
+# rather than on every rerun. Failures are not cached and are retried.
+@st.cache_resource
+def _ensure_schema():
+    return run_migrations()
 
 # Initialize database tables
 def init_database():
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                user_type ENUM('admin', 'student') NOT NULL,
-                full_name VARCHAR(255),
-                email VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Ensure legacy tables get new columns if they were created before the email/full_name fields existed
-        cursor.execute("SHOW COLUMNS FROM users LIKE 'email'")
-        if cursor.fetchone() is None:
-            cursor.execute("ALTER TABLE users ADD COLUMN email VARCHAR(255)")
-        cursor.execute("SHOW COLUMNS FROM users LIKE 'full_name'")
-        if cursor.fetchone() is None:
-            cursor.execute("ALTER TABLE users ADD COLUMN full_name VARCHAR(255)")
-        
-        # Create default admin user
-        admin_password = hash_password('jnx@6504')
-        cursor.execute("""
-            INSERT IGNORE INTO users (username, password, user_type, full_name)
-            VALUES ('admin', %s, 'admin', 'Administrator')
-        """, (admin_password,))
-        
-        # Exams table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS exams (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                exam_name VARCHAR(255) NOT NULL,
-                duration_minutes INT NOT NULL,
-                total_marks INT NOT NULL,
-                created_by INT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (created_by) REFERENCES users(id)
-            )
-        """)
-        
-        # Questions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS questions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                exam_id INT NOT NULL,
-                question_text TEXT NOT NULL,
-                option_a VARCHAR(255) NOT NULL,
-                option_b VARCHAR(255) NOT NULL,
-                option_c VARCHAR(255) NOT NULL,
-                option_d VARCHAR(255) NOT NULL,
-                correct_answer ENUM('A', 'B', 'C', 'D') NOT NULL,
-                marks INT DEFAULT 1,
-                FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Results table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS results (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT NOT NULL,
-                exam_id INT NOT NULL,
-                score INT NOT NULL,
-                total_marks INT NOT NULL,
-                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (student_id) REFERENCES users(id),
-                FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
-            )
-        """)
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+    try:
+        _ensure_schema()
+        return True
+    except Exception as e:
+        st.error(f"Database initialisation failed: {e}")
+        return False
 
 # Hash password
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-# Authentication
-def authenticate(username, password, user_type):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        hashed_pw = hash_password(password)
-        cursor.execute(
-            "SELECT * FROM users WHERE username=%s AND password=%s AND user_type=%s",
-            (username, hashed_pw, user_type)
-        )
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return user
-    return None
+# Authentication. A session's successful logins are remembered for
+# LOGIN_CACHE_TTL seconds, so signing in again in that session doesn't
+# query users.
+def authenticate(username, password, user_type, queue=False):
+    """The user row for valid credentials, else None. With queue=True the
+    database check waits its turn in admission control."""
+    password_hash = hash_password(password)
+    session = _login_session()
+    logins = get_verified_logins()
+    user = logins.get(session, user_type, username, password_hash) if session else None
+    if user is None:
+        lookup = get_repository().authenticate
+        if queue:
+            user = run_admitted("signing in", lookup, username, password_hash, user_type)
+        else:
+            user = lookup(username, password_hash, user_type)
+        if user and session:
+            logins.put(session, user_type, username, password_hash, user)
+    return user
+
+def _login_session():
+    # the verified-login cache key of this browser session; None outside one
+    if not _in_session():
+        return None
+    if 'login_session' not in st.session_state:
+        st.session_state.login_session = uuid.uuid4().hex
+    return st.session_state.login_session
+
+def complete_login(username, password, user_type, error):
+    """Sign in with the session's pending login (see login_page)."""
+    user = authenticate(username, password, user_type, queue=True)
+    del st.session_state['pending_login']
+    if user:
+        st.session_state.logged_in = True
+        st.session_state.user_type = user_type
+        st.session_state.user_data = user
+        st.rerun()
+    st.error(error)
 
 # Student Registration
 def register_student(username, password, full_name, email):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            hashed_pw = hash_password(password)
-            cursor.execute(
-                "INSERT INTO users (username, password, user_type, full_name, email) VALUES (%s, %s, 'student', %s, %s)",
-                (username, hashed_pw, full_name, email)
-            )
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return True
-        except Error as e:
-            st.error(f"Registration failed: {e}")
-            return False
-    return False
+    try:
+        registered = get_repository().register_student(username, hash_password(password), full_name, email)
+    except Exception as e:
+        st.error(f"Registration failed: {e}")
+        return False
+    if registered:
+        _stick_to_primary()
+    return registered
 
 # Admin Functions
-def create_exam(exam_name, duration, total_marks, admin_id):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO exams (exam_name, duration_minutes, total_marks, created_by) VALUES (%s, %s, %s, %s)",
-            (exam_name, duration, total_marks, admin_id)
-        )
-        exam_id = cursor.lastrowid
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return exam_id
-    return None
+def create_exam(exam_name, duration, total_marks, admin_id, questions=()):
+    """Save an exam together with its questions (dicts keyed like
+    question_import.COLUMNS) in one transaction. Returns the exam id, or
+    None if nothing was saved."""
+    rows = [tuple(q[c] for c in question_import.COLUMNS) for q in questions]
+    try:
+        exam_id = get_repository().create_exam(exam_name, duration, total_marks, admin_id, rows)
+    except Exception as e:
+        st.error(f"Saving the exam failed, nothing was written: {e}")
+        return None
+    if exam_id:
+        _stick_to_primary()
+        get_read_cache().invalidate(EXAMS_SCOPE)
+        get_read_cache().invalidate(_questions_scope(exam_id))
+    return exam_id
 
-def add_question(exam_id, question, opt_a, opt_b, opt_c, opt_d, correct, marks):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO questions (exam_id, question_text, option_a, option_b, 
-               option_c, option_d, correct_answer, marks) 
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-            (exam_id, question, opt_a, opt_b, opt_c, opt_d, correct, marks)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    return False
+def import_questions(exam_id, fileobj, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Bulk-load questions for an exam from a CSV/JSON/JSONL stream.
+
+    Rows are validated as they are read and inserted with executemany() in
+    batches, all inside one transaction. Invalid rows, and rows the database
+    rejects, are reported and skipped without aborting the rest. Returns a
+    report dict: inserted, failed, errors [(row_number, message)] and
+    errors_truncated (errors beyond IMPORT_MAX_REPORTED_ERRORS)."""
+    report = {'inserted': 0, 'failed': 0, 'errors': [], 'errors_truncated': 0}
+
+    def record_error(row_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+            report['errors'].append((row_number, message))
+        else:
+            report['errors_truncated'] += 1
+
+    rows = question_import.iter_questions(fileobj, fmt)
+    try:
+        inserted = get_repository().import_questions(exam_id, rows, batch_size, record_error)
+    except LookupError as e:
+        raise question_import.ImportFormatError(str(e))
+    if inserted is None:
+        return None
+    report['inserted'] = inserted
+    if inserted:
+        _stick_to_primary()
+        get_read_cache().invalidate(_questions_scope(exam_id))
+    return report
 
 def delete_exam(exam_id):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM exams WHERE id=%s", (exam_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+    if get_repository().delete_exam(exam_id):
+        cache = get_read_cache()
+        cache.invalidate(EXAMS_SCOPE)
+        cache.invalidate(_questions_scope(exam_id))
         return True
     return False
 
+def _load_all_exams():
+    return get_repository().all_exams()
+
 def get_all_exams():
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM exams ORDER BY created_at DESC")
-        exams = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return exams
-    return []
+    exams = get_read_cache().get_or_load(EXAMS_SCOPE, _load_all_exams)
+    return list(exams) if exams is not None else []
+
+def count_exams():
+    return get_repository().count_exams() or 0
+
+def get_exams_page(after=None, limit=ADMIN_EXAMS_PAGE_SIZE):
+    """One page of exams, newest first, with question counts and marks.
+    Paging is keyset based: pass the returned cursor as `after` to get the
+    next page. Returns (exams, next_cursor); next_cursor is None on the last page."""
+    page = get_repository().exams_page(after, limit)
+    return page if page is not None else ([], None)
+
+def _load_exam_questions(exam_id):
+    return get_repository().exam_questions(exam_id)
 
 def get_exam_questions(exam_id):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM questions WHERE exam_id=%s", (exam_id,))
-        questions = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return questions
-    return []
+    questions = get_read_cache().get_or_load(
+        _questions_scope(exam_id), lambda: _load_exam_questions(exam_id)
+    )
+    return list(questions) if questions is not None else []
+
+# Question pools and random papers (see question_bank.py)
+def get_pool_sizes(exam_id):
+    """{(topic, difficulty): size} for an exam, cached with its questions."""
+    sizes = get_read_cache().get_or_load(
+        _questions_scope(exam_id), lambda: get_repository().pool_sizes(exam_id), kind='pools'
+    )
+    return dict(sizes) if sizes is not None else {}
+
+def set_exam_blueprint(exam_id, draws):
+    """Store a paper blueprint ([question_bank.PoolDraw]); an empty list
+    gives every student the full question list again."""
+    blueprint = question_bank.format_blueprint(draws) if draws else None
+    if get_repository().set_exam_blueprint(exam_id, blueprint):
+        get_read_cache().invalidate(EXAMS_SCOPE)
+        return True
+    return False
+
+def rebuild_question_pools(exam_id=None):
+    if not get_repository().rebuild_pools(exam_id):
+        return False
+    if exam_id is not None:
+        get_read_cache().invalidate(_questions_scope(exam_id))
+    return True
+
+def draw_paper(exam_id, seed, spec):
+    """Rebuild a random paper from its stored seed and spec."""
+    return get_repository().draw_pool_questions(exam_id, question_bank.draw_positions(seed, spec))
+
+def get_attempt_paper(exam, attempt):
+    """The questions of an attempt: drawn from the exam's pools when it has
+    a blueprint (fixing the seed and spec on first use), else every question."""
+    draws = question_bank.parse_blueprint(exam.get('paper_blueprint'))
+    if not draws:
+        return get_exam_questions(exam['id'])
+    seed, spec = attempt.get('paper_seed'), attempt.get('paper_spec')
+    if spec is None:
+        stored = get_repository().set_attempt_paper(
+            attempt['id'],
+            question_bank.paper_seed(exam['id'], attempt['student_id']),
+            question_bank.make_spec(draws, get_pool_sizes(exam['id']))
+        )
+        if stored is None:
+            return None
+        seed, spec = stored
+    return draw_paper(exam['id'], seed, spec)
+
+def get_answer_key(exam_id):
+    """Compiled answer key for an exam, cached alongside its question list."""
+    cache = get_read_cache()
+    scope = _questions_scope(exam_id)
+
+    def compile_key():
+        questions = cache.get_or_load(scope, lambda: _load_exam_questions(exam_id))
+        if questions is None:
+            return None
+        return grading.compile_answer_key(questions)
+
+    return cache.get_or_load(scope, compile_key, kind='answer_key')
+
+def grade_submission(exam_id, answers, rules=None, paper=None):
+    """Grade one submission ({question_id: 'A'..'D'}) against the cached key,
+    or against `paper` (question rows) for a randomly drawn paper.
+    Returns a grading.GradeResult, or None if the key couldn't be loaded."""
+    key = grading.compile_answer_key(paper) if paper is not None else get_answer_key(exam_id)
+    if key is None:
+        return None
+    return grading.grade(key, answers, rules or grading.GradingRules(negative_marking=NEGATIVE_MARKING))
+
+def get_exam_catalog(student_id):
+    """All exams with their question count, summed question marks and whether
+    `student_id` has already taken them, in a single aggregated query."""
+    exams = get_repository().exam_catalog(student_id)
+    if exams is None:
+        return []
+    for exam in exams:
+        exam['taken'] = exam['taken'] or submission_pending(student_id, exam['id'])
+    return exams
 
 def get_all_results():
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT r.*, u.full_name, u.username, e.exam_name 
-            FROM results r
-            JOIN users u ON r.student_id = u.id
-            JOIN exams e ON r.exam_id = e.id
-            ORDER BY r.submitted_at DESC
-        """)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results
-    return []
+    return get_repository().all_results() or []
+
+# Results analytics. Filtering and aggregation run in the database; only
+# summary rows and one page of raw results come back to the app.
+def format_percentage(value, digits=2):
+    # None when every matching result has total_marks = 0
+    return "—" if value is None else f"{value:.{digits}f}%"
+
+def get_results_summary(exam_id=None, date_from=None, date_to=None, student_id=None,
+                        percentiles=(25, 50, 75, 90)):
+    return get_repository().results_summary(exam_id, date_from, date_to, student_id, percentiles)
+
+def get_results_by_exam(date_from=None, date_to=None, student_id=None):
+    return get_repository().results_by_exam(date_from, date_to, student_id) or []
+
+def get_results_page(after=None, limit=RESULTS_PAGE_SIZE, exam_id=None, date_from=None,
+                     date_to=None, student_id=None):
+    """One keyset-paginated page of results, newest first, joined with the
+    student and exam names. Returns (rows, next_cursor)."""
+    page = get_repository().results_page(after, limit, exam_id, date_from, date_to, student_id)
+    return page if page is not None else ([], None)
+
+def export_results(target, fmt, exam_id=None, date_from=None, date_to=None, student_id=None):
+    """Stream matching results into `target` as CSV (text file object) or
+    Parquet (path or binary file object). Returns the number of rows."""
+    batches = get_repository().iter_results(exam_id, date_from, date_to, student_id, EXPORT_BATCH_SIZE)
+    try:
+        return results_export.write_export(batches, fmt, target)
+    finally:
+        # releases the connection if the writer stopped early
+        batches.close()
+
+def export_results_to_file(fmt, **filters):
+    """Export into a new file under EXPORT_DIR; returns (path, rows)."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"results-{uuid.uuid4().hex}.{fmt}")
+    try:
+        if fmt == 'csv':
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                count = export_results(f, fmt, **filters)
+        else:
+            count = export_results(path, fmt, **filters)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path, count
+
+def find_student_id(username):
+    return get_repository().find_student_id(username)
 
 # Student Functions
-def submit_exam(student_id, exam_id, score, total_marks):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO results (student_id, exam_id, score, total_marks) VALUES (%s, %s, %s, %s)",
-            (student_id, exam_id, score, total_marks)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+def submit_exam(student_id, exam_id, score, total_marks, deadline=None):
+    """Record a result. With the attempt's deadline, a submission past it
+    (and the grace period) is refused when late submissions are rejected;
+    returns False then, as on any failure."""
+    if LATE_SUBMISSIONS == 'reject' and exam_timer.is_expired(deadline, DEADLINE_GRACE):
+        return False
+    queue = get_submission_queue()
+    if queue is not None:
+        # acknowledged once on disk; the worker inserts it shortly after
+        queue.submit({
+            'student_id': student_id,
+            'exam_id': exam_id,
+            'score': score,
+            'total_marks': total_marks,
+            'submitted_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        # the worker writes it to the primary on the session's behalf
+        _stick_to_primary()
         return True
-    return False
+    if not get_repository().insert_result(student_id, exam_id, score, total_marks):
+        return False
+    _stick_to_primary()
+    return True
 
 def get_student_results(student_id):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT r.*, e.exam_name 
-            FROM results r
-            JOIN exams e ON r.exam_id = e.id
-            WHERE r.student_id = %s
-            ORDER BY r.submitted_at DESC
-        """, (student_id,))
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results
-    return []
+    """A student's results, newest first, each with its leaderboards.Standing
+    within the exam (None while the exam's leaderboard is empty)."""
+    return get_repository().student_results(student_id) or []
+
+# Leaderboards (see leaderboards.py) are updated in the same transaction as
+# every result insert, so they need no cache or invalidation here.
+def get_exam_leaderboard(exam_id, limit=LEADERBOARD_SIZE):
+    return get_repository().exam_leaderboard(exam_id, limit) or []
+
+def rebuild_leaderboards(exam_id=None):
+    return get_repository().rebuild_leaderboards(exam_id)
 
 def check_exam_taken(student_id, exam_id):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        # return a named column so dict-cursors have a predictable key
-        cursor.execute(
-            "SELECT COUNT(*) AS cnt FROM results WHERE student_id=%s AND exam_id=%s",
-            (student_id, exam_id)
-        )
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        if not row:
-            return False
-        # handle both dict (PyMySQL / dict-cursor) and tuple results
-        if isinstance(row, dict):
-            count = row.get('cnt', None)
-            if count is None:
-                # fallback to first value
-                count = next(iter(row.values()))
+    # a journaled submission not yet written to results still counts as taken
+    if submission_pending(student_id, exam_id):
+        return True
+    return bool(get_repository().exam_taken(student_id, exam_id))
+
+# Exam attempts. Answers are autosaved in the background and an attempt that
+# was interrupted (refresh, logout, worker restart) resumes from them.
+def open_attempt(student_id, exam):
+    """The student's attempt at an exam; starting one fixes its deadline."""
+    return get_repository().open_attempt(student_id, exam['id'], exam['duration_minutes'])
+
+def load_attempt_answers(attempt_id):
+    """Saved answers of an attempt, including changes still queued for autosave."""
+    answers = get_repository().attempt_answers(attempt_id)
+    if answers is None:
+        return None
+    for question_id, answer in get_answer_saver().pending(attempt_id).items():
+        if answer is None:
+            answers.pop(question_id, None)
         else:
-            count = row[0]
-        try:
-            return int(count) > 0
-        except Exception:
-            return False
-    return False
+            answers[question_id] = answer
+    return answers
+
+def save_answer(attempt_id, question_id, answer):
+    get_answer_saver().record(attempt_id, question_id, answer)
+    # written by the autosave worker on the session's behalf
+    _stick_to_primary()
+
+def finish_attempt(attempt_id, paper=None, answers=None):
+    """Close an attempt. Given its paper and final answers they are stored
+    with it as one packed response row for item analysis, replacing the
+    autosaved answers."""
+    if paper is None:
+        # write the final answers before closing the attempt; if that fails
+        # they stay queued and the worker retries them
+        get_answer_saver().flush_attempt(attempt_id)
+        return get_repository().finish_attempt(attempt_id)
+    paper_questions, responses = item_analysis.pack_responses([q['id'] for q in paper], answers)
+    get_answer_saver().discard(attempt_id)
+    return get_repository().finish_attempt(attempt_id, paper_questions, responses)
+
+# Item analysis (see item_analysis.py) over the packed responses of an exam's
+# submitted attempts, against the exam's current answer key.
+def get_item_analysis(exam_id):
+    """(questions, answer key, ItemStats) for an exam, or None without questions."""
+    questions = get_exam_questions(exam_id)
+    key = get_answer_key(exam_id)
+    if not questions or key is None:
+        return None
+    packed = (row for batch in get_repository().iter_exam_responses(exam_id) for row in batch)
+    return questions, key, item_analysis.analyse(key, item_analysis.response_matrix(key, packed))
+
+# Initialize session state (once per session)
+def init_session_state():
+    if 'logged_in' not in st.session_state:
+        st.session_state.logged_in = False
+    if 'user_type' not in st.session_state:
+        st.session_state.user_type = None
+    if 'user_data' not in st.session_state:
+        st.session_state.user_data = None
+
+def render_question_import(exam_id):
+    """Bulk question upload widget for an existing exam."""
+    with st.expander("📥 Import questions from CSV / JSON"):
+        st.caption(
+            "Columns: question_text, option_a, option_b, option_c, option_d, "
+            "correct_answer (A-D) and optional marks, topic and difficulty "
+            "(easy/medium/hard). JSON files hold an array of "
+            "objects with the same keys; .jsonl files hold one object per line."
+        )
+        upload = st.file_uploader("Question file", type=["csv", "json", "jsonl"], key=f"import_file_{exam_id}")
+        if upload is not None and st.button("Import", key=f"import_btn_{exam_id}", type="primary"):
+            try:
+                with st.spinner("Importing questions..."):
+                    report = import_questions(exam_id, upload, question_import.detect_format(upload.name))
+            except question_import.ImportFormatError as e:
+                st.error(f"❌ Import failed: {e}")
+                return
+            if report is None:
+                st.error("❌ Import failed: no database connection")
+                return
+            if report['inserted']:
+                st.success(f"✅ Imported {report['inserted']} questions")
+            if report['failed']:
+                st.warning(f"⚠️ {report['failed']} rows were skipped")
+                errors = [{'row': row, 'error': message} for row, message in report['errors']]
+                st.dataframe(errors, use_container_width=True, hide_index=True)
+                if report['errors_truncated']:
+                    st.caption(f"...and {report['errors_truncated']} more")
+            if not report['inserted'] and not report['failed']:
+                st.info("The file contained no questions")
+
+def question_fields(key_prefix, question=None):
+    """Inputs for one question, prefilled from a staged question. Returns
+    the raw values keyed like question_import.COLUMNS."""
+    q = question or {}
+    options = ["A", "B", "C", "D"]
+    difficulties = [""] + list(question_bank.DIFFICULTIES)
+    text = st.text_area("Question Text", value=q.get('question_text', ''), height=100, key=f"{key_prefix}_text")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        opt_a = st.text_input("Option A", value=q.get('option_a', ''), key=f"{key_prefix}_a")
+        opt_c = st.text_input("Option C", value=q.get('option_c', ''), key=f"{key_prefix}_c")
+    with col2:
+        opt_b = st.text_input("Option B", value=q.get('option_b', ''), key=f"{key_prefix}_b")
+        opt_d = st.text_input("Option D", value=q.get('option_d', ''), key=f"{key_prefix}_d")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        correct = st.selectbox("Correct Answer", options, index=options.index(q.get('correct_answer', 'A')),
+                               key=f"{key_prefix}_correct")
+    with col2:
+        marks = st.number_input("Marks", min_value=1, value=int(q.get('marks', 1)), key=f"{key_prefix}_marks")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        topic = st.text_input("Topic (optional)", value=q.get('topic', ''), max_chars=question_import.TOPIC_MAX_LENGTH,
+                              key=f"{key_prefix}_topic")
+    with col2:
+        difficulty = st.selectbox(
+            "Difficulty (optional)", difficulties, index=difficulties.index(q.get('difficulty', '')),
+            format_func=lambda d: d or "—", key=f"{key_prefix}_difficulty"
+        )
+    return {
+        'question_text': text, 'option_a': opt_a, 'option_b': opt_b, 'option_c': opt_c, 'option_d': opt_d,
+        'correct_answer': correct, 'marks': marks, 'topic': topic, 'difficulty': difficulty,
+    }
 
-# Initialize session state
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-if 'user_type' not in st.session_state:
-    st.session_state.user_type = None
-if 'user_data' not in st.session_state:
-    st.session_state.user_data = None
-if 'question_list' not in st.session_state:
-    st.session_state.question_list = []
+def discard_exam_draft():
+    st.session_state.pop('exam_draft', None)
+    st.session_state.pop('editing_question', None)
 
-# Initialize database
-init_database()
+def _move_staged_question(i, offset):
+    st.session_state.exam_draft.move(i, offset)
+    st.session_state.pop('editing_question', None)
+
+def _remove_staged_question(i):
+    st.session_state.exam_draft.remove(i)
+    st.session_state.pop('editing_question', None)
+
+def render_staged_questions(draft):
+    """Preview of the draft's questions with edit, reorder and remove.
+    Everything happens on the exam_draft.ExamDraft in session_state; nothing
+    touches the database."""
+    questions = draft.questions
+    if not questions:
+        st.info("No questions added yet.")
+        return
+    st.divider()
+    st.subheader(f"Staged Questions ({len(questions)}, {draft.staged_marks} marks)")
+    editing = st.session_state.get('editing_question')
+    for i, q in enumerate(questions):
+        with st.expander(f"Question {i + 1}: {q['question_text'][:50]}...", expanded=editing == i):
+            if editing == i:
+                with st.form(f"edit_question_{i}"):
+                    fields = question_fields(f"edit_question_{i}", q)
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        save = st.form_submit_button("💾 Save", type="primary")
+                    with col2:
+                        cancel = st.form_submit_button("Cancel")
+                    if save:
+                        error = draft.replace(i, fields)
+                        if error:
+                            st.error(f"❌ {error}")
+                        else:
+                            del st.session_state['editing_question']
+                            st.rerun()
+                    if cancel:
+                        del st.session_state['editing_question']
+                        st.rerun()
+                continue
+            st.markdown(f"**{q['question_text']}** ({q['marks']} marks)")
+            st.write(f"A) {q['option_a']}")
+            st.write(f"B) {q['option_b']}")
+            st.write(f"C) {q['option_c']}")
+            st.write(f"D) {q['option_d']}")
+            st.success(f"✅ Correct Answer: {q['correct_answer']}")
+            if q['topic'] or q['difficulty']:
+                st.caption(f"Topic: {q['topic'] or '—'} | Difficulty: {q['difficulty'] or '—'}")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                if st.button("✏️ Edit", key=f"edit_staged_{i}"):
+                    st.session_state.editing_question = i
+                    st.rerun()
+            with col2:
+                st.button("⬆️ Up", key=f"up_staged_{i}", disabled=i == 0,
+                          on_click=_move_staged_question, args=(i, -1))
+            with col3:
+                st.button("⬇️ Down", key=f"down_staged_{i}", disabled=i == len(questions) - 1,
+                          on_click=_move_staged_question, args=(i, 1))
+            with col4:
+                st.button("🗑️ Remove", key=f"remove_staged_{i}", on_click=_remove_staged_question, args=(i,))
+
+def render_results_export(filters, filter_key):
+    """Export every result matching the View Results filters."""
+    with st.expander("⬇️ Export results"):
+        st.caption("Streams all matching results from the database into a file. "
+                   "For millions of rows use `python export_results.py` instead of the browser.")
+        formats = results_export.available_formats()
+        fmt = st.radio("Format", formats, horizontal=True, key="results_export_format",
+                       format_func=lambda f: f.upper())
+        if st.button("Prepare export", key="results_export_btn"):
+            previous = st.session_state.pop('results_export', None)
+            if previous and os.path.exists(previous['path']):
+                os.remove(previous['path'])
+            try:
+                with st.spinner("Exporting results..."):
+                    path, count = export_results_to_file(fmt, **filters)
+            except Exception as e:
+                st.error(f"❌ Export failed: {e}")
+                return
+            st.session_state.results_export = {'path': path, 'rows': count, 'fmt': fmt, 'filters': filter_key}
+        
+        export = st.session_state.get('results_export')
+        if export and export['filters'] == filter_key and os.path.exists(export['path']):
+            mime = 'text/csv' if export['fmt'] == 'csv' else 'application/vnd.apache.parquet'
+            with open(export['path'], 'rb') as f:
+                st.download_button(
+                    f"Download {export['rows']} rows ({export['fmt'].upper()})", f,
+                    file_name=f"results.{export['fmt']}", mime=mime, key="results_export_download"
+                )
+
+def render_paper_blueprint(exam):
+    """Pool overview and blueprint editor for random per-student papers."""
+    with st.expander("🎲 Random papers"):
+        sizes = get_pool_sizes(exam['id'])
+        if not sizes:
+            st.info("Add questions to build the pools papers are drawn from.")
+            return
+        st.caption("Questions are pooled by topic and difficulty. With a blueprint each student "
+                   "gets their own random paper; without one everybody answers every question.")
+        st.dataframe(pd.DataFrame(
+            [{'topic': t or '—', 'difficulty': d or '—', 'questions': n} for (t, d), n in sorted(sizes.items())]
+        ), use_container_width=True, hide_index=True)
+        
+        current = {(d.topic, d.difficulty): d.count for d in question_bank.parse_blueprint(exam.get('paper_blueprint'))}
+        editor = st.data_editor(
+            pd.DataFrame([
+                {'topic': t, 'difficulty': d, 'available': n, 'draw': current.get((t, d), 0)}
+                for (t, d), n in sorted(sizes.items())
+            ]),
+            disabled=['topic', 'difficulty', 'available'],
+            column_config={'draw': st.column_config.NumberColumn("draw", min_value=0, step=1)},
+            use_container_width=True, hide_index=True, key=f"blueprint_{exam['id']}"
+        )
+        draws = [
+            question_bank.PoolDraw(row['topic'], row['difficulty'], int(row['draw']))
+            for row in editor.to_dict('records') if row['draw'] and int(row['draw']) > 0
+        ]
+        st.caption(f"Paper length: {question_bank.paper_length(draws)} questions")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("💾 Save blueprint", key=f"save_blueprint_{exam['id']}"):
+                problems = question_bank.validate_blueprint(draws, sizes)
+                if problems:
+                    for problem in problems:
+                        st.error(problem)
+                elif set_exam_blueprint(exam['id'], draws):
+                    st.success("Blueprint saved; new attempts get random papers")
+                    st.rerun()
+        with col2:
+            if current and st.button("Use all questions", key=f"clear_blueprint_{exam['id']}"):
+                if set_exam_blueprint(exam['id'], []):
+                    st.rerun()
 
 # Main App
+DEBUG_RERUN_HISTORY = 20
+
 def main():
     st.set_page_config(page_title="Online Examination System", layout="wide")
+    # defining the script's functions is all a rerun repeats; the schema
+    # work behind init_database() runs once per process
+    init_session_state()
+    init_database()
     
     if not st.session_state.logged_in:
-        login_page()
+        section, page = 'login_page', login_page
+    elif st.session_state.user_type == 'admin':
+        section, page = 'admin_interface', admin_interface
     else:
-        if st.session_state.user_type == 'admin':
-            admin_interface()
+        section, page = 'student_interface', student_interface
+    
+    registry = get_metrics()
+    run = None
+    try:
+        with registry.rerun(section) as run:
+            with registry.section(section):
+                page()
+    finally:
+        # st.rerun()/st.stop() leave by raising; keep the figures either way
+        if run is not None and run.summary is not None:
+            history = st.session_state.get('debug_reruns', [])
+            st.session_state.debug_reruns = [run.summary] + history[:DEBUG_RERUN_HISTORY - 1]
+        export_metrics()
+        get_startup_timer().record_run(time.perf_counter() - _SCRIPT_STARTED)
+
+def render_debug_panel():
+    """Admin-only view of the query and rerun metrics."""
+    registry = get_metrics()
+    with st.expander("🩺 Performance debug", expanded=True):
+        st.markdown("**Recent reruns in this session** (newest first)")
+        reruns = st.session_state.get('debug_reruns', [])
+        if reruns:
+            st.dataframe(pd.DataFrame([
+                {
+                    'at': datetime.fromtimestamp(r['at']).strftime('%H:%M:%S'),
+                    'page': r['label'],
+                    'total_ms': round(r['seconds'] * 1000, 1),
+                    'queries': r['queries'],
+                    'db_ms': round(r['db_seconds'] * 1000, 1),
+                }
+                for r in reruns
+            ]), use_container_width=True, hide_index=True)
         else:
-            student_interface()
+            st.caption("No reruns recorded yet")
+        
+        boot = get_startup_timer().stats()
+        if boot['first_run_seconds'] is not None:
+            budget = f" (budget {boot['budget_seconds']:g}s)" if boot['budget_seconds'] else ""
+            imports = ", ".join(f"{name} {s * 1000:.0f} ms" for name, s in sorted(boot['lazy_imports'].items()))
+            st.markdown(f"**Startup**: first run of this process took {boot['first_run_seconds']:.2f}s{budget}")
+            st.caption(f"Lazy imports so far: {imports or 'none'}")
+        
+        st.markdown("**Page sections** (all sessions)")
+        sections = registry.section_table()
+        if sections:
+            st.dataframe(pd.DataFrame(sections).round(1), use_container_width=True, hide_index=True)
+        
+        st.markdown("**Queries by fingerprint** (all sessions, slowest total first)")
+        if not METRICS_ENABLED:
+            st.caption("Statement timing is off (EXAM_METRICS=0)")
+        queries = registry.query_table()
+        if queries:
+            st.dataframe(pd.DataFrame(queries).round(2), use_container_width=True, hide_index=True)
+        
+        if registry.slow_query_seconds is None:
+            st.caption("Slow-query logging is off (EXAM_SLOW_QUERY_MS=0)")
+        else:
+            st.markdown(f"**Slow queries** (≥ {SLOW_QUERY_MS:g} ms)")
+            slow = registry.recent_slow_queries()
+            if slow:
+                st.dataframe(pd.DataFrame([
+                    {
+                        'at': datetime.fromtimestamp(q['at']).strftime('%H:%M:%S'),
+                        'ms': round(q['seconds'] * 1000, 1),
+                        'page': q['rerun'],
+                        'fingerprint': q['fingerprint'],
+                    }
+                    for q in slow
+                ]), use_container_width=True, hide_index=True)
+            else:
+                st.caption("None so far")
+        
+        st.download_button(
+            "⬇️ Prometheus metrics", registry.render_prometheus(),
+            file_name="online_exam_metrics.prom", mime="text/plain"
+        )
 
 def login_page():
     st.title("🎓 Online Examination System")
@@ -369,7 +1502,9 @@ def login_page():
     
     # Add a reset button to clear session-state if needed
     if st.button("Reset session"):
-        for k in ['logged_in', 'user_type', 'user_data', 'exam_started', 'current_exam', 'current_exam_id', 'question_list']:
+        for k in ['logged_in', 'user_type', 'user_data', 'exam_draft', 'editing_question', 'admin_notice',
+                  'admin_exam_cursors', 'admin_open_exam_id', 'debug_reruns', 'results_export', 'exam_notice',
+                  'pending_login', 'pending_exam_start', 'admission_waiting', *EXAM_ATTEMPT_KEYS]:
             if k in st.session_state:
                 del st.session_state[k]
         safe_rerun()
@@ -384,15 +1519,11 @@ def login_page():
             admin_pass = st.text_input("Password", type="password", key="admin_pass")
             admin_login_btn = st.form_submit_button("🔐 Login as Admin", use_container_width=True)
             
+            # a login waiting for admission carries on over reruns
             if admin_login_btn:
-                user = authenticate(admin_user, admin_pass, 'admin')
-                if user:
-                    st.session_state.logged_in = True
-                    st.session_state.user_type = 'admin'
-                    st.session_state.user_data = user
-                    st.rerun()
-                else:
-                    st.error("❌ Invalid credentials!")
+                st.session_state.pending_login = 'admin'
+            if st.session_state.get('pending_login') == 'admin':
+                complete_login(admin_user, admin_pass, 'admin', "❌ Invalid credentials!")
     
     with tab2:
         st.subheader("Student Login")
@@ -404,14 +1535,10 @@ def login_page():
             student_login_btn = st.form_submit_button("🔐 Login as Student", use_container_width=True)
             
             if student_login_btn:
-                user = authenticate(student_user, student_pass, 'student')
-                if user:
-                    st.session_state.logged_in = True
-                    st.session_state.user_type = 'student'
-                    st.session_state.user_data = user
-                    st.rerun()
-                else:
-                    st.error("❌ Invalid credentials! Please check your username and password.")
+                st.session_state.pending_login = 'student'
+            if st.session_state.get('pending_login') == 'student':
+                complete_login(student_user, student_pass, 'student',
+                               "❌ Invalid credentials! Please check your username and password.")
     
     with tab3:
         st.subheader("Create Your Student Account")
@@ -455,151 +1582,526 @@ def admin_interface():
         st.session_state.logged_in = False
         st.session_state.user_type = None
         st.session_state.user_data = None
-        st.session_state.question_list = []
+        discard_exam_draft()
         st.rerun()
     
-    menu = st.sidebar.radio("Menu", ["Create Exam", "View Exams", "View Results"])
+    menu = st.sidebar.radio("Menu", ["Create Exam", "View Exams", "View Results", "Item Analysis"])
+
+    if st.sidebar.checkbox("🩺 Debug panel", key="admin_debug_panel"):
+        render_debug_panel()
+
+    with st.sidebar.expander("🔌 Connection Pool"):
+        stats = get_pool_stats()
+        st.caption(f"Open: {stats['open']} / {stats['size']} (+{stats['max_overflow']} overflow)")
+        st.caption(f"In use: {stats['in_use']} | Idle: {stats['idle']}")
+        st.caption(f"Avg wait: {stats['wait_seconds_avg'] * 1000:.1f} ms | Max wait: {stats['wait_seconds_max'] * 1000:.1f} ms")
+        st.caption(f"Waited: {stats['waits']} | Timeouts: {stats['timeouts']} | Failed pings: {stats['failed_health_checks']}")
+        replicas = get_replica_stats()
+        if replicas:
+            st.caption(f"Reads on replicas: {replicas['replica_reads']} | on primary: {replicas['primary_reads']} | Replica failures: {replicas['replica_failures']} | Busy: {replicas['replica_busy']}")
+            for name, pool in replicas['replicas'].items():
+                status = " (skipped after a failure)" if pool['down'] else ""
+                st.caption(f"{name}: {pool['open']} open, {pool['in_use']} in use{status}")
+
+    with st.sidebar.expander("🗃️ Read Cache"):
+        stats = get_cache_stats()
+        st.caption(f"Entries: {stats['entries']} / {stats['max_entries']}")
+        st.caption(f"Hits: {stats['hits']} | Misses: {stats['misses']} | Hit ratio: {stats['hit_ratio'] * 100:.1f}%")
+        st.caption(f"Evictions: {stats['evictions']} | Invalidations: {stats['invalidations']}")
+        st.caption(f"Backend: {stats['backend']} | Shared hits: {stats['shared_hits']} | Errors: {stats['backend_errors']}")
+
+    with st.sidebar.expander("💾 Answer Autosave"):
+        stats = get_answer_saver().stats()
+        st.caption(f"Pending: {stats['pending']} | Recorded: {stats['recorded']}")
+        st.caption(f"Written: {stats['written']} in {stats['batches']} batches | Failures: {stats['flush_failures']}")
+        if stats['last_error']:
+            st.caption(f"Last error: {stats['last_error']}")
+
+    with st.sidebar.expander("🚦 Admission"):
+        controller = get_admission_controller()
+        if controller is None:
+            st.caption("Off (EXAM_ADMISSION_LIMIT=0)")
+        else:
+            stats = controller.stats()
+            st.caption(f"Running: {stats['in_flight']} / {stats['limit']} | Waiting: {stats['queued']}")
+            st.caption(f"Admitted: {stats['admitted']} (waited: {stats['waited']}) | Abandoned: {stats['abandoned']}")
+            st.caption(f"Avg time in slot: {stats['service_seconds'] * 1000:.0f} ms")
+        logins = get_verified_logins().stats()
+        st.caption(f"Verified logins cached: {logins['entries']} | Hits: {logins['hits']} | Misses: {logins['misses']}")
+
+    queue = get_submission_queue()
+    if queue is not None:
+        with st.sidebar.expander("📨 Submission Queue"):
+            stats = queue.stats()
+            st.caption(f"Pending: {stats['pending']} | Journal: {stats['journal_bytes'] / 1024:.1f} KiB")
+            st.caption(f"Acknowledged: {stats['acknowledged']} | Replayed: {stats['replayed']}")
+            st.caption(f"Flushed: {stats['flushed']} in {stats['batches']} batches | Failures: {stats['flush_failures']}")
+            if stats['last_error']:
+                st.caption(f"Last error: {stats['last_error']}")
     
     if menu == "Create Exam":
         st.header("Create New Exam")
+        notice = st.session_state.pop('admin_notice', None)
+        if notice:
+            st.success(notice)
         
-        # Exam creation form
-        with st.form("exam_form"):
-            exam_name = st.text_input("Exam Name")
-            col1, col2 = st.columns(2)
-            with col1:
-                duration = st.number_input("Duration (minutes)", min_value=1, value=60)
-            with col2:
-                total_marks = st.number_input("Total Marks", min_value=1, value=100)
-            
-            submit_exam = st.form_submit_button("Create Exam")
-            
-            if submit_exam:
-                if exam_name:
-                    exam_id = create_exam(exam_name, duration, total_marks, st.session_state.user_data['id'])
-                    if exam_id:
-                        st.success(f"✅ Exam created successfully! Exam ID: {exam_id}")
-                        st.session_state.current_exam_id = exam_id
-                        st.session_state.question_list = []
-                else:
-                    st.error("Please enter exam name!")
-        
-        # Multiple questions addition
-        if 'current_exam_id' in st.session_state:
-            st.divider()
-            st.subheader(f"📝 Add Questions to Exam (ID: {st.session_state.current_exam_id})")
-            
-            # Display added questions count
-            existing_questions = get_exam_questions(st.session_state.current_exam_id)
-            st.info(f"Total questions added: {len(existing_questions)}")
-            
-            with st.form("question_form", clear_on_submit=True):
-                question = st.text_area("Question Text", height=100)
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    opt_a = st.text_input("Option A")
-                    opt_c = st.text_input("Option C")
-                with col2:
-                    opt_b = st.text_input("Option B")
-                    opt_d = st.text_input("Option D")
-                
+        # The exam and its questions are drafted in session_state and only
+        # written, together in one transaction, by "Finish Exam"
+        draft = st.session_state.get('exam_draft')
+        if draft is None:
+            with st.form("exam_form"):
+                exam_name = st.text_input("Exam Name")
                 col1, col2 = st.columns(2)
                 with col1:
-                    correct = st.selectbox("Correct Answer", ["A", "B", "C", "D"])
+                    duration = st.number_input("Duration (minutes)", min_value=1, value=60)
                 with col2:
-                    marks = st.number_input("Marks", min_value=1, value=1)
+                    total_marks = st.number_input("Total Marks", min_value=1, value=100)
                 
-                col1, col2 = st.columns(2)
-                with col1:
-                    add_question_btn = st.form_submit_button("➕ Add Question", type="primary")
-                with col2:
-                    finish_exam_btn = st.form_submit_button("✅ Finish Exam", type="secondary")
+                submit_exam = st.form_submit_button("Create Exam")
                 
-                if add_question_btn:
-                    if question and opt_a and opt_b and opt_c and opt_d:
-                        if add_question(st.session_state.current_exam_id, question, opt_a, opt_b, opt_c, opt_d, correct, marks):
-                            st.success("✅ Question added successfully! You can add more questions.")
-                            st.rerun()
-                        else:
-                            st.error("Failed to add question!")
+                if submit_exam:
+                    draft, error = exam_draft.ExamDraft.start(exam_name, duration, total_marks)
+                    if error:
+                        st.error(error)
                     else:
-                        st.error("Please fill all question fields!")
-                
-                if finish_exam_btn:
-                    if len(existing_questions) > 0:
-                        st.success(f"🎉 Exam completed with {len(existing_questions)} questions!")
-                        del st.session_state.current_exam_id
+                        st.session_state.exam_draft = draft
                         st.rerun()
-                    else:
-                        st.error("Please add at least one question before finishing!")
+            return
+        
+        st.subheader(f"📝 Add Questions to {draft.exam_name}")
+        st.caption(f"⏱️ {draft.duration} minutes | 📊 {draft.total_marks} marks. Nothing is saved until you "
+                   "finish the exam; bulk imports are available from View Exams afterwards.")
+        
+        with st.form("question_form", clear_on_submit=True):
+            fields = question_fields("new_question")
+            add_question_btn = st.form_submit_button("➕ Add Question", type="primary")
             
-            # Show added questions
-            if existing_questions:
-                st.divider()
-                st.subheader("Added Questions Preview")
-                for i, q in enumerate(existing_questions, 1):
-                    with st.expander(f"Question {i}: {q['question_text'][:50]}..."):
-                        st.markdown(f"**{q['question_text']}** ({q['marks']} marks)")
-                        st.write(f"A) {q['option_a']}")
-                        st.write(f"B) {q['option_b']}")
-                        st.write(f"C) {q['option_c']}")
-                        st.write(f"D) {q['option_d']}")
-                        st.success(f"✅ Correct Answer: {q['correct_answer']}")
+            if add_question_btn:
+                error = draft.add(fields)
+                if error:
+                    st.error(f"❌ {error}")
+        
+        render_staged_questions(draft)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ Finish Exam", type="primary", key="finish_exam"):
+                admin_id = st.session_state.user_data['id']
+                exam_id, error = draft.finish(
+                    lambda name, duration, total_marks, questions:
+                        create_exam(name, duration, total_marks, admin_id, questions)
+                )
+                if error:
+                    st.error(error)
+                elif exam_id:
+                    st.session_state.admin_notice = (
+                        f"🎉 Exam created with {len(draft.questions)} questions! Exam ID: {exam_id}"
+                    )
+                    discard_exam_draft()
+                    st.rerun()
+        with col2:
+            if st.button("🗑️ Discard Draft", key="discard_exam_draft"):
+                discard_exam_draft()
+                st.rerun()
     
     elif menu == "View Exams":
         st.header("All Exams")
-        exams = get_all_exams()
+        
+        # keyset paging state: cursors[i] is the `after` value for page i
+        if 'admin_exam_cursors' not in st.session_state:
+            st.session_state.admin_exam_cursors = [None]
+        if 'admin_open_exam_id' not in st.session_state:
+            st.session_state.admin_open_exam_id = None
+        
+        size_options = sorted({10, 20, 50, 100, ADMIN_EXAMS_PAGE_SIZE})
+        page_size = st.selectbox(
+            "Exams per page", size_options,
+            index=size_options.index(ADMIN_EXAMS_PAGE_SIZE), key="admin_exam_page_size"
+        )
+        if st.session_state.get('admin_exam_page_size_used') != page_size:
+            # page boundaries move with the page size, start again from the top
+            st.session_state.admin_exam_page_size_used = page_size
+            st.session_state.admin_exam_cursors = [None]
+        
+        cursors = st.session_state.admin_exam_cursors
+        page = len(cursors) - 1
+        exams, next_cursor = get_exams_page(cursors[-1], page_size)
+        total_exams = count_exams()
         
         if exams:
+            st.caption(f"Page {page + 1} · {total_exams} exams in total")
             for exam in exams:
-                with st.expander(f"📝 {exam['exam_name']} - {exam['duration_minutes']} mins"):
+                is_open = st.session_state.admin_open_exam_id == exam['id']
+                with st.container(border=True):
                     col1, col2, col3 = st.columns([3, 1, 1])
                     with col1:
-                        st.write(f"**Total Marks:** {exam['total_marks']}")
+                        st.subheader(f"📝 {exam['exam_name']} - {exam['duration_minutes']} mins")
+                        st.write(f"**Total Marks:** {exam['total_marks']} | **Number of Questions:** {exam['question_count']}")
                         st.write(f"**Created:** {exam['created_at']}")
+                    with col2:
+                        toggle_label = "🙈 Hide Questions" if is_open else "👁️ Show Questions"
+                        if st.button(toggle_label, key=f"open_{exam['id']}"):
+                            st.session_state.admin_open_exam_id = None if is_open else exam['id']
+                            st.rerun()
+                    with col3:
+                        if st.button(f"🗑️ Delete Exam", key=f"del_{exam['id']}"):
+                            if delete_exam(exam['id']):
+                                if is_open:
+                                    st.session_state.admin_open_exam_id = None
+                                st.success("Exam deleted!")
+                                st.rerun()
                     
-                    questions = get_exam_questions(exam['id'])
-                    st.write(f"**Number of Questions:** {len(questions)}")
-                    
-                    st.divider()
-                    for i, q in enumerate(questions, 1):
-                        st.markdown(f"**Q{i}. {q['question_text']}** ({q['marks']} marks)")
-                        st.write(f"A) {q['option_a']}")
-                        st.write(f"B) {q['option_b']}")
-                        st.write(f"C) {q['option_c']}")
-                        st.write(f"D) {q['option_d']}")
-                        st.write(f"✅ Correct: {q['correct_answer']}")
+                    # question bodies are only fetched for the exam that is open
+                    if is_open:
+                        render_question_import(exam['id'])
+                        render_paper_blueprint(exam)
+                        questions = get_exam_questions(exam['id'])
                         st.divider()
-                    
-                    if st.button(f"🗑️ Delete Exam", key=f"del_{exam['id']}"):
-                        if delete_exam(exam['id']):
-                            st.success("Exam deleted!")
-                            st.rerun()
+                        for i, q in enumerate(questions, 1):
+                            st.markdown(f"**Q{i}. {q['question_text']}** ({q['marks']} marks)")
+                            st.write(f"A) {q['option_a']}")
+                            st.write(f"B) {q['option_b']}")
+                            st.write(f"C) {q['option_c']}")
+                            st.write(f"D) {q['option_d']}")
+                            st.write(f"✅ Correct: {q['correct_answer']}")
+                            st.divider()
+            
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if page > 0 and st.button("⬅️ Previous", key="exams_prev"):
+                    cursors.pop()
+                    st.rerun()
+            with col3:
+                if next_cursor is not None and st.button("Next ➡️", key="exams_next"):
+                    cursors.append(next_cursor)
+                    st.rerun()
+        elif page > 0:
+            # the page emptied (e.g. its last exam was deleted), step back
+            cursors.pop()
+            st.rerun()
         else:
             st.info("No exams created yet!")
     
     elif menu == "View Results":
         st.header("All Student Results")
-        results = get_all_results()
         
-        if results:
-            df = pd.DataFrame(results)
-            df = df[['full_name', 'username', 'exam_name', 'score', 'total_marks', 'submitted_at']]
-            df['percentage'] = (df['score'] / df['total_marks'] * 100).round(2)
-            st.dataframe(df, use_container_width=True)
-            
+        # Filters
+        exams = get_all_exams()
+        exam_names = {exam['id']: exam['exam_name'] for exam in exams}
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            exam_filter = st.selectbox(
+                "Exam", [None] + list(exam_names),
+                format_func=lambda x: "All exams" if x is None else exam_names[x],
+                key="results_exam_filter"
+            )
+        with col2:
+            date_range = st.date_input("Submitted between", value=(), key="results_date_filter")
+        with col3:
+            username_filter = st.text_input("Student username", key="results_student_filter").strip()
+        
+        date_from = date_range[0] if len(date_range) > 0 else None
+        date_to = date_range[1] if len(date_range) > 1 else date_from
+        student_id = None
+        if username_filter:
+            student_id = find_student_id(username_filter)
+            if student_id is None:
+                st.warning(f"No student with username '{username_filter}'")
+                return
+        filters = dict(exam_id=exam_filter, date_from=date_from, date_to=date_to, student_id=student_id)
+        
+        summary = get_results_summary(**filters)
+        
+        if summary and summary['submissions']:
             # Statistics
             st.subheader("📊 Statistics")
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Submissions", len(df))
+                st.metric("Total Submissions", summary['submissions'])
+            with col2:
+                st.metric("Average Score", format_percentage(summary['mean_percentage']))
+            with col3:
+                st.metric("Highest Score", format_percentage(summary['max_percentage']))
+            
+            cols = st.columns(len(summary['percentiles']) + 1)
+            with cols[0]:
+                st.metric("Lowest Score", format_percentage(summary['min_percentage']))
+            for col, (p, value) in zip(cols[1:], summary['percentiles'].items()):
+                with col:
+                    st.metric(f"P{p}", format_percentage(value, 0))
+            
+            if exam_filter is None:
+                st.subheader("Per Exam")
+                per_exam = get_results_by_exam(date_from, date_to, student_id)
+                st.dataframe(
+                    pd.DataFrame(per_exam, columns=['exam_name', 'submissions', 'mean_percentage', 'max_percentage']).round(2),
+                    use_container_width=True, hide_index=True
+                )
+            else:
+                st.subheader("🏆 Leaderboard")
+                st.caption("All submissions for this exam, ranked by percentage; the date and student filters don't apply.")
+                leaders = get_exam_leaderboard(exam_filter)
+                df = pd.DataFrame(leaders, columns=['rank', 'full_name', 'username', 'score', 'total_marks', 'score_bp', 'submitted_at'])
+                df['percentage'] = df.pop('score_bp') / 100
+                st.dataframe(df, use_container_width=True, hide_index=True)
+            
+            # Raw results, one keyset page at a time
+            st.subheader("Submissions")
+            filter_key = repr(sorted(filters.items()))
+            if st.session_state.get('results_filter_key') != filter_key:
+                st.session_state.results_filter_key = filter_key
+                st.session_state.results_cursors = [None]
+            cursors = st.session_state.results_cursors
+            rows, next_cursor = get_results_page(cursors[-1], RESULTS_PAGE_SIZE, **filters)
+            
+            df = pd.DataFrame(rows, columns=['full_name', 'username', 'exam_name', 'score', 'total_marks', 'submitted_at', 'percentage'])
+            st.dataframe(df, use_container_width=True)
+            
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if len(cursors) > 1 and st.button("⬅️ Previous", key="results_prev"):
+                    cursors.pop()
+                    st.rerun()
             with col2:
-                st.metric("Average Score", f"{df['percentage'].mean():.2f}%")
+                st.caption(f"Page {len(cursors)}")
             with col3:
-                st.metric("Highest Score", f"{df['percentage'].max():.2f}%")
+                if next_cursor is not None and st.button("Next ➡️", key="results_next"):
+                    cursors.append(next_cursor)
+                    st.rerun()
+            
+            render_results_export(filters, filter_key)
         else:
             st.info("No results yet!")
+    
+    elif menu == "Item Analysis":
+        st.header("Item Analysis")
+        st.caption("How each question performed across every submitted attempt. Difficulty is the share "
+                   "answering correctly; discrimination is how well getting it right tracks the score on "
+                   "the rest of the paper. Attempts submitted before responses were recorded are not included.")
+        
+        exams = get_all_exams()
+        if not exams:
+            st.info("No exams created yet!")
+            return
+        exam_names = {exam['id']: exam['exam_name'] for exam in exams}
+        exam_id = st.selectbox("Exam", list(exam_names), format_func=exam_names.get, key="item_analysis_exam")
+        
+        analysis = get_item_analysis(exam_id)
+        if analysis is None:
+            st.info("This exam has no questions.")
+            return
+        questions, key, stats = analysis
+        if not stats.attempts:
+            st.info("No submitted attempts with recorded responses yet.")
+            return
+        st.metric("Attempts analysed", stats.attempts)
+        
+        df = pd.DataFrame({
+            'question': [q['question_text'] for q in questions],
+            'presented': stats.presented,
+            'difficulty': stats.difficulty,
+            'discrimination': stats.discrimination,
+        })
+        for i, option in enumerate(grading.OPTIONS):
+            df[option] = stats.option_shares[:, i]
+        df['omitted'] = stats.omitted
+        df['correct'] = [q['correct_answer'] for q in questions]
+        df['flags'] = ["; ".join(item_analysis.flags(stats, key, i)) for i in range(len(questions))]
+        st.dataframe(df.round(2), use_container_width=True, hide_index=True)
+
+# Exam attempt state. The paper is loaded once when the attempt starts and
+# kept in session_state with the answers; answering and paging rerun only
+# the exam fragment. Answer changes go to the autosave worker, the database
+# is otherwise only touched on submit. The deadline is read with the attempt
+# and checked against the clock on every fragment rerun.
+EXAM_ATTEMPT_KEYS = ('exam_started', 'current_exam', 'exam_attempt_id', 'exam_paper', 'exam_answers',
+                     'exam_page', 'exam_deadline')
+
+def start_exam_attempt(exam):
+    """Start the exam, or resume the student's unfinished attempt at it on
+    the page of the first unanswered question. Returns False on failure."""
+    attempt = open_attempt(st.session_state.user_data['id'], exam)
+    if attempt is None:
+        return False
+    if attempt['status'] != 'in_progress':
+        st.error("You have already submitted this exam.")
+        return False
+    answers = load_attempt_answers(attempt['id'])
+    if answers is None:
+        return False
+    paper = get_attempt_paper(exam, attempt)
+    if not paper:
+        st.error("Could not load the exam paper, please try again.")
+        return False
+    # answers to questions removed since they were saved don't count
+    answers = {q['id']: answers[q['id']] for q in paper if q['id'] in answers}
+    first_open = next((i for i, q in enumerate(paper) if q['id'] not in answers), 0)
+    
+    st.session_state.exam_started = True
+    st.session_state.current_exam = exam
+    st.session_state.exam_attempt_id = attempt['id']
+    st.session_state.exam_paper = paper
+    st.session_state.exam_answers = answers
+    st.session_state.exam_page = first_open // max(1, EXAM_QUESTIONS_PER_PAGE)
+    st.session_state.exam_deadline = attempt.get('deadline')
+    if exam_timer.is_expired(attempt.get('deadline'), DEADLINE_GRACE):
+        # time ran out while the student was away
+        close_expired_attempt()
+    return True
+
+def _start_pending_exam():
+    return start_exam_attempt(st.session_state.pop('pending_exam_start'))
+
+def end_exam_attempt():
+    for k in EXAM_ATTEMPT_KEYS:
+        if k in st.session_state:
+            del st.session_state[k]
+
+def submit_exam_attempt():
+    """Grade the open attempt's answers and submit them. Returns (score,
+    total_marks), or None if grading or the submission failed (or it was
+    refused as late)."""
+    exam = st.session_state.current_exam
+    questions = st.session_state.exam_paper
+    # a drawn paper is graded against its own questions and marks
+    drawn = bool(exam.get('paper_blueprint'))
+    graded = grade_submission(exam['id'], st.session_state.exam_answers, paper=questions if drawn else None)
+    if not graded:
+        return None
+    # results.score is an integer column
+    score = int(round(graded.score))
+    total_marks = int(round(graded.max_score)) if drawn else exam['total_marks']
+    if not submit_exam(st.session_state.user_data['id'], exam['id'], score, total_marks,
+                       deadline=st.session_state.get('exam_deadline')):
+        return None
+    finish_attempt(st.session_state.exam_attempt_id, paper=questions, answers=st.session_state.exam_answers)
+    return score, total_marks
+
+def close_expired_attempt():
+    """Close an attempt whose time ran out (grace included) and return to
+    the exam list: submitted as it stood at the deadline, or without a
+    result when late submissions are rejected."""
+    if LATE_SUBMISSIONS == 'reject':
+        finish_attempt(st.session_state.exam_attempt_id)
+        notice = "⏱️ Time ran out before the exam was submitted, so no result was recorded."
+    else:
+        submitted = submit_exam_attempt()
+        if submitted is None:
+            st.error("Time is up, but the exam could not be submitted. Please try again.")
+            st.stop()
+        notice = f"⏱️ Time ran out; your answers were submitted automatically. Score: {submitted[0]}/{submitted[1]}"
+    end_exam_attempt()
+    st.session_state.exam_notice = notice
+    st.rerun()
+
+def _record_answer(question_id):
+    # radio on_change callback; widget state is dropped for questions on
+    # other pages, so the answer is copied into exam_answers
+    if exam_timer.is_expired(st.session_state.get('exam_deadline')):
+        # the paper is locked once the deadline passes
+        return
+    value = st.session_state.get(f"q_{question_id}")
+    if value is None:
+        st.session_state.exam_answers.pop(question_id, None)
+    else:
+        st.session_state.exam_answers[question_id] = value
+    save_answer(st.session_state.exam_attempt_id, question_id, value)
+
+def _set_exam_page(page):
+    # button callbacks run before the fragment reruns, so it renders the new page
+    st.session_state.exam_page = page
+
+# st.fragment reruns only the decorated function on widget changes; older
+# Streamlit versions fall back to full reruns
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+def _embed_html(html, height):
+    # st.iframe supersedes components.html for inline HTML in newer Streamlit
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=height)
+    else:
+        components.html(html, height=height)
+
+def render_exam_attempt():
+    exam = st.session_state.current_exam
+    if 'exam_attempt_id' not in st.session_state and not start_exam_attempt(exam):
+        # attempt opened before attempts were recorded, and it can't be reopened
+        end_exam_attempt()
+        st.error("Could not open the exam, please start it again.")
+        return
+    st.header(f"📝 {exam['exam_name']}")
+    st.info(f"⏱️ Time: {exam['duration_minutes']} mins | 📊 Total Marks: {exam['total_marks']} | 📝 Questions: {len(st.session_state.exam_paper)}")
+    left = exam_timer.seconds_left(st.session_state.get('exam_deadline'))
+    if left is not None:
+        # rendered outside the fragment so it keeps ticking across answers
+        _embed_html(exam_timer.countdown_html(left), height=45)
+    _exam_paper_fragment()
+
+@_fragment
+def _exam_paper_fragment():
+    with get_metrics().section('exam_fragment'):
+        questions = st.session_state.exam_paper
+        answers = st.session_state.exam_answers
+        per_page = max(1, EXAM_QUESTIONS_PER_PAGE)
+        pages = max(1, -(-len(questions) // per_page))
+        page = min(st.session_state.exam_page, pages - 1)
+        deadline = st.session_state.get('exam_deadline')
+        if exam_timer.is_expired(deadline, DEADLINE_GRACE):
+            close_expired_attempt()
+        locked = exam_timer.is_expired(deadline)
+        if locked:
+            st.warning("⏱️ Time is up. Your answers are locked, submit the exam now.")
+        
+        st.progress(len(answers) / len(questions) if questions else 0.0,
+                    text=f"Answered {len(answers)} of {len(questions)}")
+        st.divider()
+        
+        first = page * per_page
+        for i, q in enumerate(questions[first:first + per_page], first):
+            st.markdown(f"### Question {i+1} ({q['marks']} marks)")
+            st.markdown(f"**{q['question_text']}**")
+            
+            options = ["A", "B", "C", "D"]
+            saved = answers.get(q['id'])
+            st.radio(
+                f"Select your answer:",
+                options,
+                index=options.index(saved) if saved in options else None,
+                key=f"q_{q['id']}",
+                format_func=lambda x, q=q: f"{x}) {q[f'option_{x.lower()}']}",
+                on_change=_record_answer,
+                args=(q['id'],),
+                disabled=locked,
+            )
+            st.divider()
+        
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            if page > 0:
+                st.button("⬅️ Previous", key="exam_prev", use_container_width=True,
+                          on_click=_set_exam_page, args=(page - 1,))
+        with col2:
+            st.caption(f"Page {page + 1} of {pages}")
+        with col3:
+            if page < pages - 1:
+                st.button("Next ➡️", key="exam_next", use_container_width=True,
+                          on_click=_set_exam_page, args=(page + 1,))
+        
+        unanswered = len(questions) - len(answers)
+        if unanswered:
+            st.caption(f"{unanswered} question(s) unanswered; they score no marks")
+        if st.button("📤 Submit Exam", type="primary", use_container_width=True):
+            submitted = submit_exam_attempt()
+            if submitted:
+                score, total_marks = submitted
+                percentage = (score / total_marks) * 100
+                st.success(f"🎉 Exam submitted successfully!")
+                st.balloons()
+                st.metric("Your Score", f"{score}/{total_marks}", f"{percentage:.2f}%")
+                end_exam_attempt()
+                st.rerun()
+            else:
+                st.error("Failed to submit exam!")
 
 def student_interface():
     st.title("🎓 Student Dashboard")
@@ -609,81 +2111,63 @@ def student_interface():
         st.session_state.logged_in = False
         st.session_state.user_type = None
         st.session_state.user_data = None
+        st.session_state.pop('pending_exam_start', None)
+        end_exam_attempt()
         st.rerun()
     
     menu = st.sidebar.radio("Menu", ["Take Exam", "My Results"])
     
     if menu == "Take Exam":
+        # while an attempt is open only the paper is rendered, so the catalog
+        # queries don't run on every rerun
+        if st.session_state.get('exam_started'):
+            render_exam_attempt()
+            return
+        # an exam start waits for admission before the catalog is loaded,
+        # so waiting in line costs no queries
+        if 'pending_exam_start' in st.session_state:
+            if run_admitted("starting the exam", _start_pending_exam):
+                st.rerun()
+        
         st.header("Available Exams")
-        exams = get_all_exams()
+        notice = st.session_state.pop('exam_notice', None)
+        if notice:
+            st.info(notice)
+        exams = get_exam_catalog(st.session_state.user_data['id'])
+        
+        unfinished = [e['exam_name'] for e in exams if e['in_progress'] and not e['taken']]
+        if unfinished:
+            st.warning(f"⏸️ You have an unfinished exam: {', '.join(unfinished)}. Your saved answers are kept, press Resume to continue.")
         
         if exams:
             for exam in exams:
-                questions = get_exam_questions(exam['id'])
-                exam_taken = check_exam_taken(st.session_state.user_data['id'], exam['id'])
+                exam_taken = exam['taken']
+                question_count = exam['question_count']
+                blueprint = question_bank.parse_blueprint(exam.get('paper_blueprint'))
+                if blueprint and question_count:
+                    # students answer a drawn paper, not the whole bank
+                    question_count = min(question_count, question_bank.paper_length(blueprint))
                 
                 with st.container():
                     col1, col2, col3 = st.columns([3, 1, 1])
                     with col1:
                         st.subheader(exam['exam_name'])
-                        st.write(f"⏱️ Duration: {exam['duration_minutes']} minutes | 📊 Total Marks: {exam['total_marks']} | 📝 Questions: {len(questions)}")
+                        st.write(f"⏱️ Duration: {exam['duration_minutes']} minutes | 📊 Total Marks: {exam['total_marks']} | 📝 Questions: {question_count}")
                     with col2:
                         if exam_taken:
                             st.success("✅ Completed")
                     with col3:
-                        if not exam_taken and len(questions) > 0:
-                            if st.button("Start Exam", key=f"start_{exam['id']}"):
-                                st.session_state.exam_started = True
-                                st.session_state.current_exam = exam
+                        if not exam_taken and question_count > 0:
+                            label = "▶️ Resume Exam" if exam['in_progress'] else "Start Exam"
+                            if st.button(label, key=f"start_{exam['id']}"):
+                                st.session_state.pending_exam_start = exam
                                 st.rerun()
-                        elif len(questions) == 0:
+                        elif question_count == 0:
                             st.warning("No questions")
                     
                     st.divider()
         else:
             st.info("No exams available!")
-        
-        # Exam interface
-        if 'exam_started' in st.session_state and st.session_state.exam_started:
-            exam = st.session_state.current_exam
-            questions = get_exam_questions(exam['id'])
-            
-            st.divider()
-            st.header(f"📝 {exam['exam_name']}")
-            st.info(f"⏱️ Time: {exam['duration_minutes']} mins | 📊 Total Marks: {exam['total_marks']} | 📝 Questions: {len(questions)}")
-            st.divider()
-            
-            answers = {}
-            for i, q in enumerate(questions):
-                st.markdown(f"### Question {i+1} ({q['marks']} marks)")
-                st.markdown(f"**{q['question_text']}**")
-                
-                answers[q['id']] = st.radio(
-                    f"Select your answer:",
-                    ["A", "B", "C", "D"],
-                    key=f"q_{q['id']}",
-                    format_func=lambda x, q=q: f"{x}) {q[f'option_{x.lower()}']}"
-                )
-                st.divider()
-            
-            col1, col2, col3 = st.columns([1, 1, 1])
-            with col2:
-                if st.button("📤 Submit Exam", type="primary", use_container_width=True):
-                    score = 0
-                    for q in questions:
-                        if answers[q['id']] == q['correct_answer']:
-                            score += q['marks']
-                    
-                    if submit_exam(st.session_state.user_data['id'], exam['id'], score, exam['total_marks']):
-                        percentage = (score / exam['total_marks']) * 100
-                        st.success(f"🎉 Exam submitted successfully!")
-                        st.balloons()
-                        st.metric("Your Score", f"{score}/{exam['total_marks']}", f"{percentage:.2f}%")
-                        st.session_state.exam_started = False
-                        del st.session_state.current_exam
-                        st.rerun()
-                    else:
-                        st.error("Failed to submit exam!")
     
     elif menu == "My Results":
         st.header("My Exam Results")
@@ -711,7 +2195,7 @@ def student_interface():
                     color = "red"
                 
                 with st.container():
-                    col1, col2, col3 = st.columns([2, 1, 1])
+                    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
                     with col1:
                         st.subheader(result['exam_name'])
                         st.caption(f"Submitted: {result['submitted_at']}")
@@ -719,6 +2203,11 @@ def student_interface():
                         st.metric("Score", f"{result['score']}/{result['total_marks']}")
                     with col3:
                         st.metric("Grade", grade, f"{percentage:.1f}%")
+                    with col4:
+                        standing = result['standing']
+                        if standing:
+                            st.metric("Rank", f"{standing.rank} of {standing.submissions}",
+                                      f"percentile {standing.percentile:.0f}", delta_color="off")
                     
                     st.divider()
         else:
@@ -0,0 +1,97 @@
+"""Random per-student papers drawn from an exam's question pools.
+
+An exam's questions are grouped into pools by (topic, difficulty). The
+database keeps every pool as a dense list, question_pool_members(exam_id,
+topic, difficulty, position) -> question_id with positions 0..size-1 in
+question id order, plus the pool sizes in question_pools. Both are rebuilt
+whenever questions are added; because new questions get higher ids they
+are appended, so the positions of existing questions never move.
+
+An exam with a blueprint (e.g. "5 easy algebra, 3 hard geometry") gives
+every student their own paper:
+
+    spec = make_spec(blueprint, pool_sizes)     # sizes at start time
+    seed = paper_seed(exam_id, student_id)
+    draws = draw_positions(seed, spec)          # O(k) per pool, no DB work
+
+and the paper is read with primary-key lookups on the drawn positions, so
+the cost depends on the paper length, never on the pool size. The seed and
+spec are stored with the attempt; draw_positions() is deterministic, so
+the same paper can be rebuilt later (resume, grading, audits) even after
+more questions were added to the pools.
+"""
+import hashlib
+import json
+import random
+from dataclasses import dataclass
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+
+@dataclass(frozen=True)
+class PoolDraw:
+    """Draw `count` questions from the (topic, difficulty) pool. An empty
+    topic or difficulty means questions without one."""
+    topic: str
+    difficulty: str
+    count: int
+
+
+def parse_blueprint(text):
+    """Blueprint stored on exams.paper_blueprint (JSON) -> [PoolDraw]."""
+    if not text:
+        return []
+    return [PoolDraw(d['topic'], d['difficulty'], int(d['count'])) for d in json.loads(text)]
+
+
+def format_blueprint(draws):
+    return json.dumps([{'topic': d.topic, 'difficulty': d.difficulty, 'count': d.count} for d in draws])
+
+
+def validate_blueprint(draws, pool_sizes):
+    """Problems with a blueprint as a list of messages (empty when fine)."""
+    problems = []
+    seen = set()
+    for d in draws:
+        key = (d.topic, d.difficulty)
+        label = f"{d.topic or '(no topic)'} / {d.difficulty or '(any difficulty)'}"
+        if key in seen:
+            problems.append(f"{label} is listed twice")
+        seen.add(key)
+        if d.difficulty and d.difficulty not in DIFFICULTIES:
+            problems.append(f"{label}: difficulty must be one of {', '.join(DIFFICULTIES)}")
+        if d.count < 1:
+            problems.append(f"{label}: count must be at least 1")
+        elif d.count > pool_sizes.get(key, 0):
+            problems.append(f"{label}: only {pool_sizes.get(key, 0)} questions in the pool")
+    return problems
+
+
+def paper_length(draws):
+    return sum(d.count for d in draws)
+
+
+def paper_seed(exam_id, student_id):
+    """Deterministic 63-bit seed for a student's paper."""
+    digest = hashlib.sha256(f"paper:{exam_id}:{student_id}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def make_spec(draws, pool_sizes):
+    """Freeze a blueprint against the current pool sizes. The spec (JSON)
+    is what an attempt stores next to its seed."""
+    return json.dumps([
+        [d.topic, d.difficulty, min(d.count, pool_sizes.get((d.topic, d.difficulty), 0)),
+         pool_sizes.get((d.topic, d.difficulty), 0)]
+        for d in draws
+    ])
+
+
+def draw_positions(seed, spec):
+    """[(topic, difficulty, [positions])] for a stored seed and spec.
+    random.sample over a range is O(count) regardless of the pool size."""
+    rng = random.Random(seed)
+    return [
+        (topic, difficulty, rng.sample(range(size), count))
+        for topic, difficulty, count, size in json.loads(spec)
+    ]
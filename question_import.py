@@ -0,0 +1,191 @@
+"""Streaming parser and validator for bulk question files.
+
+Supported formats:
+  csv   - header row with question_text, option_a, option_b, option_c,
+          option_d, correct_answer and optional marks, topic and
+          difficulty columns
+  json  - a JSON array of objects with the same keys
+  jsonl - one JSON object per line
+
+Rows are read one at a time, so memory use does not grow with the file
+size. Database writes live in online.import_questions().
+"""
+import csv
+import io
+import json
+
+from question_bank import DIFFICULTIES
+
+COLUMNS = ('question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer', 'marks',
+           'topic', 'difficulty')
+REQUIRED = COLUMNS[:6]
+OPTION_MAX_LENGTH = 255
+TOPIC_MAX_LENGTH = 100
+
+# Largest single JSON object accepted while streaming an array
+MAX_JSON_OBJECT_BYTES = 1024 * 1024
+_READ_SIZE = 64 * 1024
+
+
+class ImportFormatError(Exception):
+    """The file as a whole can't be read (bad header, malformed JSON, ...)."""
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    if name.endswith('.json'):
+        return 'json'
+    raise ImportFormatError(f"unsupported file type: {filename} (use .csv, .json or .jsonl)")
+
+
+def _text_stream(fileobj):
+    # accept both binary uploads and already-decoded text streams
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+def _iter_csv(fileobj):
+    reader = csv.DictReader(_text_stream(fileobj))
+    if reader.fieldnames is None:
+        return
+    header = [(name or '').strip().lower() for name in reader.fieldnames]
+    missing = [col for col in REQUIRED if col not in header]
+    if missing:
+        raise ImportFormatError(f"CSV header is missing column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+    # row numbers count the header as line 1, as spreadsheets do
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def _iter_jsonl(fileobj):
+    for row_number, line in enumerate(_text_stream(fileobj), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, ValueError(f"invalid JSON: {e}")
+
+
+def _iter_json_array(fileobj):
+    # Incrementally decode the elements of a top-level JSON array so the
+    # whole document never has to be held in memory.
+    stream = _text_stream(fileobj)
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(_READ_SIZE)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ImportFormatError("JSON file must contain an array of question objects")
+    pos += 1
+    row_number = 0
+    while True:
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ImportFormatError("unexpected end of JSON file (missing ']')")
+        if buf[pos] == ']':
+            return
+        if row_number:
+            if buf[pos] != ',':
+                raise ImportFormatError(f"malformed JSON after item {row_number}: expected ',' or ']'")
+            pos += 1
+            skip_whitespace()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                break
+            except ValueError as e:
+                if eof:
+                    raise ImportFormatError(f"malformed JSON after item {row_number}: {e}")
+                if len(buf) - pos > MAX_JSON_OBJECT_BYTES:
+                    raise ImportFormatError(f"JSON item {row_number + 1} is larger than {MAX_JSON_OBJECT_BYTES} bytes")
+                fill()
+        pos = end
+        row_number += 1
+        yield row_number, obj
+
+
+def iter_raw_rows(fileobj, fmt):
+    """Yield (row_number, dict) pairs; a row that can't be decoded is
+    yielded as (row_number, exception)."""
+    if fmt == 'csv':
+        return _iter_csv(fileobj)
+    if fmt == 'jsonl':
+        return _iter_jsonl(fileobj)
+    if fmt == 'json':
+        return _iter_json_array(fileobj)
+    raise ImportFormatError(f"unknown import format: {fmt}")
+
+
+def validate_row(raw):
+    """Return (values, None) with values ordered like COLUMNS, or (None, error)."""
+    if isinstance(raw, Exception):
+        return None, str(raw)
+    if not isinstance(raw, dict):
+        return None, "expected an object with question fields"
+    row = {str(k).strip().lower(): v for k, v in raw.items()}
+    values = []
+    for col in REQUIRED[:-1]:
+        value = row.get(col)
+        value = '' if value is None else str(value).strip()
+        if not value:
+            return None, f"{col} is empty"
+        if col != 'question_text' and len(value) > OPTION_MAX_LENGTH:
+            return None, f"{col} is longer than {OPTION_MAX_LENGTH} characters"
+        values.append(value)
+    correct = str(row.get('correct_answer') or '').strip().upper()
+    if correct not in ('A', 'B', 'C', 'D'):
+        return None, f"correct_answer must be A, B, C or D (got {row.get('correct_answer')!r})"
+    values.append(correct)
+    marks = row.get('marks')
+    if marks is None or str(marks).strip() == '':
+        marks = 1
+    else:
+        try:
+            marks = int(str(marks).strip())
+        except ValueError:
+            return None, f"marks must be a whole number (got {marks!r})"
+        if marks < 1:
+            return None, "marks must be at least 1"
+    values.append(marks)
+    topic = str(row.get('topic') or '').strip()
+    if len(topic) > TOPIC_MAX_LENGTH:
+        return None, f"topic is longer than {TOPIC_MAX_LENGTH} characters"
+    values.append(topic)
+    difficulty = str(row.get('difficulty') or '').strip().lower()
+    if difficulty and difficulty not in DIFFICULTIES:
+        return None, f"difficulty must be one of {', '.join(DIFFICULTIES)} (got {row.get('difficulty')!r})"
+    values.append(difficulty)
+    return tuple(values), None
+
+
+def iter_questions(fileobj, fmt):
+    """Yield (row_number, values, error) for every row in the file."""
+    for row_number, raw in iter_raw_rows(fileobj, fmt):
+        values, error = validate_row(raw)
+        yield row_number, values, error
@@ -0,0 +1,43 @@
+"""Rebuild exam leaderboards from the results table.
+
+Leaderboards are maintained as results are written; run this after
+loading or correcting results outside the app (bulk backfills, manual
+score fixes) to bring them back in line.
+
+    python rebuild_leaderboards.py              # every exam
+    python rebuild_leaderboards.py --exam-id 3 --show 10
+"""
+import argparse
+import sys
+import time
+
+import online
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild exam leaderboards from results")
+    parser.add_argument('--exam-id', type=int, help="only this exam")
+    parser.add_argument('--show', type=int, default=0, metavar='K',
+                        help="print the top K of --exam-id afterwards")
+    args = parser.parse_args(argv)
+    if args.show and args.exam_id is None:
+        parser.error("--show needs --exam-id")
+    if not online.init_database():
+        return 2
+
+    start = time.perf_counter()
+    if not online.rebuild_leaderboards(args.exam_id):
+        print("Could not connect to the database", file=sys.stderr)
+        return 1
+    scope = f"exam {args.exam_id}" if args.exam_id is not None else "all exams"
+    print(f"Rebuilt leaderboards for {scope} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    if args.show:
+        for row in online.get_exam_leaderboard(args.exam_id, args.show):
+            print(f"{row['rank']:>4}  {row['score_bp'] / 100:6.2f}%  "
+                  f"{row['score']}/{row['total_marks']}  {row['username']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
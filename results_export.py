@@ -0,0 +1,112 @@
+"""Constant-memory writers for exam result exports.
+
+Rows arrive as an iterator of batches (lists of tuples in EXPORT_COLUMNS
+order), normally straight from a server-side cursor via
+Repository.iter_results(), and each batch is written out before the next
+one is fetched. Only one batch is ever held in memory, however many rows
+are exported.
+
+Parquet output needs pyarrow (`pip install pyarrow`); CSV works with the
+standard library alone.
+"""
+import csv
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+EXPORT_COLUMNS = (
+    'result_id', 'submitted_at', 'exam_id', 'exam_name', 'student_id',
+    'username', 'full_name', 'score', 'total_marks', 'percentage',
+)
+
+# Rows per Parquet row group; batches are grouped up to this size
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+
+def available_formats():
+    return ('csv', 'parquet') if pa is not None else ('csv',)
+
+
+def write_csv(batches, fileobj):
+    """Write a header and every batch to a text file object. Returns the
+    number of rows written."""
+    writer = csv.writer(fileobj)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for batch in batches:
+        writer.writerows(batch)
+        count += len(batch)
+    return count
+
+
+def _parquet_schema():
+    return pa.schema([
+        ('result_id', pa.int64()),
+        ('submitted_at', pa.timestamp('s')),
+        ('exam_id', pa.int64()),
+        ('exam_name', pa.string()),
+        ('student_id', pa.int64()),
+        ('username', pa.string()),
+        ('full_name', pa.string()),
+        ('score', pa.int64()),
+        ('total_marks', pa.int64()),
+        ('percentage', pa.float64()),
+    ])
+
+
+def _as_datetime(value):
+    # SQLite can hand back TIMESTAMP values as text
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _to_table(rows, schema):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == 'submitted_at':
+            values = [_as_datetime(v) for v in values]
+        elif field.name == 'percentage':
+            # MySQL returns DECIMAL for ROUND(); pyarrow wants floats
+            values = [None if v is None else float(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(batches, where, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """Write every batch to a Parquet file (path or binary file object), one
+    row group per `row_group_size` rows. Returns the number of rows."""
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = _parquet_schema()
+    count = 0
+    pending = []
+    with pq.ParquetWriter(where, schema) as writer:
+        for batch in batches:
+            pending.extend(batch)
+            if len(pending) >= row_group_size:
+                writer.write_table(_to_table(pending, schema))
+                count += len(pending)
+                pending = []
+        if pending:
+            writer.write_table(_to_table(pending, schema))
+            count += len(pending)
+        elif not count:
+            writer.write_table(schema.empty_table())
+    return count
+
+
+def write_export(batches, fmt, target):
+    """Write batches as `fmt` ('csv' or 'parquet'). `target` is a text file
+    object for CSV and a path or binary file object for Parquet."""
+    if fmt == 'csv':
+        return write_csv(batches, target)
+    if fmt == 'parquet':
+        return write_parquet(batches, target)
+    raise ValueError(f"unknown export format: {fmt}")
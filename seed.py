@@ -0,0 +1,133 @@
+"""Fill a local development database with synthetic exam data.
+
+Used by explain_check.py and benchmark.py so query plans and timings are
+measured against realistically sized tables. Never point this at a production database.
+
+    python seed.py --students 2000 --exams 100 --questions 30 --results 5
+"""
+import argparse
+import random
+import sys
+
+import online
+import question_bank
+import storage
+
+SEED_USER_PREFIX = 'seed_student_'
+SEED_PASSWORD = 'seed-password'
+SEED_TOPICS = 3
+_BATCH = 1000
+
+
+def _executemany_batched(cursor, sql, rows):
+    for start in range(0, len(rows), _BATCH):
+        cursor.executemany(sql, rows[start:start + _BATCH])
+
+
+def is_seeded():
+    conn = online.create_connection()
+    if conn is None:
+        raise RuntimeError("no database connection")
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM users WHERE username = %s", (f"{SEED_USER_PREFIX}0",))
+    seeded = bool(storage.scalar(cursor.fetchone()))
+    cursor.close()
+    conn.close()
+    return seeded
+
+
+def seed_database(students=2000, exams=100, questions_per_exam=30, results_per_student=5, rng_seed=0):
+    """Insert synthetic students, exams, questions and results. Seed students
+    are named seed_student_<n> and share the password SEED_PASSWORD.
+    Returns False without changing anything if the data is already there."""
+    if is_seeded():
+        return False
+    rng = random.Random(rng_seed)
+    conn = online.create_connection()
+    if conn is None:
+        raise RuntimeError("no database connection")
+    cursor = conn.cursor()
+    try:
+        password = online.hash_password(SEED_PASSWORD)
+        _executemany_batched(cursor, """
+            INSERT INTO users (username, password, user_type, full_name, email)
+            VALUES (%s, %s, 'student', %s, %s)
+        """, [
+            (f"{SEED_USER_PREFIX}{i}", password, f"Seed Student {i}", f"seed{i}@example.com")
+            for i in range(students)
+        ])
+        cursor.execute("SELECT id FROM users WHERE username = 'admin'")
+        admin_id = storage.scalar(cursor.fetchone())
+        cursor.execute(
+            "SELECT id FROM users WHERE username LIKE %s ORDER BY id", (f"{SEED_USER_PREFIX}%",)
+        )
+        student_ids = [storage.scalar(row) for row in cursor.fetchall()]
+
+        exam_ids = []
+        for i in range(exams):
+            cursor.execute(
+                "INSERT INTO exams (exam_name, duration_minutes, total_marks, created_by) VALUES (%s, %s, %s, %s)",
+                (f"Seed Exam {i}", rng.choice([30, 45, 60, 90]), questions_per_exam, admin_id)
+            )
+            exam_ids.append(cursor.lastrowid)
+
+        questions = []
+        for exam_id in exam_ids:
+            for q in range(questions_per_exam):
+                questions.append((
+                    exam_id, f"Seed question {q} of exam {exam_id}?",
+                    "Option A", "Option B", "Option C", "Option D",
+                    rng.choice("ABCD"), 1, f"Topic {q % SEED_TOPICS}", rng.choice(question_bank.DIFFICULTIES)
+                ))
+        _executemany_batched(cursor, storage.QUESTION_INSERT_SQL, questions)
+
+        results = []
+        for student_id in student_ids:
+            for exam_id in rng.sample(exam_ids, min(results_per_student, len(exam_ids))):
+                results.append((
+                    student_id, exam_id, rng.randint(0, questions_per_exam), questions_per_exam,
+                    f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                    f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+                ))
+        _executemany_batched(cursor, """
+            INSERT INTO results (student_id, exam_id, score, total_marks, submitted_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, results)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    online.get_repository().rebuild_pools()
+    # results were inserted directly, so backfill their leaderboards
+    online.get_repository().rebuild_leaderboards()
+    # refresh index statistics so the optimizer sees the new row counts
+    online.get_repository().analyze()
+    online.get_read_cache().invalidate(online.EXAMS_SCOPE)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--exams', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=30, help="questions per exam")
+    parser.add_argument('--results', type=int, default=5, help="results per student")
+    parser.add_argument('--rng-seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if not online.init_database():
+        return 2
+    if seed_database(args.students, args.exams, args.questions, args.results, args.rng_seed):
+        if online.STORAGE_BACKEND == 'sqlite':
+            print(f"Seeded {online.SQLITE_PATH}")
+        else:
+            print(f"Seeded {online.DB_CONFIG['database']} on {online.DB_CONFIG['host']}")
+    else:
+        print("Database already contains seed data, nothing to do")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""Read-through cache for exam metadata and question lists, optionally
+shared by every worker process of a deployment.
+
+Entries are keyed by (scope, version, kind); writers bump the scope's
+version after committing, so a reader can never store or return rows older
+than the latest write. `kind` lets values derived from the same rows (e.g.
+compiled answer keys) share the scope's version. Cached values are shared
+between sessions and must be treated as read-only.
+
+Without a backend the versions live in the process, which is only correct
+with a single worker. With a backend the versions are counters in the
+shared store, so an invalidation in one worker is seen by all of them on
+their next lookup, and loaded values are stored there too, so a question
+list is read from the database once per deployment rather than once per
+worker. Every lookup reads the scope's version from the store (one small
+GET); values of the current version are then served from the local LRU
+when present and fetched from the store otherwise.
+
+Backends:
+
+  SQLiteBackend - a key-value table in a local SQLite file (WAL), shared by
+                  worker processes on one host
+  RESPBackend   - any server speaking the Redis protocol (Redis, Valkey,
+                  KeyDB, ...), shared across hosts; `python shared_cache.py
+                  --port 6380` runs a small in-memory stand-in for tests
+
+Values are pickled, so the store must be trusted like the database. If the
+store can't be reached, lookups fall through to the loader uncached, and
+shared values expire after `ttl` seconds, which bounds how long a missed
+invalidation can leave other workers serving old rows.
+"""
+import argparse
+import pickle
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class SQLiteBackend:
+    """Keys and values in a SQLite file; worker processes on the same host
+    open the same path."""
+
+    # expired rows are purged every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path, timeout=5.0):
+        self.name = f"sqlite:{path}"
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL
+            ) WITHOUT ROWID
+        """)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at""",
+                (key, value, expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def add(self, key, value):
+        """Set a key that never expires unless it already exists."""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO cache (key, value) VALUES (?, ?)", (key, value))
+
+    def incr(self, key):
+        # UPDATE then SELECT in one write transaction rather than
+        # UPDATE ... RETURNING, which needs SQLite 3.35
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO cache (key, value) VALUES (?, 0)", (key,))
+                self._conn.execute("UPDATE cache SET value = CAST(value AS INTEGER) + 1 WHERE key = ?", (key,))
+                row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return int(row[0])
+
+    def close(self):
+        self._conn.close()
+
+
+class RESPError(Exception):
+    """An error reply from a Redis-protocol server."""
+
+
+class RESPBackend:
+    """Minimal client for servers speaking the Redis protocol (RESP2). One
+    connection, used under a lock, reconnected after a failure."""
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, timeout=1.0):
+        self.name = f"resp://{host}:{port}/{db}"
+        self._address = (host, port)
+        self._db = db
+        self._password = password
+        self._timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, timeout=1.0):
+        """redis://[:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        return cls(parsed.hostname or 'localhost', parsed.port or 6379, db, parsed.password, timeout)
+
+    def _connect(self):
+        self._sock = socket.create_connection(self._address, timeout=self._timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+        if self._password:
+            self._roundtrip('AUTH', self._password)
+        if self._db:
+            self._roundtrip('SELECT', self._db)
+
+    def _disconnect(self):
+        for closable in (self._reader, self._sock):
+            try:
+                if closable is not None:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _roundtrip(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise RESPError(rest.decode(errors='replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"unexpected reply from the cache server: {line!r}")
+
+    def command(self, *args):
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(*args)
+                except RESPError:
+                    raise
+                except OSError:
+                    # stale connection (server restart, idle timeout): retry once
+                    self._disconnect()
+                    if attempt == 2:
+                        raise
+
+    def get(self, key):
+        return self.command('GET', key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.command('SET', key, value, 'EX', int(ttl))
+        else:
+            self.command('SET', key, value)
+
+    def add(self, key, value):
+        self.command('SET', key, value, 'NX')
+
+    def incr(self, key):
+        return self.command('INCR', key)
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+class ReadCache:
+    def __init__(self, max_entries, backend=None, ttl=600, namespace='online_exam'):
+        self._max_entries = max_entries
+        self._backend = backend
+        self._ttl = ttl
+        self._namespace = namespace
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0,
+                       'shared_hits': 0, 'backend_errors': 0}
+
+    def _key(self, scope):
+        # scopes are strings or (name, id) tuples
+        return ':'.join(str(part) for part in (scope if isinstance(scope, tuple) else (scope,)))
+
+    def _version(self, scope):
+        if self._backend is None:
+            with self._lock:
+                return self._versions.get(scope, 0)
+        key = f"{self._namespace}:v:{self._key(scope)}"
+        value = self._backend.get(key)
+        if value is None:
+            # start from the clock rather than 0, so a counter lost by the
+            # store (restart, eviction) never reuses an old version number
+            self._backend.add(key, str(time.time_ns()))
+            value = self._backend.get(key)
+        return int(value)
+
+    def _store(self, key, value):
+        # caller holds the lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _error(self):
+        with self._lock:
+            self._stats['backend_errors'] += 1
+
+    def get_or_load(self, scope, loader, kind='rows'):
+        try:
+            version = self._version(scope)
+        except Exception:
+            # shared versions unknown: nothing cached can be trusted
+            self._error()
+            return loader()
+        key = (scope, version, kind)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._entries[key]
+        shared_key = f"{self._namespace}:d:{self._key(scope)}:{version}:{kind}"
+        if self._backend is not None:
+            try:
+                data = self._backend.get(shared_key)
+            except Exception:
+                self._error()
+                data = None
+            if data is not None:
+                value = pickle.loads(data)
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._stats['shared_hits'] += 1
+                    self._store(key, value)
+                return value
+        with self._lock:
+            self._stats['misses'] += 1
+        value = loader()
+        if value is None:
+            # load failed, don't cache it
+            return None
+        try:
+            if self._version(scope) != version:
+                # invalidated while loading
+                return value
+            if self._backend is not None:
+                self._backend.set(shared_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._ttl)
+        except Exception:
+            self._error()
+            return value
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def invalidate(self, scope):
+        """Make every worker reload the scope. If the shared store can't be
+        reached, other workers may serve the old values until they expire
+        (ttl); the failure is counted in backend_errors."""
+        with self._lock:
+            self._stats['invalidations'] += 1
+            if self._backend is None:
+                version = self._versions.get(scope, 0)
+                self._versions[scope] = version + 1
+            for key in [k for k in self._entries if k[0] == scope]:
+                del self._entries[key]
+        if self._backend is not None:
+            try:
+                self._backend.incr(f"{self._namespace}:v:{self._key(scope)}")
+            except Exception:
+                self._error()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self._max_entries
+        stats['backend'] = self._backend.name if self._backend is not None else 'process'
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+# --- local stand-in for a Redis-protocol server ----------------------------------
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    # the commands RESPBackend uses, plus PING/DEL/FLUSHDB for tests
+
+    def _reply(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, Exception):
+            self.wfile.write(f"-ERR {value}\r\n".encode())
+        elif value in (b'OK', b'PONG'):
+            self.wfile.write(b"+%s\r\n" % value)
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b'*'):
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        data, lock = self.server.data, self.server.lock
+        while True:
+            args = self._read_command()
+            if not args:
+                return
+            name, args = args[0].upper(), args[1:]
+            with lock:
+                now = time.monotonic()
+                for key in [k for k, (_, expires) in data.items() if expires is not None and expires <= now]:
+                    del data[key]
+                if name == b'PING':
+                    reply = b'PONG'
+                elif name in (b'AUTH', b'SELECT'):
+                    reply = b'OK'
+                elif name == b'GET':
+                    reply = data.get(args[0], (None, None))[0]
+                elif name == b'SET':
+                    options = [a.upper() for a in args[2:]]
+                    if b'NX' in options and args[0] in data:
+                        reply = None
+                    else:
+                        expires = None
+                        if b'EX' in options:
+                            expires = now + int(args[2 + options.index(b'EX') + 1])
+                        data[args[0]] = (args[1], expires)
+                        reply = b'OK'
+                elif name == b'INCR':
+                    value, expires = data.get(args[0], (b'0', None))
+                    try:
+                        reply = int(value) + 1
+                        data[args[0]] = (str(reply).encode(), expires)
+                    except ValueError:
+                        reply = ValueError("value is not an integer")
+                elif name == b'DEL':
+                    reply = sum(1 for key in args if data.pop(key, None) is not None)
+                elif name == b'FLUSHDB':
+                    data.clear()
+                    reply = b'OK'
+                else:
+                    reply = ValueError(f"unknown command '{name.decode(errors='replace')}'")
+            self._reply(reply)
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    """In-memory Redis-protocol stand-in, enough for RESPBackend."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _StandInHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an in-memory Redis-protocol stand-in for the shared cache")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args(argv)
+    with StandInServer((args.host, args.port)) as server:
+        print(f"Cache stand-in listening on {args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Cold-start budget for the exam app.
+
+A freshly started worker pays for its first page load in full: importing
+the script's dependencies, applying migrations and opening the first
+pooled connection. To keep that short, dependencies that only some pages
+need are imported at first use through lazy_import() rather than at the
+top of online.py:
+
+  pandas            - admin tables only
+  numpy             - via grading/item_analysis, first needed on submit
+  pyarrow           - via results_export, Parquet exports only
+  mysql.connector   - not at all with EXAM_STORAGE=sqlite
+  pymysql           - only when the authentication fallback is taken
+
+StartupTimer checks the first script run of each process against a budget
+(EXAM_STARTUP_BUDGET) and logs which lazy imports it paid for when it runs
+over. `python startup.py` prints the import-time profile of a module
+(python -X importtime) and exits non-zero when importing it takes longer
+than --budget, so an eager heavy import shows up as a failing check:
+
+    python startup.py                    # profile `import online`
+    python startup.py --top 15 --budget 0.8
+"""
+import argparse
+import importlib
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+log = logging.getLogger('online_exam.startup')
+
+_lock = threading.Lock()
+_import_seconds = {}
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self._lazy_name = name
+        self._lazy_module = None
+
+    def _load(self):
+        if self._lazy_module is None:
+            loaded = self._lazy_name in sys.modules
+            start = time.perf_counter()
+            module = importlib.import_module(self._lazy_name)
+            if not loaded:
+                with _lock:
+                    _import_seconds.setdefault(self._lazy_name, time.perf_counter() - start)
+            self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_module is not None else 'not loaded'
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def available(name):
+    """True if a module can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_imports():
+    """{module: seconds} for the lazy imports done so far in this process."""
+    with _lock:
+        return dict(_import_seconds)
+
+
+class StartupTimer:
+    """Times the first script run of a process against a budget (seconds,
+    None or 0 for no budget)."""
+
+    def __init__(self, budget=None):
+        self.budget = budget or None
+        self.first_run = None
+        self._lock = threading.Lock()
+
+    def record_run(self, seconds):
+        """Record a script run; only the first one counts. Returns True if it
+        was the first and went over the budget."""
+        with self._lock:
+            if self.first_run is not None:
+                return False
+            self.first_run = seconds
+        if self.budget is not None and seconds > self.budget:
+            paid = ', '.join(f"{name} {s * 1000:.0f}ms" for name, s in
+                             sorted(lazy_imports().items(), key=lambda item: -item[1]))
+            log.warning("first script run took %.2fs, over the %.2fs startup budget (lazy imports: %s)",
+                        seconds, self.budget, paid or 'none')
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            first_run = self.first_run
+        return {
+            'budget_seconds': self.budget,
+            'first_run_seconds': first_run,
+            'over_budget': bool(self.budget and first_run is not None and first_run > self.budget),
+            'lazy_imports': lazy_imports(),
+        }
+
+
+# --- import-time profile ------------------------------------------------------
+
+def profile_imports(module='online', env=None):
+    """Import `module` in a fresh interpreter with -X importtime. Returns
+    (total_seconds, rows) with rows of (module, self_seconds,
+    cumulative_seconds), slowest cumulative first."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    total = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # nesting is shown by indentation; the module itself is at the top level
+        if name.strip() == module and len(name) - len(name.lstrip()) == 1:
+            total = int(cumulative_us) / 1e6
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return total if total is not None else sum(row[1] for row in rows), rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile of the exam app")
+    parser.add_argument('--module', default='online', help="module to import (default: online)")
+    parser.add_argument('--top', type=int, default=20, help="slowest imports to list")
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('EXAM_IMPORT_BUDGET', '1.0')),
+                        help="fail if the import takes longer (seconds)")
+    args = parser.parse_args(argv)
+
+    total, rows = profile_imports(args.module)
+    print(f"{'cumulative':>11} {'self':>9}  module")
+    for name, self_s, cumulative_s in rows[:args.top]:
+        print(f"{cumulative_s * 1000:9.1f}ms {self_s * 1000:7.1f}ms  {name}")
+    for name in ('pandas', 'numpy', 'pyarrow', 'mysql.connector', 'pymysql'):
+        if any(row[0] == name for row in rows):
+            print(f"note: {name} is imported eagerly by `import {args.module}`")
+    print(f"import {args.module}: {total:.2f}s (budget {args.budget:.2f}s)")
+    if total > args.budget:
+        print("over the import budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1532 @@
+"""Storage backends for the Online Examination System.
+
+Every SQL statement the app runs lives in a Repository. online.py picks the
+implementation from EXAM_STORAGE:
+
+  MySQLRepository  - the MySQL server (mysql-connector or PyMySQL)
+  SQLiteRepository - an embedded SQLite file in WAL mode, for small
+                     deployments, benchmarks and local testing
+
+A repository is created with a `connect` callable returning a connection
+wrapper (online._ConnWrapper: cursor(dictionary=...), commit, rollback,
+close) or None when the database can't be reached. As in the original
+helpers, reads then return None and writes return False/None; the caller
+decides what to show the user. An optional `connect_read` callable serves
+the hot read-only queries, e.g. from a replica.
+
+SQL is written once with %s placeholders; SQLiteCursor rewrites them to
+`?`. Only genuinely dialect-specific parts (DDL, INSERT IGNORE, locking)
+are overridden in the subclasses.
+"""
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from exam_timer import deadline_for
+from leaderboards import competition_ranks, score_bp, standing
+
+RESULT_PERCENTAGE_SQL = "r.score * 100.0 / NULLIF(r.total_marks, 0)"
+
+QUESTION_INSERT_SQL = """INSERT INTO questions (exam_id, question_text, option_a, option_b,
+               option_c, option_d, correct_answer, marks, topic, difficulty)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+
+def scalar(row):
+    # first column of a row from either a dict or a tuple cursor
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return next(iter(row.values()))
+    return row[0]
+
+
+def _keyset_page(rows, limit, key):
+    # rows were fetched with LIMIT limit + 1; the extra row only signals a next page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = key(rows[-1])
+    return rows, next_cursor
+
+
+def _percentiles_from_histogram(histogram, total, percentiles):
+    # nearest-rank percentiles over (value, count) pairs sorted by value
+    out = {}
+    for p in percentiles:
+        rank = max(1, -(-p * total // 100))
+        seen = 0
+        for value, count in histogram:
+            seen += count
+            if seen >= rank:
+                out[p] = value
+                break
+    return out
+
+
+def _results_where(exam_id=None, date_from=None, date_to=None, student_id=None):
+    # date_to is inclusive: everything submitted before the following midnight
+    clauses, params = [], []
+    if exam_id is not None:
+        clauses.append("r.exam_id = %s")
+        params.append(exam_id)
+    if date_from is not None:
+        clauses.append("r.submitted_at >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        clauses.append("r.submitted_at < %s")
+        params.append(date_to + timedelta(days=1))
+    if student_id is not None:
+        clauses.append("r.student_id = %s")
+        params.append(student_id)
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+
+class Repository(ABC):
+    dialect = None
+    insert_ignore = "INSERT IGNORE"
+    answer_upsert = None
+    score_count_upsert = None
+    # results.score_bp computed in SQL, matching leaderboards.score_bp()
+    score_bp_sql = None
+    # [(version, description, function(repository, cursor))], see run_migrations()
+    migrations = []
+
+    def __init__(self, connect, default_admin_password_hash, connect_read=None):
+        self._connect = connect
+        # Hot read-only queries may run on a replica through `connect_read`.
+        # Everything else uses the primary: writes, attempt state, and the
+        # exam and question lists, which online.py caches; a lagging replica
+        # must not be cached under the version a write just bumped.
+        self._connect_read = connect_read or connect
+        self._admin_password_hash = default_admin_password_hash
+
+    # --- schema -----------------------------------------------------------
+
+    @abstractmethod
+    def _lock_schema(self, cursor):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _migration_applied(self, conn):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _unlock_schema(self, conn, cursor, ok):
+        raise NotImplementedError
+
+    def run_migrations(self):
+        """Apply pending migrations and return the versions applied. Callers
+        in other processes block on the backend's schema lock meanwhile.
+        Raises on connection or migration failure."""
+        conn = self._connect()
+        if conn is None:
+            raise RuntimeError("no database connection for schema migrations")
+        cursor = conn.cursor()
+        applied = []
+        try:
+            self._lock_schema(cursor)
+            ok = False
+            try:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("SELECT version FROM schema_migrations")
+                done = {int(scalar(row)) for row in cursor.fetchall()}
+                for version, description, migrate in self.migrations:
+                    if version in done:
+                        continue
+                    migrate(self, cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    self._migration_applied(conn)
+                    applied.append(version)
+                ok = True
+            finally:
+                self._unlock_schema(conn, cursor, ok)
+        finally:
+            cursor.close()
+            conn.close()
+        return applied
+
+    @abstractmethod
+    def analyze(self, tables=('users', 'exams', 'questions', 'results')):
+        """Refresh optimizer statistics after bulk loads."""
+        raise NotImplementedError
+
+    # --- users --------------------------------------------------------------
+
+    def authenticate(self, username, hashed_password, user_type):
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """SELECT id, username, user_type, full_name, email FROM users
+                   WHERE username=%s AND password=%s AND user_type=%s""",
+                (username, hashed_password, user_type)
+            )
+            user = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return user
+        return None
+
+    def register_student(self, username, hashed_password, full_name, email):
+        """Insert a student account. Raises the driver's error on a duplicate
+        username."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "INSERT INTO users (username, password, user_type, full_name, email) VALUES (%s, %s, 'student', %s, %s)",
+                    (username, hashed_password, full_name, email)
+                )
+                conn.commit()
+                return True
+            finally:
+                # always hand the connection back, including on duplicate usernames
+                cursor.close()
+                conn.close()
+        return False
+
+    def find_student_id(self, username):
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT id FROM users WHERE username=%s AND user_type='student'", (username,)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return row['id'] if row else None
+        return None
+
+    # --- exams and questions --------------------------------------------------
+
+    def create_exam(self, exam_name, duration, total_marks, admin_id, questions=()):
+        """Insert an exam and its questions (value tuples ordered like
+        question_import.COLUMNS) in one transaction, the questions with one
+        executemany(). Returns the exam id, None without a connection;
+        raises, having written nothing, if an insert fails."""
+        conn = self._connect()
+        if conn is None:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO exams (exam_name, duration_minutes, total_marks, created_by) VALUES (%s, %s, %s, %s)",
+                (exam_name, duration, total_marks, admin_id)
+            )
+            exam_id = cursor.lastrowid
+            if questions:
+                cursor.executemany(QUESTION_INSERT_SQL, [(exam_id,) + tuple(values) for values in questions])
+                self._rebuild_pools(cursor, exam_id)
+            conn.commit()
+            cursor.close()
+            return exam_id
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _begin(self, cursor):
+        # start an explicit transaction where the driver wouldn't open one
+        # before a SAVEPOINT (MySQL opens one implicitly with autocommit off)
+        pass
+
+    def import_questions(self, exam_id, rows, batch_size, record_error):
+        """Insert validated question rows in executemany() batches inside one
+        transaction. `rows` yields (row_number, values, error); invalid rows
+        and rows the database rejects go to record_error(row_number, message)
+        and are skipped. Returns the number inserted, None without a
+        connection; raises LookupError if the exam does not exist."""
+        conn = self._connect()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        inserted = 0
+
+        def flush(batch):
+            nonlocal inserted
+            # the savepoint undoes a partially applied batch before the
+            # row-by-row retry that finds the rejected rows
+            cursor.execute("SAVEPOINT import_batch")
+            try:
+                cursor.executemany(QUESTION_INSERT_SQL, [(exam_id,) + values for _, values in batch])
+                cursor.execute("RELEASE SAVEPOINT import_batch")
+                inserted += len(batch)
+                return
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT import_batch")
+                cursor.execute("RELEASE SAVEPOINT import_batch")
+            for row_number, values in batch:
+                try:
+                    cursor.execute(QUESTION_INSERT_SQL, (exam_id,) + values)
+                    inserted += 1
+                except Exception as e:
+                    record_error(row_number, f"rejected by database: {e}")
+
+        try:
+            cursor.execute("SELECT id FROM exams WHERE id=%s", (exam_id,))
+            if cursor.fetchone() is None:
+                raise LookupError(f"exam {exam_id} does not exist")
+            self._begin(cursor)
+            batch = []
+            for row_number, values, error in rows:
+                if error:
+                    record_error(row_number, error)
+                    continue
+                batch.append((row_number, values))
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+            if inserted:
+                self._rebuild_pools(cursor, exam_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        return inserted
+
+    # --- question pools (see question_bank.py) -------------------------------
+
+    def _rebuild_pools(self, cursor, exam_id=None):
+        # dense 0-based positions per (exam, topic, difficulty) in id order,
+        # rebuilt inside the caller's transaction
+        where, params = ("WHERE exam_id = %s", (exam_id,)) if exam_id is not None else ("", ())
+        cursor.execute(f"DELETE FROM question_pool_members {where}", params)
+        cursor.execute(f"DELETE FROM question_pools {where}", params)
+        cursor.execute(f"""
+            INSERT INTO question_pool_members (exam_id, topic, difficulty, position, question_id)
+            SELECT exam_id, topic, difficulty,
+                   ROW_NUMBER() OVER (PARTITION BY exam_id, topic, difficulty ORDER BY id) - 1, id
+            FROM questions {where}
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO question_pools (exam_id, topic, difficulty, size)
+            SELECT exam_id, topic, difficulty, COUNT(*)
+            FROM questions {where}
+            GROUP BY exam_id, topic, difficulty
+        """, params)
+
+    def rebuild_pools(self, exam_id=None):
+        """Rebuild the pools of one exam, or of every exam."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            try:
+                self._rebuild_pools(cursor, exam_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                conn.close()
+            return True
+        return False
+
+    def pool_sizes(self, exam_id):
+        """{(topic, difficulty): number of questions} for an exam."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT topic, difficulty, size FROM question_pools WHERE exam_id=%s", (exam_id,))
+            sizes = {(row['topic'], row['difficulty']): int(row['size']) for row in cursor.fetchall()}
+            cursor.close()
+            conn.close()
+            return sizes
+        return None
+
+    def draw_pool_questions(self, exam_id, draws):
+        """Question rows for [(topic, difficulty, [positions])], in draw
+        order. Each pool is read with primary-key lookups on its positions."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            paper = []
+            for topic, difficulty, positions in draws:
+                if not positions:
+                    continue
+                marks = ", ".join(["%s"] * len(positions))
+                cursor.execute(f"""
+                    SELECT m.position AS pool_position, q.*
+                    FROM question_pool_members m
+                    JOIN questions q ON q.id = m.question_id
+                    WHERE m.exam_id = %s AND m.topic = %s AND m.difficulty = %s
+                      AND m.position IN ({marks})
+                """, (exam_id, topic, difficulty, *positions))
+                by_position = {row.pop('pool_position'): row for row in cursor.fetchall()}
+                paper += [by_position[p] for p in positions if p in by_position]
+            cursor.close()
+            conn.close()
+            return paper
+        return None
+
+    def set_exam_blueprint(self, exam_id, blueprint):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE exams SET paper_blueprint=%s WHERE id=%s", (blueprint, exam_id))
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        return False
+
+    def delete_exam(self, exam_id):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM exams WHERE id=%s", (exam_id,))
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        return False
+
+    def all_exams(self):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM exams ORDER BY created_at DESC")
+            exams = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            return exams
+        return None
+
+    def count_exams(self):
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT COUNT(*) AS cnt FROM exams")
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return int(row['cnt']) if row else 0
+        return None
+
+    def exams_page(self, after, limit):
+        """Keyset page of exams ordered by (created_at, id) descending, with
+        question counts and marks. Returns (exams, next_cursor) or None."""
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            sql = """
+                SELECT e.*,
+                       (SELECT COUNT(*) FROM questions q WHERE q.exam_id = e.id) AS question_count,
+                       (SELECT COALESCE(SUM(q.marks), 0) FROM questions q WHERE q.exam_id = e.id) AS question_marks
+                FROM exams e
+            """
+            params = []
+            if after is not None:
+                created_at, exam_id = after
+                sql += " WHERE (e.created_at < %s OR (e.created_at = %s AND e.id < %s))"
+                params += [created_at, created_at, exam_id]
+            sql += " ORDER BY e.created_at DESC, e.id DESC LIMIT %s"
+            # fetch one extra row to know whether another page follows
+            params.append(limit + 1)
+            cursor.execute(sql, tuple(params))
+            exams = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            for exam in exams:
+                exam['question_count'] = int(exam['question_count'])
+                exam['question_marks'] = int(exam['question_marks'])
+            return _keyset_page(exams, limit, lambda e: (e['created_at'], e['id']))
+        return None
+
+    def exam_questions(self, exam_id):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM questions WHERE exam_id=%s", (exam_id,))
+            questions = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            return questions
+        return None
+
+    def exam_catalog(self, student_id):
+        """All exams with question count, summed question marks and whether
+        the student has a result for them, in one aggregated query."""
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT e.*,
+                       COALESCE(q.question_count, 0) AS question_count,
+                       COALESCE(q.question_marks, 0) AS question_marks,
+                       EXISTS(SELECT 1 FROM results r
+                              WHERE r.student_id = %s AND r.exam_id = e.id) AS taken,
+                       EXISTS(SELECT 1 FROM attempts a
+                              WHERE a.student_id = %s AND a.exam_id = e.id
+                                AND a.status = 'in_progress') AS in_progress
+                FROM exams e
+                LEFT JOIN (
+                    SELECT exam_id, COUNT(*) AS question_count, SUM(marks) AS question_marks
+                    FROM questions
+                    GROUP BY exam_id
+                ) q ON q.exam_id = e.id
+                ORDER BY e.created_at DESC
+            """, (student_id, student_id))
+            exams = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            for exam in exams:
+                # SUM()/EXISTS come back as Decimal/int depending on the driver
+                exam['question_count'] = int(exam['question_count'])
+                exam['question_marks'] = int(exam['question_marks'])
+                exam['taken'] = bool(exam['taken'])
+                exam['in_progress'] = bool(exam['in_progress'])
+            return exams
+        return None
+
+    # --- attempts -------------------------------------------------------------
+
+    def open_attempt(self, student_id, exam_id, duration_minutes):
+        """The student's attempt at an exam, started if there is none yet
+        with its deadline `duration_minutes` from now. Returns the attempts
+        row, whose status may already be 'submitted'."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            select = "SELECT * FROM attempts WHERE student_id=%s AND exam_id=%s"
+            cursor.execute(select, (student_id, exam_id))
+            attempt = cursor.fetchone()
+            if attempt is None:
+                # IGNORE: a second tab may have started it meanwhile
+                started_at = datetime.now().replace(microsecond=0)
+                cursor.execute(
+                    f"""{self.insert_ignore} INTO attempts (student_id, exam_id, started_at, deadline)
+                        VALUES (%s, %s, %s, %s)""",
+                    (student_id, exam_id, started_at, deadline_for(started_at, duration_minutes))
+                )
+                conn.commit()
+                cursor.execute(select, (student_id, exam_id))
+                attempt = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return attempt
+        return None
+
+    def attempt_answers(self, attempt_id):
+        """Saved answers of an attempt as {question_id: 'A'..'D'}."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT question_id, answer FROM attempt_answers WHERE attempt_id=%s", (attempt_id,))
+            answers = {row['question_id']: row['answer'] for row in cursor.fetchall()}
+            cursor.close()
+            conn.close()
+            return answers
+        return None
+
+    def save_answers(self, changes):
+        """Apply [(attempt_id, question_id, answer or None)] in one transaction:
+        upsert the answered ones, delete the cleared ones. Raises when the
+        database is unavailable so the caller can retry."""
+        conn = self._connect()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        try:
+            cursor = conn.cursor()
+            upserts = [(att, q, a) for att, q, a in changes if a is not None]
+            cleared = [(att, q) for att, q, a in changes if a is None]
+            if upserts:
+                cursor.executemany(self.answer_upsert, upserts)
+            if cleared:
+                cursor.executemany("DELETE FROM attempt_answers WHERE attempt_id=%s AND question_id=%s", cleared)
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def set_attempt_paper(self, attempt_id, seed, spec):
+        """Record the seed and spec of an attempt's random paper unless one
+        is already set (another tab may have won). Returns (seed, spec) as
+        stored."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "UPDATE attempts SET paper_seed=%s, paper_spec=%s WHERE id=%s AND paper_spec IS NULL",
+                (seed, spec, attempt_id)
+            )
+            conn.commit()
+            cursor.execute("SELECT paper_seed, paper_spec FROM attempts WHERE id=%s", (attempt_id,))
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return (int(row['paper_seed']), row['paper_spec']) if row else None
+        return None
+
+    def finish_attempt(self, attempt_id, paper_questions=None, responses=None):
+        """Mark an attempt submitted. With the packed response row
+        (item_analysis.pack_responses) it is stored on the attempt and the
+        attempt's autosaved answers are dropped in the same transaction."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE attempts SET status='submitted', submitted_at=%s, paper_questions=%s, responses=%s
+                   WHERE id=%s AND status='in_progress'""",
+                (datetime.now().replace(microsecond=0), paper_questions, responses, attempt_id)
+            )
+            if responses is not None and cursor.rowcount > 0:
+                cursor.execute("DELETE FROM attempt_answers WHERE attempt_id=%s", (attempt_id,))
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        return False
+
+    def iter_exam_responses(self, exam_id, batch_size=5000):
+        """Yield the packed (paper_questions, responses) rows of an exam's
+        submitted attempts in batches, through a server-side cursor. Raises
+        when the database is unavailable."""
+        conn = self._connect_read()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        try:
+            cursor = conn.cursor(stream=True)
+            try:
+                self._prepare_stream(cursor)
+                cursor.execute("""
+                    SELECT paper_questions, responses FROM attempts
+                    WHERE exam_id=%s AND status='submitted' AND responses IS NOT NULL
+                """, (exam_id,))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [(bytes(row[0]), bytes(row[1])) for row in rows]
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    # --- results --------------------------------------------------------------
+
+    def _bump_score_counts(self, cursor, counts):
+        # counts: Counter of (exam_id, score_bp) for results just inserted in
+        # the caller's transaction
+        if counts:
+            cursor.executemany(self.score_count_upsert,
+                               [(exam_id, bp, n) for (exam_id, bp), n in sorted(counts.items())])
+
+    def insert_result(self, student_id, exam_id, score, total_marks):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            try:
+                bp = score_bp(score, total_marks)
+                cursor.execute(
+                    "INSERT INTO results (student_id, exam_id, score, total_marks, score_bp) VALUES (%s, %s, %s, %s, %s)",
+                    (student_id, exam_id, score, total_marks, bp)
+                )
+                self._bump_score_counts(cursor, Counter({(exam_id, bp): 1}))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                conn.close()
+            return True
+        return False
+
+    def insert_results_idempotent(self, records):
+        """Insert write-behind records in one transaction, ignoring any whose
+        submission_id is already stored. Raises when the database is
+        unavailable so the caller can retry."""
+        if not records:
+            return
+        conn = self._connect()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        try:
+            cursor = conn.cursor()
+            # a replayed journal may hold submissions that are already stored;
+            # only new ones may count towards the leaderboards
+            ids = [r['id'] for r in records]
+            cursor.execute(
+                f"SELECT submission_id FROM results WHERE submission_id IN ({', '.join(['%s'] * len(ids))})",
+                ids
+            )
+            stored = {scalar(row) for row in cursor.fetchall()}
+            fresh = [r for r in records if r['id'] not in stored]
+            rows = [(r['student_id'], r['exam_id'], r['score'], r['total_marks'],
+                     score_bp(r['score'], r['total_marks']), r['submitted_at'], r['id'])
+                    for r in fresh]
+            if rows:
+                # IGNORE still covers a concurrent replay of the same journal
+                cursor.executemany(
+                    f"""{self.insert_ignore} INTO results
+                       (student_id, exam_id, score, total_marks, score_bp, submitted_at, submission_id)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                    rows
+                )
+                self._bump_score_counts(cursor, Counter((row[1], row[4]) for row in rows))
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def exam_taken(self, student_id, exam_id):
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor()
+            # return a named column so dict-cursors have a predictable key
+            cursor.execute(
+                "SELECT COUNT(*) AS cnt FROM results WHERE student_id=%s AND exam_id=%s",
+                (student_id, exam_id)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            # handle both dict (PyMySQL / dict-cursor) and tuple results
+            count = scalar(row)
+            try:
+                return int(count) > 0
+            except Exception:
+                return False
+        return None
+
+    def student_results(self, student_id):
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            # standings come from the exams' score distributions, a few
+            # primary-key range reads per result rather than a rescan of results
+            cursor.execute("""
+                SELECT r.*, e.exam_name,
+                       (SELECT COALESCE(SUM(c.submissions), 0) FROM exam_score_counts c
+                        WHERE c.exam_id = r.exam_id AND c.score_bp > r.score_bp) AS ranked_above,
+                       (SELECT COALESCE(SUM(c.submissions), 0) FROM exam_score_counts c
+                        WHERE c.exam_id = r.exam_id AND c.score_bp = r.score_bp) AS ranked_equal,
+                       (SELECT COALESCE(SUM(c.submissions), 0) FROM exam_score_counts c
+                        WHERE c.exam_id = r.exam_id) AS exam_submissions
+                FROM results r
+                JOIN exams e ON r.exam_id = e.id
+                WHERE r.student_id = %s
+                ORDER BY r.submitted_at DESC
+            """, (student_id,))
+            results = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            for result in results:
+                result['standing'] = standing(
+                    int(result.pop('ranked_above')), int(result.pop('ranked_equal')),
+                    int(result.pop('exam_submissions'))
+                )
+            return results
+        return None
+
+    def all_results(self):
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT r.*, u.full_name, u.username, e.exam_name
+                FROM results r
+                JOIN users u ON r.student_id = u.id
+                JOIN exams e ON r.exam_id = e.id
+                ORDER BY r.submitted_at DESC
+            """)
+            results = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            return results
+        return None
+
+    def results_summary(self, exam_id=None, date_from=None, date_to=None, student_id=None,
+                        percentiles=(25, 50, 75, 90)):
+        """Count, mean, min/max and percentiles of result percentages for the
+        filtered results. Percentiles come from a histogram grouped in the
+        database and rounded to whole percent, so at most ~100 rows are
+        transferred."""
+        conn = self._connect_read()
+        if conn:
+            where, params = _results_where(exam_id, date_from, date_to, student_id)
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT COUNT(*) AS submissions,
+                       AVG({RESULT_PERCENTAGE_SQL}) AS mean_percentage,
+                       MIN({RESULT_PERCENTAGE_SQL}) AS min_percentage,
+                       MAX({RESULT_PERCENTAGE_SQL}) AS max_percentage
+                FROM results r{where}
+            """, tuple(params))
+            row = cursor.fetchone()
+            cursor.execute(f"""
+                SELECT ROUND({RESULT_PERCENTAGE_SQL}) AS pct, COUNT(*) AS cnt
+                FROM results r{where}
+                GROUP BY pct
+                ORDER BY pct
+            """, tuple(params))
+            histogram = [(float(h['pct']), int(h['cnt'])) for h in cursor.fetchall() if h['pct'] is not None]
+            cursor.close()
+            conn.close()
+            submissions = int(row['submissions']) if row else 0
+            summary = {'submissions': submissions, 'percentiles': {}}
+            for name in ('mean_percentage', 'min_percentage', 'max_percentage'):
+                summary[name] = float(row[name]) if row and row[name] is not None else None
+            if submissions:
+                summary['percentiles'] = _percentiles_from_histogram(
+                    histogram, sum(cnt for _, cnt in histogram), percentiles
+                )
+            return summary
+        return None
+
+    def results_by_exam(self, date_from=None, date_to=None, student_id=None):
+        """Per-exam submission count, mean and highest percentage."""
+        conn = self._connect_read()
+        if conn:
+            where, params = _results_where(None, date_from, date_to, student_id)
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT s.exam_id, e.exam_name, s.submissions, s.mean_percentage, s.max_percentage
+                FROM (
+                    SELECT r.exam_id,
+                           COUNT(*) AS submissions,
+                           AVG({RESULT_PERCENTAGE_SQL}) AS mean_percentage,
+                           MAX({RESULT_PERCENTAGE_SQL}) AS max_percentage
+                    FROM results r{where}
+                    GROUP BY r.exam_id
+                ) s
+                JOIN exams e ON e.id = s.exam_id
+                ORDER BY e.exam_name
+            """, tuple(params))
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            for row in rows:
+                row['submissions'] = int(row['submissions'])
+                for name in ('mean_percentage', 'max_percentage'):
+                    row[name] = float(row[name]) if row[name] is not None else None
+            return rows
+        return None
+
+    def _prepare_stream(self, cursor):
+        # session settings for a long-running streamed read
+        pass
+
+    def iter_results(self, exam_id=None, date_from=None, date_to=None, student_id=None, batch_size=5000):
+        """Yield every matching result, oldest first, as batches of tuples in
+        results_export.EXPORT_COLUMNS order. Rows are read through a
+        server-side (unbuffered) cursor, so memory use is one batch however
+        many rows match. Holds a pooled connection until exhausted or closed.
+        Raises when the database is unavailable."""
+        conn = self._connect_read()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        try:
+            cursor = conn.cursor(stream=True)
+            try:
+                self._prepare_stream(cursor)
+                where, params = _results_where(exam_id, date_from, date_to, student_id)
+                cursor.execute(f"""
+                    SELECT r.id, r.submitted_at, r.exam_id, e.exam_name, r.student_id,
+                           u.username, u.full_name, r.score, r.total_marks,
+                           ROUND({RESULT_PERCENTAGE_SQL}, 2) AS percentage
+                    FROM results r
+                    JOIN users u ON u.id = r.student_id
+                    JOIN exams e ON e.id = r.exam_id
+                    {where}
+                    ORDER BY r.submitted_at, r.id
+                """, tuple(params))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def results_page(self, after, limit, exam_id=None, date_from=None, date_to=None, student_id=None):
+        """Keyset page of results ordered by (submitted_at, id) descending,
+        joined with student and exam names. Returns (rows, next_cursor) or None."""
+        conn = self._connect_read()
+        if conn:
+            where, params = _results_where(exam_id, date_from, date_to, student_id)
+            if after is not None:
+                submitted_at, result_id = after
+                keyset = "(r.submitted_at < %s OR (r.submitted_at = %s AND r.id < %s))"
+                where += (" AND " if where else " WHERE ") + keyset
+                params += [submitted_at, submitted_at, result_id]
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT r.id, u.full_name, u.username, e.exam_name, r.score, r.total_marks,
+                       ROUND({RESULT_PERCENTAGE_SQL}, 2) AS percentage, r.submitted_at
+                FROM results r
+                JOIN users u ON r.student_id = u.id
+                JOIN exams e ON r.exam_id = e.id{where}
+                ORDER BY r.submitted_at DESC, r.id DESC
+                LIMIT %s
+            """, tuple(params) + (limit + 1,))
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            for row in rows:
+                if row['percentage'] is not None:
+                    row['percentage'] = float(row['percentage'])
+            return _keyset_page(rows, limit, lambda r: (r['submitted_at'], r['id']))
+        return None
+
+    # --- leaderboards (see leaderboards.py) -----------------------------------
+
+    def _rebuild_leaderboards(self, cursor, exam_id=None):
+        # recompute score_bp and the score distributions from results,
+        # inside the caller's transaction
+        where, params = ("WHERE exam_id = %s", (exam_id,)) if exam_id is not None else ("", ())
+        cursor.execute(f"UPDATE results SET score_bp = {self.score_bp_sql} {where}", params)
+        cursor.execute(f"DELETE FROM exam_score_counts {where}", params)
+        cursor.execute(f"""
+            INSERT INTO exam_score_counts (exam_id, score_bp, submissions)
+            SELECT exam_id, score_bp, COUNT(*)
+            FROM results {where}
+            GROUP BY exam_id, score_bp
+        """, params)
+
+    def rebuild_leaderboards(self, exam_id=None):
+        """Rebuild the leaderboard of one exam, or of every exam, from the
+        results table (backfills and corrections)."""
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            try:
+                self._rebuild_leaderboards(cursor, exam_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                conn.close()
+            return True
+        return False
+
+    def exam_leaderboard(self, exam_id, limit=10):
+        """The exam's top `limit` results, best first, each with its 'rank'
+        (ties share one). Reads `limit` rows off idx_results_exam_rank."""
+        conn = self._connect_read()
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT r.id AS result_id, r.student_id, u.username, u.full_name,
+                       r.score, r.total_marks, r.score_bp, r.submitted_at
+                FROM results r
+                JOIN users u ON u.id = r.student_id
+                WHERE r.exam_id = %s
+                ORDER BY r.score_bp DESC, r.submitted_at, r.id
+                LIMIT %s
+            """, (exam_id, limit))
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            return competition_ranks(rows)
+        return None
+
+
+# --- MySQL ---------------------------------------------------------------------
+
+MYSQL_MIGRATION_LOCK_NAME = 'online_exam_schema_migrations'
+
+# net_write_timeout (seconds) for connections streaming an export
+STREAM_NET_WRITE_TIMEOUT = 600
+
+
+def _mysql_create_index_if_missing(cursor, table, name, columns, unique=False):
+    # MySQL has no CREATE INDEX IF NOT EXISTS
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, name))
+    if not scalar(cursor.fetchone()):
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"CREATE {kind} {name} ON {table} ({columns})")
+
+
+def _mysql_001_initial_schema(repo, cursor):
+    # Users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            user_type ENUM('admin', 'student') NOT NULL,
+            full_name VARCHAR(255),
+            email VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Exams table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exams (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            exam_name VARCHAR(255) NOT NULL,
+            duration_minutes INT NOT NULL,
+            total_marks INT NOT NULL,
+            created_by INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES users(id)
+        )
+    """)
+
+    # Questions table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS questions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            exam_id INT NOT NULL,
+            question_text TEXT NOT NULL,
+            option_a VARCHAR(255) NOT NULL,
+            option_b VARCHAR(255) NOT NULL,
+            option_c VARCHAR(255) NOT NULL,
+            option_d VARCHAR(255) NOT NULL,
+            correct_answer ENUM('A', 'B', 'C', 'D') NOT NULL,
+            marks INT DEFAULT 1,
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Results table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            exam_id INT NOT NULL,
+            score INT NOT NULL,
+            total_marks INT NOT NULL,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES users(id),
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _mysql_002_legacy_user_columns(repo, cursor):
+    # Legacy users tables were created before the email/full_name fields existed
+    cursor.execute("SHOW COLUMNS FROM users LIKE 'email'")
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE users ADD COLUMN email VARCHAR(255)")
+    cursor.execute("SHOW COLUMNS FROM users LIKE 'full_name'")
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE users ADD COLUMN full_name VARCHAR(255)")
+
+
+def _mysql_003_default_admin(repo, cursor):
+    cursor.execute("""
+        INSERT IGNORE INTO users (username, password, user_type, full_name)
+        VALUES ('admin', %s, 'admin', 'Administrator')
+    """, (repo._admin_password_hash,))
+
+
+def _mysql_004_hot_path_indexes(repo, cursor):
+    # check_exam_taken / exam catalog: results by (student, exam)
+    _mysql_create_index_if_missing(cursor, 'results', 'idx_results_student_exam', 'student_id, exam_id')
+    # get_student_results: one student's results, newest first
+    _mysql_create_index_if_missing(cursor, 'results', 'idx_results_student_submitted', 'student_id, submitted_at')
+    # get_all_results / results pages: all results newest first (id is
+    # implicitly appended to InnoDB secondary indexes, covering the keyset)
+    _mysql_create_index_if_missing(cursor, 'results', 'idx_results_submitted', 'submitted_at')
+    # results filtered by exam, newest first; also serves the exam_id foreign key
+    _mysql_create_index_if_missing(cursor, 'results', 'idx_results_exam_submitted', 'exam_id, submitted_at')
+    # exam listing and keyset pages: exams newest first
+    _mysql_create_index_if_missing(cursor, 'exams', 'idx_exams_created', 'created_at')
+    # per-exam question counts and mark totals answered from the index alone
+    _mysql_create_index_if_missing(cursor, 'questions', 'idx_questions_exam_marks', 'exam_id, marks')
+
+
+def _mysql_005_results_submission_id(repo, cursor):
+    # idempotency key for write-behind submissions, so a replayed journal
+    # never inserts the same submission twice
+    cursor.execute("SHOW COLUMNS FROM results LIKE 'submission_id'")
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE results ADD COLUMN submission_id CHAR(32) NULL")
+    _mysql_create_index_if_missing(cursor, 'results', 'uq_results_submission', 'submission_id', unique=True)
+
+
+def _mysql_006_attempts(repo, cursor):
+    # one attempt per student and exam; answers are stored one compact row
+    # per answered question so autosave only touches what changed
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            exam_id INT NOT NULL,
+            status ENUM('in_progress', 'submitted') NOT NULL DEFAULT 'in_progress',
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            submitted_at TIMESTAMP NULL,
+            UNIQUE KEY uq_attempts_student_exam (student_id, exam_id),
+            FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attempt_answers (
+            attempt_id INT NOT NULL,
+            question_id INT NOT NULL,
+            answer ENUM('A', 'B', 'C', 'D') NOT NULL,
+            PRIMARY KEY (attempt_id, question_id),
+            FOREIGN KEY (attempt_id) REFERENCES attempts(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _mysql_007_question_pools(repo, cursor):
+    # topic/difficulty tags, per-exam paper blueprints, the seed and spec of
+    # each attempt's paper, and the precomputed pools papers are drawn from
+    for table, column, definition in (
+        ('questions', 'topic', "VARCHAR(100) NOT NULL DEFAULT ''"),
+        ('questions', 'difficulty', "VARCHAR(20) NOT NULL DEFAULT ''"),
+        ('exams', 'paper_blueprint', "TEXT NULL"),
+        ('attempts', 'paper_seed', "BIGINT NULL"),
+        ('attempts', 'paper_spec', "TEXT NULL"),
+    ):
+        cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS question_pools (
+            exam_id INT NOT NULL,
+            topic VARCHAR(100) NOT NULL,
+            difficulty VARCHAR(20) NOT NULL,
+            size INT NOT NULL,
+            PRIMARY KEY (exam_id, topic, difficulty),
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS question_pool_members (
+            exam_id INT NOT NULL,
+            topic VARCHAR(100) NOT NULL,
+            difficulty VARCHAR(20) NOT NULL,
+            position INT NOT NULL,
+            question_id INT NOT NULL,
+            PRIMARY KEY (exam_id, topic, difficulty, position),
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE,
+            FOREIGN KEY (question_id) REFERENCES questions(id) ON DELETE CASCADE
+        )
+    """)
+    repo._rebuild_pools(cursor)
+
+
+def _mysql_008_leaderboards(repo, cursor):
+    # each result's percentage in basis points, indexed for top-K reads, and
+    # the per-exam score distributions that answer rank and percentile
+    cursor.execute("SHOW COLUMNS FROM results LIKE 'score_bp'")
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE results ADD COLUMN score_bp INT NULL")
+    _mysql_create_index_if_missing(cursor, 'results', 'idx_results_exam_rank', 'exam_id, score_bp DESC, submitted_at')
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exam_score_counts (
+            exam_id INT NOT NULL,
+            score_bp INT NOT NULL,
+            submissions INT NOT NULL,
+            PRIMARY KEY (exam_id, score_bp),
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
+        )
+    """)
+    repo._rebuild_leaderboards(cursor)
+
+
+def _mysql_009_attempt_deadlines(repo, cursor):
+    # fixed when the exam is started; attempts already running get theirs
+    # from when they started
+    cursor.execute("SHOW COLUMNS FROM attempts LIKE 'deadline'")
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE attempts ADD COLUMN deadline TIMESTAMP NULL")
+    cursor.execute("""
+        UPDATE attempts a
+        JOIN exams e ON e.id = a.exam_id
+        SET a.deadline = a.started_at + INTERVAL e.duration_minutes MINUTE
+        WHERE a.status = 'in_progress' AND a.deadline IS NULL
+    """)
+
+
+def _mysql_010_attempt_responses(repo, cursor):
+    # one packed row per submitted attempt for item analysis
+    for column in ('paper_questions', 'responses'):
+        cursor.execute(f"SHOW COLUMNS FROM attempts LIKE '{column}'")
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE attempts ADD COLUMN {column} BLOB NULL")
+
+
+class MySQLRepository(Repository):
+    dialect = 'mysql'
+    insert_ignore = "INSERT IGNORE"
+    answer_upsert = """INSERT INTO attempt_answers (attempt_id, question_id, answer) VALUES (%s, %s, %s)
+                       ON DUPLICATE KEY UPDATE answer = VALUES(answer)"""
+    score_count_upsert = """INSERT INTO exam_score_counts (exam_id, score_bp, submissions) VALUES (%s, %s, %s)
+                            ON DUPLICATE KEY UPDATE submissions = submissions + VALUES(submissions)"""
+    score_bp_sql = "COALESCE(score * 10000 DIV NULLIF(total_marks, 0), 0)"
+    # Append new migrations to the end; never edit one that has shipped.
+    migrations = [
+        (1, 'initial schema', _mysql_001_initial_schema),
+        (2, 'add email/full_name to legacy users tables', _mysql_002_legacy_user_columns),
+        (3, 'default admin account', _mysql_003_default_admin),
+        (4, 'indexes for hot query paths', _mysql_004_hot_path_indexes),
+        (5, 'results.submission_id for idempotent write-behind', _mysql_005_results_submission_id),
+        (6, 'exam attempts and autosaved answers', _mysql_006_attempts),
+        (7, 'question pools and random paper blueprints', _mysql_007_question_pools),
+        (8, 'incrementally maintained exam leaderboards', _mysql_008_leaderboards),
+        (9, 'server-side attempt deadlines', _mysql_009_attempt_deadlines),
+        (10, 'packed per-question responses of submitted attempts', _mysql_010_attempt_responses),
+    ]
+
+    def __init__(self, connect, default_admin_password_hash, lock_timeout=60, connect_read=None):
+        super().__init__(connect, default_admin_password_hash, connect_read)
+        self._lock_timeout = lock_timeout
+
+    def _lock_schema(self, cursor):
+        # a named lock serialises concurrent migration runs across processes and hosts
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MYSQL_MIGRATION_LOCK_NAME, self._lock_timeout))
+        if scalar(cursor.fetchone()) != 1:
+            raise RuntimeError(f"timed out waiting for the schema migration lock ({MYSQL_MIGRATION_LOCK_NAME})")
+
+    def _migration_applied(self, conn):
+        # DDL commits implicitly in MySQL; commit the bookkeeping row too
+        conn.commit()
+
+    def _unlock_schema(self, conn, cursor, ok):
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MYSQL_MIGRATION_LOCK_NAME,))
+        cursor.fetchone()
+
+    def _prepare_stream(self, cursor):
+        # the server aborts a streamed result if the client stops reading
+        # for net_write_timeout seconds (default 60); writing a large export
+        # can pause that long between batches
+        cursor.execute("SET SESSION net_write_timeout = %s", (STREAM_NET_WRITE_TIMEOUT,))
+
+    def analyze(self, tables=('users', 'exams', 'questions', 'results')):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            for table in tables:
+                cursor.execute(f"ANALYZE TABLE {table}")
+                cursor.fetchall()
+            cursor.close()
+            conn.close()
+
+
+# --- SQLite --------------------------------------------------------------------
+
+def _sqlite_adapt_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _sqlite_convert_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+
+# Timestamps are stored as local 'YYYY-MM-DD HH:MM:SS' text, which sorts and
+# compares correctly, and come back as datetime objects like MySQL's.
+sqlite3.register_adapter(datetime, _sqlite_adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('TIMESTAMP', _sqlite_convert_timestamp)
+
+
+def connect_sqlite(path, busy_timeout=30, read_only=False):
+    """Open a SQLite connection in WAL mode with foreign keys enforced, or a
+    read-only one (e.g. to a replica copy of the file)."""
+    if read_only:
+        return sqlite3.connect(
+            Path(path).absolute().as_uri() + "?mode=ro", uri=True, timeout=busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+    conn = sqlite3.connect(
+        path, timeout=busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class SQLiteCursor:
+    """DB-API cursor adapter: %s placeholders and optional dict rows, so
+    repository SQL runs unchanged on sqlite3."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _sql(sql):
+        return sql.replace('%s', '?')
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(self._sql(sql), () if params is None else tuple(params))
+        return self
+
+    def executemany(self, sql, seq_params):
+        self._cursor.executemany(self._sql(sql), [tuple(p) for p in seq_params])
+        return self
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        return [self._row(row) for row in rows]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+def _sqlite_001_initial_schema(repo, cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            user_type TEXT NOT NULL CHECK (user_type IN ('admin', 'student')),
+            full_name VARCHAR(255),
+            email VARCHAR(255),
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exam_name VARCHAR(255) NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            total_marks INTEGER NOT NULL,
+            created_by INTEGER REFERENCES users(id),
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+            question_text TEXT NOT NULL,
+            option_a VARCHAR(255) NOT NULL,
+            option_b VARCHAR(255) NOT NULL,
+            option_c VARCHAR(255) NOT NULL,
+            option_d VARCHAR(255) NOT NULL,
+            correct_answer TEXT NOT NULL CHECK (correct_answer IN ('A', 'B', 'C', 'D')),
+            marks INTEGER DEFAULT 1
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL REFERENCES users(id),
+            exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+            score INTEGER NOT NULL,
+            total_marks INTEGER NOT NULL,
+            submitted_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            submission_id CHAR(32)
+        )
+    """)
+
+
+def _sqlite_002_default_admin(repo, cursor):
+    cursor.execute("""
+        INSERT OR IGNORE INTO users (username, password, user_type, full_name)
+        VALUES ('admin', %s, 'admin', 'Administrator')
+    """, (repo._admin_password_hash,))
+
+
+def _sqlite_003_hot_path_indexes(repo, cursor):
+    # same access paths as the MySQL index set; SQLite does not index
+    # foreign keys on its own, so the exam_id indexes double as FK indexes
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_results_student_exam ON results (student_id, exam_id)",
+        "CREATE INDEX IF NOT EXISTS idx_results_student_submitted ON results (student_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_results_submitted ON results (submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_results_exam_submitted ON results (exam_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_exams_created ON exams (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_questions_exam_marks ON questions (exam_id, marks)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_results_submission ON results (submission_id)",
+    ):
+        cursor.execute(statement)
+
+
+def _sqlite_004_attempts(repo, cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+            status TEXT NOT NULL DEFAULT 'in_progress' CHECK (status IN ('in_progress', 'submitted')),
+            started_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            submitted_at TIMESTAMP,
+            UNIQUE (student_id, exam_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attempts_exam ON attempts (exam_id)")
+    # clustered on the key, like the InnoDB table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attempt_answers (
+            attempt_id INTEGER NOT NULL REFERENCES attempts(id) ON DELETE CASCADE,
+            question_id INTEGER NOT NULL,
+            answer TEXT NOT NULL CHECK (answer IN ('A', 'B', 'C', 'D')),
+            PRIMARY KEY (attempt_id, question_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _sqlite_005_question_pools(repo, cursor):
+    for statement in (
+        "ALTER TABLE questions ADD COLUMN topic VARCHAR(100) NOT NULL DEFAULT ''",
+        "ALTER TABLE questions ADD COLUMN difficulty VARCHAR(20) NOT NULL DEFAULT ''",
+        "ALTER TABLE exams ADD COLUMN paper_blueprint TEXT",
+        "ALTER TABLE attempts ADD COLUMN paper_seed INTEGER",
+        "ALTER TABLE attempts ADD COLUMN paper_spec TEXT",
+    ):
+        cursor.execute(statement)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS question_pools (
+            exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+            topic VARCHAR(100) NOT NULL,
+            difficulty VARCHAR(20) NOT NULL,
+            size INTEGER NOT NULL,
+            PRIMARY KEY (exam_id, topic, difficulty)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS question_pool_members (
+            exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+            topic VARCHAR(100) NOT NULL,
+            difficulty VARCHAR(20) NOT NULL,
+            position INTEGER NOT NULL,
+            question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+            PRIMARY KEY (exam_id, topic, difficulty, position)
+        ) WITHOUT ROWID
+    """)
+    # SQLite does not index foreign keys on its own
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_pool_members_question ON question_pool_members (question_id)")
+    repo._rebuild_pools(cursor)
+
+
+def _sqlite_006_leaderboards(repo, cursor):
+    cursor.execute("ALTER TABLE results ADD COLUMN score_bp INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_exam_rank ON results (exam_id, score_bp DESC, submitted_at)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exam_score_counts (
+            exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+            score_bp INTEGER NOT NULL,
+            submissions INTEGER NOT NULL,
+            PRIMARY KEY (exam_id, score_bp)
+        ) WITHOUT ROWID
+    """)
+    repo._rebuild_leaderboards(cursor)
+
+
+def _sqlite_007_attempt_deadlines(repo, cursor):
+    cursor.execute("ALTER TABLE attempts ADD COLUMN deadline TIMESTAMP")
+    cursor.execute("""
+        UPDATE attempts
+        SET deadline = datetime(started_at, '+' || (
+            SELECT e.duration_minutes FROM exams e WHERE e.id = attempts.exam_id
+        ) || ' minutes')
+        WHERE status = 'in_progress' AND deadline IS NULL
+    """)
+
+
+def _sqlite_008_attempt_responses(repo, cursor):
+    cursor.execute("ALTER TABLE attempts ADD COLUMN paper_questions BLOB")
+    cursor.execute("ALTER TABLE attempts ADD COLUMN responses BLOB")
+
+
+class SQLiteRepository(Repository):
+    dialect = 'sqlite'
+    insert_ignore = "INSERT OR IGNORE"
+    answer_upsert = """INSERT INTO attempt_answers (attempt_id, question_id, answer) VALUES (%s, %s, %s)
+                       ON CONFLICT (attempt_id, question_id) DO UPDATE SET answer = excluded.answer"""
+    score_count_upsert = """INSERT INTO exam_score_counts (exam_id, score_bp, submissions) VALUES (%s, %s, %s)
+                            ON CONFLICT (exam_id, score_bp) DO UPDATE
+                            SET submissions = submissions + excluded.submissions"""
+    # integer operands, so / truncates like MySQL's DIV
+    score_bp_sql = "COALESCE(score * 10000 / NULLIF(total_marks, 0), 0)"
+    # Append new migrations to the end; never edit one that has shipped.
+    migrations = [
+        (1, 'initial schema', _sqlite_001_initial_schema),
+        (2, 'default admin account', _sqlite_002_default_admin),
+        (3, 'indexes for hot query paths', _sqlite_003_hot_path_indexes),
+        (4, 'exam attempts and autosaved answers', _sqlite_004_attempts),
+        (5, 'question pools and random paper blueprints', _sqlite_005_question_pools),
+        (6, 'incrementally maintained exam leaderboards', _sqlite_006_leaderboards),
+        (7, 'server-side attempt deadlines', _sqlite_007_attempt_deadlines),
+        (8, 'packed per-question responses of submitted attempts', _sqlite_008_attempt_responses),
+    ]
+
+    def _lock_schema(self, cursor):
+        # the database write lock serialises migration runs across processes;
+        # DDL is transactional in SQLite, so the whole run commits atomically
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def _migration_applied(self, conn):
+        pass
+
+    def _unlock_schema(self, conn, cursor, ok):
+        if ok:
+            conn.commit()
+        else:
+            conn.rollback()
+
+    def _begin(self, cursor):
+        cursor.execute("BEGIN")
+
+    def analyze(self, tables=('users', 'exams', 'questions', 'results')):
+        conn = self._connect()
+        if conn:
+            cursor = conn.cursor()
+            for table in tables:
+                cursor.execute(f"ANALYZE {table}")
+            conn.commit()
+            cursor.close()
+            conn.close()
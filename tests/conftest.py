@@ -0,0 +1,49 @@
+import pytest
+
+import storage
+
+
+class _Conn:
+    # the connection wrapper Repository expects (see online._ConnWrapper)
+    def __init__(self, path):
+        self._conn = storage.connect_sqlite(path)
+
+    def cursor(self, dictionary=False, stream=False):
+        return storage.SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+@pytest.fixture
+def connect(tmp_path):
+    """A `connect` callable for a fresh SQLite database file."""
+    path = str(tmp_path / 'exam.db')
+    return lambda: _Conn(path)
+
+
+@pytest.fixture
+def repo(connect):
+    """A migrated SQLiteRepository on a fresh database file."""
+    repository = storage.SQLiteRepository(connect, 'admin-hash')
+    repository.run_migrations()
+    return repository
+
+
+@pytest.fixture
+def exam(repo):
+    """(student_id, exam_id) of a student and a two-question exam."""
+    repo.register_student('alice', 'pw', 'Alice', 'alice@example.com')
+    student_id = repo.find_student_id('alice')
+    admin = repo.authenticate('admin', 'admin-hash', 'admin')
+    exam_id = repo.create_exam('Algebra', 30, 2, admin['id'], [
+        ('1 + 1?', '1', '2', '3', '4', 'B', 1, 'sums', 'easy'),
+        ('2 * 3?', '5', '6', '7', '8', 'B', 1, 'products', 'easy'),
+    ])
+    return student_id, exam_id
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from admission import AdmissionController, VerifiedLogins
+
+
+def test_admits_up_to_the_limit_then_queues_in_order():
+    controller = AdmissionController(2)
+    assert controller.acquire('a', 0)
+    assert controller.acquire('b', 0)
+    assert not controller.acquire('c', 0)
+    assert not controller.acquire('d', 0)
+    assert controller.waiting('c').position == 1
+    assert controller.waiting('d').position == 2
+    assert controller.waiting('d').queued == 2
+
+    controller.release('a')
+    # the freed slot belongs to the head of the line
+    assert not controller.acquire('d', 0)
+    assert controller.acquire('c', 0)
+    assert controller.waiting('d').position == 1
+
+
+def test_release_wakes_the_waiting_head():
+    controller = AdmissionController(1)
+    assert controller.acquire('a', 0)
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(controller.acquire('b', 5)))
+    waiter.start()
+    while controller.waiting('b') is None:
+        time.sleep(0.001)
+    started = time.monotonic()
+    controller.release('a')
+    waiter.join(5)
+    assert admitted == [True]
+    assert time.monotonic() - started < 1
+    assert controller.stats()['waited'] == 1
+
+
+def test_cancelled_and_abandoned_tickets_lose_their_place():
+    controller = AdmissionController(1, abandon_after=0.05)
+    assert controller.acquire('a', 0)
+    assert not controller.acquire('b', 0)
+    assert not controller.acquire('c', 0)
+    assert not controller.acquire('d', 0)
+    controller.cancel('b')
+    assert controller.waiting('b') is None
+    assert controller.waiting('c').position == 1
+
+    time.sleep(0.1)
+    # d keeps asking, c went away
+    assert not controller.acquire('d', 0)
+    assert controller.waiting('c') is None
+    assert controller.waiting('d').position == 1
+    assert controller.stats()['abandoned'] == 1
+    controller.release('a')
+    assert controller.acquire('d', 0)
+
+
+def test_verified_logins_are_scoped_to_the_session():
+    logins = VerifiedLogins(ttl=60)
+    logins.put('s1', 'student', 'alice', 'hash', {'id': 1})
+    assert logins.get('s1', 'student', 'alice', 'hash') == {'id': 1}
+    assert logins.get('s2', 'student', 'alice', 'hash') is None
+    assert logins.get('s1', 'student', 'alice', 'other-hash') is None
+
+
+def test_verified_logins_expire_and_stay_bounded():
+    logins = VerifiedLogins(ttl=0.05, max_entries=2)
+    for n in range(3):
+        logins.put(f's{n}', 'student', 'alice', 'hash', {'id': 1})
+    assert logins.stats()['entries'] == 2
+    assert logins.get('s0', 'student', 'alice', 'hash') is None
+    time.sleep(0.1)
+    assert logins.get('s2', 'student', 'alice', 'hash') is None
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from autosave import AnswerSaver
+
+
+class _Recorder:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.written = threading.Event()
+
+    def __call__(self, changes):
+        if self.fail:
+            raise RuntimeError('database down')
+        self.batches.append(sorted(changes, key=lambda c: (c[0], c[1])))
+        self.written.set()
+
+
+def test_changes_are_debounced_and_coalesced():
+    flush = _Recorder()
+    saver = AnswerSaver(flush, delay=0.1, max_delay=5).start()
+    try:
+        for answer in 'ABCD':
+            saver.record(1, 10, answer)
+        saver.record(1, 11, 'A')
+        saver.record(1, 11, None)
+        assert flush.written.wait(2)
+        # one batch holding only the latest change of each question
+        assert flush.batches == [[(1, 10, 'D'), (1, 11, None)]]
+        assert saver.stats()['recorded'] == 6
+        assert saver.stats()['written'] == 2
+    finally:
+        saver.stop()
+
+
+def test_max_delay_bounds_a_steady_stream_of_changes():
+    flush = _Recorder()
+    saver = AnswerSaver(flush, delay=0.2, max_delay=0.3).start()
+    try:
+        started = time.monotonic()
+        # never quiet for `delay`, so only max_delay can trigger the write
+        while not flush.written.is_set() and time.monotonic() - started < 2:
+            saver.record(1, 10, 'A')
+            time.sleep(0.02)
+        assert flush.written.is_set()
+        assert time.monotonic() - started < 1
+    finally:
+        saver.stop()
+
+
+def test_flush_attempt_writes_only_that_attempt():
+    flush = _Recorder()
+    saver = AnswerSaver(flush)
+    saver.record(1, 10, 'A')
+    saver.record(2, 20, 'B')
+    assert saver.flush_attempt(1)
+    assert flush.batches == [[(1, 10, 'A')]]
+    assert saver.pending(1) == {}
+    assert saver.pending(2) == {20: 'B'}
+
+
+def test_failed_flush_attempt_keeps_changes_queued():
+    saver = AnswerSaver(_Recorder(fail=True))
+    saver.record(1, 10, 'A')
+    assert not saver.flush_attempt(1)
+    assert saver.pending(1) == {10: 'A'}
+    assert saver.stats()['flush_failures'] == 1
+
+
+def test_discard_drops_one_attempts_changes():
+    flush = _Recorder()
+    saver = AnswerSaver(flush)
+    saver.record(1, 10, 'A')
+    saver.record(2, 20, 'B')
+    saver.discard(1)
+    assert saver.pending(1) == {}
+    assert saver.flush_attempt(1)
+    assert flush.batches == []
+    assert saver.pending(2) == {20: 'B'}
+
+
+def test_saved_answers_are_replaced_by_the_submitted_attempt(repo, exam):
+    student_id, exam_id = exam
+    attempt = repo.open_attempt(student_id, exam_id, 30)
+    questions = [q['id'] for q in repo.exam_questions(exam_id)]
+    repo.save_answers([(attempt['id'], questions[0], 'A'), (attempt['id'], questions[1], 'C')])
+    repo.save_answers([(attempt['id'], questions[0], 'B'), (attempt['id'], questions[1], None)])
+    assert repo.attempt_answers(attempt['id']) == {questions[0]: 'B'}
+
+    assert repo.finish_attempt(attempt['id'], b'packed-questions', b'packed-responses')
+    assert repo.attempt_answers(attempt['id']) == {}
+    assert repo.open_attempt(student_id, exam_id, 30)['status'] == 'submitted'
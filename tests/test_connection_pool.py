@@ -0,0 +1,96 @@
+import logging
+import sqlite3
+import threading
+
+import pytest
+
+from online import PoolTimeout, _ConnectionPool, _worker_connector
+
+
+class _Opener:
+    def __init__(self, path):
+        self.path = path
+        self.opened = []
+
+    def __call__(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.opened.append(conn)
+        return conn, 'sqlite'
+
+
+@pytest.fixture
+def opener(tmp_path):
+    return _Opener(str(tmp_path / 'pool.db'))
+
+
+def test_released_connections_are_reused(opener):
+    pool = _ConnectionPool(opener, size=2, max_overflow=0, timeout=1)
+    entry = pool.acquire()
+    pool.release(entry)
+    assert pool.acquire() is entry
+    assert len(opener.opened) == 1
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['open'], stats['in_use'], stats['idle']) == (2, 1, 1, 0)
+
+
+def test_overflow_connections_are_closed_on_release(opener):
+    pool = _ConnectionPool(opener, size=1, max_overflow=2, timeout=0.05)
+    entries = [pool.acquire() for _ in range(3)]
+    assert pool.stats()['open'] == 3
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    for entry in entries:
+        pool.release(entry)
+    # only `size` connections are kept idle
+    stats = pool.stats()
+    assert (stats['open'], stats['idle'], stats['timeouts']) == (1, 1, 1)
+
+
+def test_exhausted_pool_waits_for_a_release(opener):
+    pool = _ConnectionPool(opener, size=1, max_overflow=0, timeout=5)
+    entry = pool.acquire()
+    timer = threading.Timer(0.05, pool.release, (entry,))
+    timer.start()
+    assert pool.acquire() is entry
+    timer.join()
+    assert pool.stats()['waits'] == 1
+
+
+def test_dead_idle_connection_is_replaced(opener):
+    pool = _ConnectionPool(opener, size=1, max_overflow=0, timeout=1)
+    entry = pool.acquire()
+    pool.release(entry)
+    entry[0].close()
+    replacement = pool.acquire()
+    assert replacement is not entry
+    assert replacement[0].execute("SELECT 1").fetchone() == (1,)
+    stats = pool.stats()
+    # the dead connection's slot went to its replacement
+    assert (stats['failed_health_checks'], stats['open']) == (1, 1)
+
+
+def test_failed_connect_frees_its_slot(opener):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('unable to open database file')
+        return opener()
+
+    pool = _ConnectionPool(flaky, size=1, max_overflow=0, timeout=0.05)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+    assert pool.stats()['open'] == 0
+    assert pool.acquire()[1] == 'sqlite'
+
+
+def test_worker_connector_logs_when_the_pool_is_exhausted(opener, caplog):
+    pool = _ConnectionPool(opener, size=1, max_overflow=0, timeout=0.05)
+    connect = _worker_connector(pool, None)
+    held = connect()
+    with caplog.at_level(logging.WARNING, logger='online_exam'):
+        assert connect() is None
+    assert 'could not get a connection' in caplog.text
+    held.close()
+    assert connect() is not None
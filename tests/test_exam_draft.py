@@ -0,0 +1,101 @@
+import pytest
+
+import online
+from exam_draft import ExamDraft, stage_question
+
+
+def _fields(text, correct='a', marks='1', **extra):
+    return dict(question_text=text, option_a='w', option_b='x', option_c='y', option_d='z',
+                correct_answer=correct, marks=marks, **extra)
+
+
+@pytest.fixture
+def draft():
+    draft, error = ExamDraft.start('  Algebra ', 30, 5)
+    assert error is None
+    for text in ('one', 'two', 'three'):
+        assert draft.add(_fields(text)) is None
+    return draft
+
+
+def _texts(draft):
+    return [q['question_text'] for q in draft.questions]
+
+
+def test_start_needs_an_exam_name():
+    assert ExamDraft.start('   ', 30, 5) == (None, "Please enter exam name!")
+    draft, _ = ExamDraft.start('  Algebra ', '30', 5)
+    assert (draft.exam_name, draft.duration, draft.total_marks, draft.questions) == ('Algebra', 30, 5, [])
+
+
+def test_questions_are_validated_like_imported_rows():
+    question, error = stage_question(_fields(' Q? ', correct='c', marks='3', topic=' sums ', difficulty='Easy'))
+    assert error is None
+    assert question == {
+        'question_text': 'Q?', 'option_a': 'w', 'option_b': 'x', 'option_c': 'y', 'option_d': 'z',
+        'correct_answer': 'C', 'marks': 3, 'topic': 'sums', 'difficulty': 'easy',
+    }
+    assert stage_question(_fields('Q?', correct='E'))[0] is None
+
+
+def test_add_rejects_invalid_questions(draft):
+    assert draft.add(_fields('', marks='1')) == "question_text is empty"
+    assert draft.add(_fields('four', marks='0')) == "marks must be at least 1"
+    assert _texts(draft) == ['one', 'two', 'three']
+    assert draft.staged_marks == 3
+
+
+def test_edit_replaces_a_question_in_place(draft):
+    assert draft.replace(1, _fields('TWO', marks='4')) is None
+    assert _texts(draft) == ['one', 'TWO', 'three']
+    assert draft.staged_marks == 6
+    assert draft.replace(1, _fields('bad', correct='Z')).startswith("correct_answer must be")
+    assert _texts(draft) == ['one', 'TWO', 'three']
+
+
+def test_reorder_and_remove(draft):
+    draft.move(0, 1)
+    assert _texts(draft) == ['two', 'one', 'three']
+    draft.move(2, -1)
+    assert _texts(draft) == ['two', 'three', 'one']
+    # past either end: ignored
+    draft.move(0, -1)
+    draft.move(2, 1)
+    assert _texts(draft) == ['two', 'three', 'one']
+    draft.remove(1)
+    assert _texts(draft) == ['two', 'one']
+
+
+def test_finish_needs_a_question():
+    draft, _ = ExamDraft.start('Empty', 10, 1)
+    saved = []
+    assert draft.finish(lambda *args: saved.append(args)) == (
+        None, "Please add at least one question before finishing!"
+    )
+    assert saved == []
+
+
+class _NoCache:
+    def invalidate(self, scope):
+        pass
+
+
+def test_finish_writes_the_exam_and_its_questions_in_one_go(repo, draft, monkeypatch):
+    monkeypatch.setattr(online, 'get_repository', lambda: repo)
+    monkeypatch.setattr(online, 'get_read_cache', lambda: _NoCache())
+    admin = repo.authenticate('admin', 'admin-hash', 'admin')
+    draft.move(2, -1)
+
+    exam_id, error = draft.finish(
+        lambda name, duration, total_marks, questions: online.create_exam(name, duration, total_marks,
+                                                                          admin['id'], questions)
+    )
+    assert error is None
+    (exam,) = [e for e in repo.all_exams() if e['id'] == exam_id]
+    assert (exam['exam_name'], exam['duration_minutes'], exam['total_marks']) == ('Algebra', 30, 5)
+    assert [q['question_text'] for q in repo.exam_questions(exam_id)] == ['one', 'three', 'two']
+
+
+def test_failed_save_keeps_the_draft(draft):
+    assert draft.finish(lambda *args: None) == (None, None)
+    assert _texts(draft) == ['one', 'two', 'three']
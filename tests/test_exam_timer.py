@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import exam_timer
+import online
+
+START = datetime(2026, 3, 1, 9, 0, 0)
+
+
+def test_deadline_is_start_plus_duration():
+    assert exam_timer.deadline_for(START, 45) == datetime(2026, 3, 1, 9, 45)
+    assert exam_timer.deadline_for(START, '90') == datetime(2026, 3, 1, 10, 30)
+
+
+def test_seconds_left():
+    deadline = exam_timer.deadline_for(START, 30)
+    assert exam_timer.seconds_left(deadline, now=START) == 1800
+    assert exam_timer.seconds_left(deadline, now=deadline + timedelta(seconds=5)) == -5
+    assert exam_timer.seconds_left(None, now=START) is None
+
+
+@pytest.mark.parametrize('late_by, grace, expired', [
+    (-60, 0, False),
+    (0, 0, False),
+    (1, 0, True),
+    (1, 30, False),
+    (30, 30, False),
+    (31, 30, True),
+])
+def test_is_expired_honours_the_grace_period(late_by, grace, expired):
+    deadline = exam_timer.deadline_for(START, 30)
+    now = deadline + timedelta(seconds=late_by)
+    assert exam_timer.is_expired(deadline, grace, now=now) is expired
+
+
+def test_attempt_without_deadline_never_expires():
+    assert exam_timer.is_expired(None, 0) is False
+
+
+@pytest.fixture
+def submit(repo, monkeypatch):
+    # online.submit_exam straight to the test repository, without write-behind
+    monkeypatch.setattr(online, 'get_repository', lambda: repo)
+    monkeypatch.setattr(online, 'get_submission_queue', lambda: None)
+    monkeypatch.setattr(online, 'DEADLINE_GRACE', 30)
+
+    def submit_exam(mode, student_id, exam_id, deadline):
+        monkeypatch.setattr(online, 'LATE_SUBMISSIONS', mode)
+        return online.submit_exam(student_id, exam_id, 1, 2, deadline=deadline)
+    return submit_exam
+
+
+def test_late_submission_is_rejected_in_reject_mode(repo, exam, submit):
+    student_id, exam_id = exam
+    late = datetime.now() - timedelta(seconds=31)
+    assert submit('reject', student_id, exam_id, late) is False
+    assert not repo.exam_taken(student_id, exam_id)
+
+
+def test_submission_within_grace_is_accepted_in_reject_mode(repo, exam, submit):
+    student_id, exam_id = exam
+    within_grace = datetime.now() - timedelta(seconds=10)
+    assert submit('reject', student_id, exam_id, within_grace) is True
+    assert repo.exam_taken(student_id, exam_id)
+
+
+def test_late_submission_is_recorded_in_cap_mode(repo, exam, submit):
+    student_id, exam_id = exam
+    late = datetime.now() - timedelta(minutes=5)
+    assert submit('cap', student_id, exam_id, late) is True
+    assert repo.exam_taken(student_id, exam_id)
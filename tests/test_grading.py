@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import grading
+from grading import GradingRules, compile_answer_key, encode_answers, grade, grade_batch
+
+QUESTIONS = [
+    {'id': 10, 'correct_answer': 'A', 'marks': 2},
+    {'id': 11, 'correct_answer': 'C', 'marks': 1},
+    {'id': 12, 'correct_answer': 'D', 'marks': None},
+    {'id': 13, 'correct_answer': 'B', 'marks': 4},
+]
+
+
+@pytest.fixture
+def key():
+    return compile_answer_key(QUESTIONS)
+
+
+def test_compiled_key_is_read_only_and_defaults_marks(key):
+    assert key.total_marks == 8
+    assert list(key.correct) == [0, 2, 3, 1]
+    with pytest.raises(ValueError):
+        key.marks[0] = 5
+
+
+def test_grade_counts_correct_wrong_and_unanswered(key):
+    result = grade(key, {10: 'A', 11: 'B', 13: 'B', 99: 'A', 12: 'Z'})
+    assert (result.score, result.max_score) == (6, 8)
+    assert (result.correct, result.wrong, result.unanswered) == (2, 1, 1)
+
+
+def test_negative_marking_deducts_for_wrong_answers_only(key):
+    rules = GradingRules(negative_marking=0.25, floor_at_zero=False)
+    # 2 for q10, minus a quarter of q11's 1 and q13's 4; q12 unanswered
+    assert grade(key, {10: 'A', 11: 'B', 13: 'C'}, rules).score == pytest.approx(2 - 0.25 - 1)
+    assert grade(key, {11: 'A', 13: 'A'}, rules).score == pytest.approx(-1.25)
+    assert grade(key, {11: 'A', 13: 'A'}, GradingRules(negative_marking=0.25)).score == 0
+
+
+def test_partial_credit_counts_as_neither_correct_nor_wrong(key):
+    rules = GradingRules(negative_marking=0.5, partial_credit={13: {'C': 0.5, 'B': 0.1}})
+    result = grade(key, {13: 'C'}, rules)
+    assert result.score == 2
+    assert (result.correct, result.wrong) == (0, 0)
+    # the correct option keeps full marks
+    assert grade(key, {13: 'B'}, rules).score == 4
+
+
+def test_batch_matches_one_by_one(key):
+    rng = np.random.default_rng(0)
+    responses = rng.integers(grading.UNANSWERED, 4, size=(50, len(key)), dtype=np.int8)
+    rules = GradingRules(negative_marking=0.25, partial_credit={11: {'A': 0.5}})
+    batch = grade_batch(key, responses, rules)
+    for row, score in zip(responses, batch['score']):
+        answers = {int(q): grading.OPTIONS[c] for q, c in zip(key.question_ids, row) if c >= 0}
+        assert grade(key, answers, rules).score == pytest.approx(score)
+
+
+def test_batch_rejects_misaligned_responses(key):
+    with pytest.raises(ValueError):
+        grade_batch(key, np.zeros((2, 3), dtype=np.int8))
+
+
+def test_encode_answers_aligns_with_the_key(key):
+    assert list(encode_answers(key, {13: 'B', 10: 'D'})) == [3, -1, -1, 1]
@@ -0,0 +1,88 @@
+import math
+
+import numpy as np
+import pytest
+
+import item_analysis
+from grading import compile_answer_key
+from item_analysis import NOT_PRESENTED, analyse, flags, pack_responses, response_matrix, unpack_responses
+
+
+def _key(n, correct='A'):
+    return compile_answer_key([{'id': 100 + i, 'correct_answer': correct, 'marks': 1} for i in range(n)])
+
+
+def test_pack_round_trip():
+    ids, codes = pack_responses([101, 100, 102], {100: 'B', 102: 'D', 999: 'A'})
+    got_ids, got_codes = unpack_responses(ids, codes)
+    assert list(got_ids) == [101, 100, 102]
+    assert list(got_codes) == [-1, 1, 3]
+
+
+def test_response_matrix_aligns_papers_with_the_key():
+    key = _key(3)
+    packed = [
+        pack_responses([102, 100], {100: 'A', 102: 'C'}),
+        # 555 is no longer in the key and is dropped
+        pack_responses([101, 555], {101: 'B', 555: 'A'}),
+    ]
+    matrix = response_matrix(key, packed)
+    assert matrix.tolist() == [[0, NOT_PRESENTED, 2], [NOT_PRESENTED, 1, NOT_PRESENTED]]
+
+
+def test_point_biserial_against_a_hand_computed_value():
+    key = _key(3)
+    matrix = np.array([
+        [0, 0, 0],   # q0 right, rest score 2
+        [0, 0, 1],   # right, 1
+        [1, 0, 1],   # wrong, 1
+        [1, 1, 1],   # wrong, 0
+        [0, 1, 0],   # right, 1
+    ], dtype=np.int8)
+    stats = analyse(key, matrix)
+    # x = 1 1 0 0 1, rest = 2 1 1 0 1: Sxy = 1.0, Sxx = 1.2, Syy = 2
+    assert stats.discrimination[0] == pytest.approx(1 / math.sqrt(1.2 * 2))
+    assert stats.difficulty[0] == pytest.approx(0.6)
+    assert stats.option_shares[1].tolist() == pytest.approx([0.6, 0.4, 0, 0])
+    assert stats.attempts == 5
+
+
+def test_questions_not_presented_are_left_out():
+    key = _key(2)
+    matrix = np.array([[0, NOT_PRESENTED], [1, NOT_PRESENTED], [-1, 0]], dtype=np.int8)
+    stats = analyse(key, matrix)
+    assert stats.presented.tolist() == [3, 1]
+    assert stats.omitted[0] == pytest.approx(1 / 3)
+    # one attempt shown q1: no variance, no correlation
+    assert math.isnan(stats.discrimination[1])
+
+
+def test_blocks_give_the_same_statistics():
+    rng = np.random.default_rng(1)
+    key = _key(8)
+    matrix = rng.integers(NOT_PRESENTED, 4, size=(101, 8), dtype=np.int8)
+    whole = analyse(key, matrix)
+    blocked = analyse(key, matrix, block_rows=7)
+    np.testing.assert_allclose(blocked.discrimination, whole.discrimination)
+    np.testing.assert_allclose(blocked.option_shares, whole.option_shares)
+
+
+def test_matches_numpy_correlation_on_full_papers():
+    rng = np.random.default_rng(2)
+    key = _key(6)
+    matrix = rng.integers(-1, 4, size=(500, 6), dtype=np.int8)
+    stats = analyse(key, matrix)
+    correct = (matrix == key.correct).astype(float)
+    for j in range(6):
+        rest = correct.sum(axis=1) - correct[:, j]
+        assert stats.discrimination[j] == pytest.approx(np.corrcoef(correct[:, j], rest)[0, 1])
+
+
+def test_flags_an_easy_question_with_unused_distractors():
+    key = _key(2)
+    matrix = np.array([[0, 0]] * 19 + [[0, 1]], dtype=np.int8)
+    stats = analyse(key, matrix)
+    notes = flags(stats, key, 0)
+    assert "too easy" in notes
+    assert any(note.startswith("unused distractor(s) B, C, D") for note in notes)
+    assert item_analysis.flags(stats, key, 1)[0] == "too easy"
@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+import storage
+from leaderboards import Standing, competition_ranks, score_bp, standing
+
+
+@pytest.mark.parametrize('score, total', [
+    (0, 30), (1, 3), (2, 3), (29, 30), (30, 30), (7, 9), (1, 7), (-1, 3), (-2, 7), (5, 0), (0, 0), (45, 40),
+])
+def test_score_bp_truncates_like_sql_integer_division(score, total):
+    # the SQL that backfills results.score_bp (MySQL DIV / SQLite integer /)
+    conn = sqlite3.connect(':memory:')
+    sql = storage.SQLiteRepository.score_bp_sql
+    (expected,) = conn.execute(f"SELECT {sql} FROM (SELECT ? AS score, ? AS total_marks)", (score, total)).fetchone()
+    assert score_bp(score, total) == expected
+
+
+def test_score_bp_matches_the_backfill_for_every_score():
+    conn = sqlite3.connect(':memory:')
+    sql = storage.SQLiteRepository.score_bp_sql
+    rows = [(s, t) for t in range(1, 31) for s in range(-t, t + 1)]
+    got = conn.execute(
+        f"SELECT {sql} FROM (SELECT column1 AS score, column2 AS total_marks FROM (VALUES "
+        + ", ".join(f"({s}, {t})" for s, t in rows) + "))"
+    ).fetchall()
+    assert [score_bp(s, t) for s, t in rows] == [bp for (bp,) in got]
+
+
+def test_standing_counts_ties_as_half():
+    # 10 submissions: 3 above, 2 equal, 5 below
+    assert standing(3, 2, 10) == Standing(rank=4, submissions=10, percentile=60.0)
+    assert standing(0, 1, 1) == Standing(rank=1, submissions=1, percentile=50.0)
+    assert standing(0, 0, 0) is None
+
+
+def test_competition_ranks_share_ties():
+    rows = [{'score_bp': bp} for bp in (9000, 8000, 8000, 7000, 7000, 7000, 10)]
+    assert [r['rank'] for r in competition_ranks(rows)] == [1, 2, 2, 4, 4, 4, 7]
@@ -0,0 +1,104 @@
+import re
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry, fingerprint
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT * FROM users WHERE username = 'alice' AND id = 42",
+     "SELECT * FROM users WHERE username = ? AND id = ?"),
+    ("SELECT * FROM users WHERE username = 'o''brien'", "SELECT * FROM users WHERE username = ?"),
+    ("SELECT * FROM results WHERE score > -1.5 AND exam_id = %s", "SELECT * FROM results WHERE score > ? AND exam_id = ?"),
+    ("SELECT * FROM t WHERE a = %(a)s OR b = ?", "SELECT * FROM t WHERE a = ? OR b = ?"),
+    # identifiers that contain digits are kept
+    ("SELECT t2.col1 FROM t2", "SELECT t2.col1 FROM t2"),
+    ("SELECT  *\n  FROM exams\n\tWHERE id=%s ", "SELECT * FROM exams WHERE id=?"),
+])
+def test_fingerprint_replaces_literals_and_placeholders(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+def test_fingerprint_collapses_in_lists_of_any_length():
+    fps = {fingerprint(f"SELECT * FROM questions WHERE id IN ({', '.join(['%s'] * n)})") for n in (2, 3, 50)}
+    assert fps == {"SELECT * FROM questions WHERE id IN (?+)"}
+    assert fingerprint("SELECT * FROM questions WHERE id IN (1, 2,3)") == "SELECT * FROM questions WHERE id IN (?+)"
+
+
+def test_fingerprint_collapses_multi_row_values():
+    two = fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)")
+    many = fingerprint("INSERT INTO t (a, b) VALUES " + ", ".join(["(%s, %s)"] * 20))
+    assert two == many == "INSERT INTO t (a, b) VALUES (?+)"
+
+
+def _samples(text):
+    # {metric line without value: value} for every sample in the exposition
+    out = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            out[name] = value
+    return out
+
+
+def test_prometheus_text_output():
+    registry = MetricsRegistry(slow_query_seconds=0.5)
+    fp = fingerprint("SELECT * FROM exams WHERE id = %s")
+    registry.record_query(fp, 0.002)
+    registry.record_query(fp, 0.03, error=True)
+    registry.record_fetch(fp, 0.001, 3)
+    registry.record_slow(fp, 0.6, "SELECT * FROM exams WHERE id = %s")
+    with registry.rerun('student'):
+        with registry.section('dashboard'):
+            registry.record_query(fp, 0.001)
+    registry.add_collector(lambda: [('exam_pool_in_use', 'gauge', 'Connections checked out.', 2)])
+    registry.add_collector(lambda: 1 / 0)  # a broken collector is skipped
+
+    text = registry.render_prometheus()
+    assert text.endswith("\n")
+    assert "# TYPE exam_db_query_duration_seconds histogram" in text
+    assert "# HELP exam_pool_in_use Connections checked out." in text
+    samples = _samples(text)
+    label = 'fingerprint="SELECT * FROM exams WHERE id = ?"'
+    assert samples[f'exam_db_query_duration_seconds_bucket{{{label},le="0.001"}}'] == '1'
+    assert samples[f'exam_db_query_duration_seconds_bucket{{{label},le="0.0025"}}'] == '2'
+    assert samples[f'exam_db_query_duration_seconds_bucket{{{label},le="+Inf"}}'] == '3'
+    assert samples[f'exam_db_query_duration_seconds_count{{{label}}}'] == '3'
+    assert samples[f'exam_db_query_rows_total{{{label}}}'] == '3'
+    assert samples[f'exam_db_query_errors_total{{{label}}}'] == '1'
+    assert samples[f'exam_db_slow_queries_total{{{label}}}'] == '1'
+    assert samples['exam_rerun_queries_count'] == '1'
+    assert samples['exam_rerun_section_duration_seconds_count{section="dashboard"}'] == '1'
+    assert samples['exam_pool_in_use'] == '2'
+    # bucket counts are cumulative
+    buckets = [int(v) for k, v in samples.items() if k.startswith('exam_rerun_queries_bucket')]
+    assert buckets == sorted(buckets)
+
+
+def test_prometheus_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.record_query('SELECT "a"\\b\nFROM t', 0.001)
+    text = registry.render_prometheus()
+    assert 'fingerprint="SELECT \\"a\\"\\\\b\\nFROM t"' in text
+    # every sample stays on one line: name{labels} value
+    for line in text.splitlines():
+        assert line.startswith('#') or re.fullmatch(r'\w+(\{.*\})? \S+', line)
+
+
+def test_textfile_is_written_atomically_and_throttled(tmp_path):
+    registry = MetricsRegistry()
+    path = registry.write_textfile(str(tmp_path / 'exam-{pid}.prom'), min_interval=60)
+    assert path is not None and open(path).read() == registry.render_prometheus()
+    assert registry.write_textfile(str(tmp_path / 'exam-{pid}.prom'), min_interval=60) is None
+    assert [p.name for p in tmp_path.iterdir()] == [path.rsplit('/', 1)[1]]
+
+
+def test_fingerprints_beyond_the_limit_share_one_bucket(monkeypatch):
+    monkeypatch.setattr(metrics, 'MAX_FINGERPRINTS', 2)
+    registry = MetricsRegistry()
+    for fp in ('a', 'b', 'c', 'd'):
+        registry.record_query(fp, 0.001)
+    assert sorted((r['fingerprint'], r['calls']) for r in registry.query_table()) == [
+        ('a', 1), ('b', 1), (metrics.OTHER_FINGERPRINT, 2),
+    ]
@@ -0,0 +1,94 @@
+import pytest
+
+import storage
+
+LATEST = max(version for version, _, _ in storage.SQLiteRepository.migrations)
+
+
+def _versions(connect):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    versions = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return versions
+
+
+def _run_sql(connect, *statements):
+    conn = connect()
+    cursor = conn.cursor()
+    for sql, params in statements:
+        cursor.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def test_fresh_database_applies_every_migration_once(connect):
+    repo = storage.SQLiteRepository(connect, 'admin-hash')
+    assert repo.run_migrations() == list(range(1, LATEST + 1))
+    assert _versions(connect) == list(range(1, LATEST + 1))
+    assert repo.authenticate('admin', 'admin-hash', 'admin')['username'] == 'admin'
+
+
+def test_second_run_is_a_no_op(connect):
+    repo = storage.SQLiteRepository(connect, 'admin-hash')
+    repo.run_migrations()
+    # another worker starting later
+    assert storage.SQLiteRepository(connect, 'other-hash').run_migrations() == []
+    assert _versions(connect) == list(range(1, LATEST + 1))
+    assert repo.authenticate('admin', 'admin-hash', 'admin') is not None
+
+
+class _BaselineRepository(storage.SQLiteRepository):
+    # a database deployed before any later migration existed
+    migrations = storage.SQLiteRepository.migrations[:2]
+
+
+def test_baseline_database_is_upgraded_with_its_data(connect):
+    assert _BaselineRepository(connect, 'admin-hash').run_migrations() == [1, 2]
+    _run_sql(
+        connect,
+        ("INSERT INTO users (username, password, user_type, full_name) VALUES ('bob', 'pw', 'student', 'Bob')", ()),
+        ("INSERT INTO exams (exam_name, duration_minutes, total_marks, created_by) VALUES ('Old', 30, 4, 1)", ()),
+        ("""INSERT INTO questions (exam_id, question_text, option_a, option_b, option_c, option_d, correct_answer, marks)
+            VALUES (1, 'Q?', 'a', 'b', 'c', 'd', 'A', 4)""", ()),
+        ("INSERT INTO results (student_id, exam_id, score, total_marks) VALUES (2, 1, 3, 4)", ()),
+    )
+
+    repo = storage.SQLiteRepository(connect, 'admin-hash')
+    assert repo.run_migrations() == list(range(3, LATEST + 1))
+    # old rows are backfilled into the structures later migrations added
+    assert [row['score_bp'] for row in repo.exam_leaderboard(1)] == [7500]
+    assert repo.pool_sizes(1) == {('', ''): 1}
+    assert repo.student_results(2)[0]['standing'].rank == 1
+
+
+def test_failed_migration_leaves_nothing_applied(connect):
+    def broken(repo, cursor):
+        cursor.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("migration failed")
+
+    class BrokenRepository(storage.SQLiteRepository):
+        migrations = storage.SQLiteRepository.migrations + [(LATEST + 1, 'broken', broken)]
+
+    with pytest.raises(RuntimeError):
+        BrokenRepository(connect, 'admin-hash').run_migrations()
+    # SQLite DDL is transactional: the whole run rolled back
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('schema_migrations', 'half_done')")
+    assert cursor.fetchall() == []
+    conn.close()
+
+
+def test_backends_must_implement_the_schema_hooks(connect):
+    with pytest.raises(TypeError):
+        storage.Repository(connect, 'admin-hash')
+
+    class NoAnalyze(storage.Repository):
+        def _lock_schema(self, cursor): pass
+        def _migration_applied(self, conn): pass
+        def _unlock_schema(self, conn, cursor, ok): pass
+
+    with pytest.raises(TypeError, match='analyze'):
+        NoAnalyze(connect, 'admin-hash')
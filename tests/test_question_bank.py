@@ -0,0 +1,55 @@
+import json
+import random
+
+from question_bank import (PoolDraw, draw_positions, format_blueprint, make_spec, paper_seed,
+                           parse_blueprint, validate_blueprint)
+
+SIZES = {('algebra', 'easy'): 40, ('geometry', 'hard'): 3}
+BLUEPRINT = [PoolDraw('algebra', 'easy', 5), PoolDraw('geometry', 'hard', 3)]
+
+
+def test_seed_is_deterministic_per_exam_and_student():
+    assert paper_seed(1, 2) == paper_seed(1, 2)
+    assert len({paper_seed(1, 2), paper_seed(1, 3), paper_seed(2, 2)}) == 3
+    assert 0 <= paper_seed(1, 2) < 2 ** 63
+
+
+def test_draw_is_reproducible_from_seed_and_spec():
+    spec = make_spec(BLUEPRINT, SIZES)
+    draws = draw_positions(1234, spec)
+    assert draws == draw_positions(1234, spec)
+    # exactly what a Random seeded the same way draws, pool by pool
+    rng = random.Random(1234)
+    assert draws == [('algebra', 'easy', rng.sample(range(40), 5)),
+                     ('geometry', 'hard', rng.sample(range(3), 3))]
+    assert draws != draw_positions(1235, spec)
+
+
+def test_spec_freezes_pool_sizes():
+    spec = make_spec(BLUEPRINT, SIZES)
+    assert json.loads(spec)[0] == ['algebra', 'easy', 5, 40]
+    # new questions are appended to the pools, so the stored spec keeps
+    # drawing from the positions that existed when the attempt started
+    for (_, _, positions), draw in zip(draw_positions(7, spec), BLUEPRINT):
+        assert len(set(positions)) == draw.count
+        assert max(positions) < SIZES[(draw.topic, draw.difficulty)]
+
+
+def test_spec_clamps_draws_to_the_pool():
+    spec = make_spec([PoolDraw('geometry', 'hard', 10), PoolDraw('missing', '', 2)], SIZES)
+    assert [len(p) for _, _, p in draw_positions(1, spec)] == [3, 0]
+
+
+def test_blueprint_round_trip_and_validation():
+    assert parse_blueprint(format_blueprint(BLUEPRINT)) == BLUEPRINT
+    assert parse_blueprint('') == []
+    assert validate_blueprint(BLUEPRINT, SIZES) == []
+    problems = validate_blueprint(
+        [PoolDraw('geometry', 'hard', 4), PoolDraw('geometry', 'hard', 1), PoolDraw('x', 'tricky', 0)], SIZES
+    )
+    assert problems == [
+        "geometry / hard: only 3 questions in the pool",
+        "geometry / hard is listed twice",
+        "x / tricky: difficulty must be one of easy, medium, hard",
+        "x / tricky: count must be at least 1",
+    ]
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+import question_import
+from question_import import ImportFormatError
+
+
+def _json_rows(text):
+    return list(question_import.iter_raw_rows(io.BytesIO(text.encode()), 'json'))
+
+
+def test_json_array_is_streamed_item_by_item():
+    rows = _json_rows('[ {"question_text": "a"},\n{"question_text": "b"} ]')
+    assert rows == [(1, {'question_text': 'a'}), (2, {'question_text': 'b'})]
+    assert _json_rows('[]') == []
+
+
+@pytest.mark.parametrize('text', [
+    '[{"question_text": "a"} {"question_text": "b"}]',
+    '[{"question_text": "a"}\n{"question_text": "b"}]',
+    '[{"question_text": "a"},]',
+    '[,{"question_text": "a"}]',
+    '[{"question_text": "a"}',
+    '{"question_text": "a"}',
+])
+def test_malformed_json_array_is_rejected(text):
+    with pytest.raises(ImportFormatError):
+        _json_rows(text)
+
+
+def _question(text, correct='A'):
+    return (text, 'w', 'x', 'y', 'z', correct, 1, '', '')
+
+
+def test_rejected_row_is_retried_alone_and_the_rest_of_its_batch_commits(repo, exam):
+    _, exam_id = exam
+    errors = []
+    rows = [
+        (2, _question('first'), None),
+        # passed validation but fails the CHECK constraint on correct_answer
+        (3, _question('bad', correct='E'), None),
+        (4, _question('third'), None),
+        (5, None, 'marks must be at least 1'),
+        (6, _question('fourth'), None),
+    ]
+    inserted = repo.import_questions(exam_id, iter(rows), 3, lambda n, msg: errors.append((n, msg)))
+
+    assert inserted == 3
+    assert [n for n, _ in errors] == [3, 5]
+    assert errors[0][1].startswith('rejected by database:')
+    texts = [q['question_text'] for q in repo.exam_questions(exam_id)]
+    assert texts[2:] == ['first', 'third', 'fourth']
+    assert sum(repo.pool_sizes(exam_id).values()) == 5
+
+
+def test_import_into_missing_exam_raises(repo):
+    with pytest.raises(LookupError):
+        repo.import_questions(999, iter([(2, _question('q'), None)]), 10, lambda n, msg: None)
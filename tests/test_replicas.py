@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+import online
+
+
+class _SessionState(dict):
+    # attribute access like st.session_state
+    __getattr__ = dict.get
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def _write(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """online.py wired to a primary SQLite file and one read-only replica
+    copy of it, inside a (fake) script-run session."""
+    primary = str(tmp_path / 'primary.db')
+    replica = str(tmp_path / 'replica.db')
+    monkeypatch.setattr(online, 'STORAGE_BACKEND', 'sqlite')
+    monkeypatch.setattr(online, 'SQLITE_PATH', primary)
+    monkeypatch.setattr(online, 'DB_REPLICAS', [replica])
+    monkeypatch.setattr(online, 'READ_YOUR_WRITES_SECONDS', 60)
+    monkeypatch.setattr(online, 'METRICS_ENABLED', False)
+    monkeypatch.setattr(online, '_in_session', lambda: True)
+    monkeypatch.setattr(online.st, 'session_state', _SessionState())
+
+    pool = online._ConnectionPool(online._open_raw_connection, 2, 0, 1)
+    router = online._ReplicaRouter([replica], retry_after=60, acquire_timeout=0.1)
+    repository = online._make_repository(online.create_connection, connect_read=online.create_read_connection)
+    monkeypatch.setattr(online, 'get_connection_pool', lambda: pool)
+    monkeypatch.setattr(online, 'get_replica_router', lambda: router)
+    monkeypatch.setattr(online, 'get_repository', lambda: repository)
+    repository.run_migrations()
+
+    def copy_to_replica():
+        source, target = sqlite3.connect(primary), sqlite3.connect(replica)
+        source.backup(target)
+        source.close()
+        target.close()
+    copy_to_replica()
+    return repository, router, primary, replica
+
+
+def test_reads_go_to_the_replica(replicated):
+    repository, router, _, replica = replicated
+    # a user only the replica has: the read must have been served there
+    _write(replica, "INSERT INTO users (username, password, user_type, full_name) "
+                    "VALUES ('rita', 'pw', 'student', 'Rita')")
+    assert repository.authenticate('rita', 'pw', 'student')['full_name'] == 'Rita'
+    assert (router.stats()['replica_reads'], router.stats()['primary_reads']) == (1, 0)
+
+
+def test_primary_reads_do_not_make_the_session_sticky(replicated):
+    repository, router, _, _ = replicated
+    # attempt state and cache misses read the primary without writing
+    repository.exam_questions(1)
+    repository.pool_sizes(1)
+    assert 'primary_reads_until' not in online.st.session_state
+    repository.authenticate('admin', 'x', 'admin')
+    assert router.stats()['replica_reads'] == 1
+
+
+def test_session_reads_its_own_writes_from_the_primary(replicated):
+    repository, router, _, _ = replicated
+    assert online.register_student('bob', 'secret', 'Bob', 'bob@example.com')
+    assert online.st.session_state.primary_reads_until is not None
+    # the replica has not caught up, but this session still sees bob
+    assert repository.authenticate('bob', online.hash_password('secret'), 'student')['username'] == 'bob'
+    assert (router.stats()['replica_reads'], router.stats()['primary_reads']) == (0, 1)
+
+
+def test_dead_replica_falls_back_to_the_primary(replicated, tmp_path):
+    repository, router, primary, replica = replicated
+    _write(primary, "INSERT INTO users (username, password, user_type, full_name) "
+                    "VALUES ('pat', 'pw', 'student', 'Pat')")
+    (tmp_path / 'replica.db').unlink()
+    assert repository.authenticate('pat', 'pw', 'student')['username'] == 'pat'
+    stats = router.stats()
+    assert (stats['replica_failures'], stats['primary_reads'], stats['replica_reads']) == (1, 1, 0)
+    assert stats['replicas'][replica]['down'] is True
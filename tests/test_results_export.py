@@ -0,0 +1,75 @@
+import csv
+import io
+
+import pytest
+
+import online
+import results_export
+import storage
+
+
+class _TrackingConn:
+    # records the cursors opened on a connection so the test can see the
+    # stream cursor was closed
+    def __init__(self, conn, cursors):
+        self._conn = conn
+        self._cursors = cursors
+
+    def cursor(self, dictionary=False, stream=False):
+        cursor = self._conn.cursor(dictionary=dictionary, stream=stream)
+        self._cursors.append((stream, cursor))
+        original = cursor.close
+
+        def close():
+            cursor.closed = True
+            original()
+        cursor.closed = False
+        cursor.close = close
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@pytest.fixture
+def streamed(connect, repo, exam, monkeypatch):
+    student_id, exam_id = exam
+    for score in range(23):
+        repo.insert_result(student_id, exam_id, score % 3, 2)
+    cursors = []
+    tracking = storage.SQLiteRepository(lambda: _TrackingConn(connect(), cursors), 'admin-hash')
+    monkeypatch.setattr(online, 'get_repository', lambda: tracking)
+    monkeypatch.setattr(online, 'EXPORT_BATCH_SIZE', 5)
+    return cursors
+
+
+def test_csv_export_streams_every_batch_and_closes_the_cursor(streamed):
+    out = io.StringIO()
+    assert online.export_results(out, 'csv') == 23
+
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert tuple(rows[0]) == results_export.EXPORT_COLUMNS
+    assert len(rows) == 24
+    assert [row[0] for row in rows[1:]] == [str(i) for i in range(1, 24)]
+    assert (rows[1][3], rows[1][5]) == ('Algebra', 'alice')
+    # one streaming cursor, closed once the batches ran out
+    assert [(stream, cursor.closed) for stream, cursor in streamed] == [(True, True)]
+
+
+def test_stream_cursor_is_closed_when_the_writer_fails(streamed):
+    class Broken(io.StringIO):
+        def write(self, s):
+            if self.tell() > 200:
+                raise OSError("disk full")
+            return super().write(s)
+
+    with pytest.raises(OSError):
+        online.export_results(Broken(), 'csv')
+    assert [(stream, cursor.closed) for stream, cursor in streamed] == [(True, True)]
+
+
+def test_write_csv_counts_rows_across_batches():
+    batches = iter([[(1,) * 10] * 4, [], [(2,) * 10] * 3])
+    out = io.StringIO()
+    assert results_export.write_csv(batches, out) == 7
+    assert out.getvalue().count('\n') == 8
@@ -0,0 +1,91 @@
+from datetime import date
+
+import pytest
+
+import storage
+
+
+def _backdate(repo, submitted_at):
+    # results default to CURRENT_TIMESTAMP; move the newest one to a fixed time
+    conn = repo._connect()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE results SET submitted_at = %s WHERE id = (SELECT MAX(id) FROM results)", (submitted_at,))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def results(repo, exam):
+    student_id, exam_id = exam
+    admin = repo.authenticate('admin', 'admin-hash', 'admin')
+    other = repo.create_exam('Geometry', 10, 1, admin['id'], [('Sides of a square?', '3', '4', '5', '6', 'B', 1, '', '')])
+    # Algebra: 0%, 50%, 50%, 100% across January 2026
+    for score, day in [(0, '2026-01-01 09:00:00'), (1, '2026-01-05 00:00:00'),
+                       (1, '2026-01-05 23:59:59'), (2, '2026-01-31 12:00:00')]:
+        repo.insert_result(student_id, exam_id, score, 2)
+        _backdate(repo, day)
+    repo.insert_result(student_id, other, 1, 1)
+    _backdate(repo, '2026-02-01 00:00:00')
+    return exam_id, other
+
+
+def test_results_summary_aggregates_in_sql(repo, results):
+    summary = repo.results_summary()
+    assert summary['submissions'] == 5
+    assert summary['mean_percentage'] == pytest.approx(60.0)
+    assert summary['min_percentage'] == 0.0
+    assert summary['max_percentage'] == 100.0
+    # nearest rank over [0, 50, 50, 100, 100]
+    assert summary['percentiles'] == {25: 50.0, 50: 50.0, 75: 100.0, 90: 100.0}
+
+
+def test_percentiles_from_histogram_use_nearest_rank():
+    histogram = [(10.0, 1), (20.0, 2), (90.0, 1)]
+    assert storage._percentiles_from_histogram(histogram, 4, (1, 25, 50, 75, 100)) == {
+        1: 10.0, 25: 10.0, 50: 20.0, 75: 20.0, 100: 90.0,
+    }
+
+
+def test_results_by_exam(repo, results):
+    algebra, geometry = results
+    rows = repo.results_by_exam()
+    assert [(r['exam_id'], r['exam_name'], r['submissions']) for r in rows] == [
+        (algebra, 'Algebra', 4), (geometry, 'Geometry', 1),
+    ]
+    assert rows[0]['mean_percentage'] == pytest.approx(50.0)
+    assert rows[0]['max_percentage'] == 100.0
+    assert rows[1]['mean_percentage'] == 100.0
+
+
+def test_date_to_includes_the_whole_day(repo, results):
+    # submitted_at is text in SQLite; '2026-01-05 23:59:59' < '2026-01-06'
+    summary = repo.results_summary(date_from=date(2026, 1, 5), date_to=date(2026, 1, 5))
+    assert summary['submissions'] == 2
+    assert summary['mean_percentage'] == 50.0
+
+    assert repo.results_summary(date_to=date(2026, 1, 31))['submissions'] == 4
+    assert repo.results_summary(date_from=date(2026, 2, 1))['submissions'] == 1
+    by_exam = repo.results_by_exam(date_from=date(2026, 1, 2), date_to=date(2026, 1, 30))
+    assert [(r['exam_name'], r['submissions']) for r in by_exam] == [('Algebra', 2)]
+
+
+def test_filters_by_exam_and_student(repo, results):
+    algebra, _ = results
+    assert repo.results_summary(exam_id=algebra)['submissions'] == 4
+    assert repo.results_summary(student_id=-1) == {
+        'submissions': 0, 'percentiles': {},
+        'mean_percentage': None, 'min_percentage': None, 'max_percentage': None,
+    }
+    assert repo.results_by_exam(student_id=-1) == []
+
+
+def test_zero_total_marks_does_not_divide_by_zero(repo, exam):
+    student_id, exam_id = exam
+    repo.insert_result(student_id, exam_id, 0, 0)
+    summary = repo.results_summary()
+    assert summary['submissions'] == 1
+    assert summary['mean_percentage'] is None
+    assert summary['percentiles'] == {}
+    (row,) = repo.results_by_exam()
+    assert row['submissions'] == 1
+    assert row['mean_percentage'] is None and row['max_percentage'] is None
@@ -0,0 +1,134 @@
+import socket
+import threading
+
+import pytest
+
+from shared_cache import ReadCache, RESPBackend, SQLiteBackend, StandInServer
+
+
+class _Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture(scope='module')
+def stand_in():
+    server = StandInServer(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['sqlite', 'resp'])
+def backends(request, tmp_path, stand_in):
+    """Two backend connections to one shared store, as two workers have."""
+    if request.param == 'sqlite':
+        path = str(tmp_path / 'cache.db')
+        pair = [SQLiteBackend(path), SQLiteBackend(path)]
+    else:
+        with stand_in.lock:
+            stand_in.data.clear()
+        host, port = stand_in.server_address
+        pair = [RESPBackend(host, port), RESPBackend(host, port)]
+    yield pair
+    for backend in pair:
+        backend.close()
+
+
+def test_process_cache_reloads_after_invalidation():
+    cache = ReadCache(10)
+    loader = _Loader(['exam'])
+    assert cache.get_or_load('exams', loader) == ['exam']
+    assert cache.get_or_load('exams', loader) == ['exam']
+    assert loader.calls == 1
+    cache.invalidate('exams')
+    cache.get_or_load('exams', loader)
+    assert loader.calls == 2
+
+
+def test_failed_loads_are_not_cached():
+    cache = ReadCache(10)
+    assert cache.get_or_load('exams', lambda: None) is None
+    assert cache.get_or_load('exams', _Loader([1])) == [1]
+
+
+def test_lru_bound_and_kinds_share_a_scope():
+    cache = ReadCache(2)
+    cache.get_or_load(('questions', 1), _Loader('rows'))
+    cache.get_or_load(('questions', 1), _Loader('key'), kind='answer_key')
+    cache.get_or_load(('questions', 2), _Loader('rows'))
+    assert cache.stats()['evictions'] == 1
+    cache.invalidate(('questions', 2))
+    assert cache.stats()['entries'] == 1
+
+
+def test_values_and_invalidations_are_shared_between_workers(backends):
+    first, second = (ReadCache(10, backend) for backend in backends)
+    loader = _Loader({'id': 1})
+    assert first.get_or_load(('questions', 1), loader) == {'id': 1}
+    # the second worker reads the stored value instead of the database
+    assert second.get_or_load(('questions', 1), loader) == {'id': 1}
+    assert loader.calls == 1
+    assert second.stats()['shared_hits'] == 1
+
+    first.invalidate(('questions', 1))
+    loader.value = {'id': 2}
+    assert second.get_or_load(('questions', 1), loader) == {'id': 2}
+    assert first.get_or_load(('questions', 1), loader) == {'id': 2}
+    assert loader.calls == 2
+
+
+def test_invalidation_during_a_load_is_not_cached(backends):
+    first, second = (ReadCache(10, backend) for backend in backends)
+
+    def racing_loader():
+        # another worker writes while this one is reading the old rows
+        second.invalidate('exams')
+        return ['old']
+
+    assert first.get_or_load('exams', racing_loader) == ['old']
+    assert first.get_or_load('exams', _Loader(['new'])) == ['new']
+
+
+def test_backend_counter_increments(backends):
+    backend = backends[0]
+    assert [backend.incr('counter') for _ in range(3)] == [1, 2, 3]
+    assert int(backends[1].get('counter')) == 3
+
+
+def test_unreachable_store_falls_through_to_the_loader():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    cache = ReadCache(10, RESPBackend('127.0.0.1', port, timeout=0.2))
+    loader = _Loader(['rows'])
+    assert cache.get_or_load('exams', loader) == ['rows']
+    assert cache.get_or_load('exams', loader) == ['rows']
+    assert loader.calls == 2
+    cache.invalidate('exams')
+    assert cache.stats()['backend_errors'] == 3
+
+
+def test_sqlite_counter_increments_are_not_lost_between_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    backends = [SQLiteBackend(path) for _ in range(4)]
+
+    def bump(backend):
+        for _ in range(50):
+            backend.incr('version')
+
+    threads = [threading.Thread(target=bump, args=(backend,)) for backend in backends]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert int(backends[0].get('version')) == 200
+    for backend in backends:
+        backend.close()
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+import write_behind
+
+
+def _record(n, student_id=1, exam_id=1):
+    return {'id': f'sub-{n}', 'student_id': student_id, 'exam_id': exam_id,
+            'score': n, 'total_marks': 10, 'submitted_at': '2024-01-01 09:00:00'}
+
+
+def _write_journal(path, records, tail=b''):
+    with open(path, 'wb') as f:
+        for r in records:
+            f.write(json.dumps(r).encode() + b'\n')
+        f.write(tail)
+
+
+def _collecting_flush():
+    flushed = []
+    done = threading.Event()
+
+    def flush(batch):
+        flushed.extend(batch)
+        done.set()
+    return flushed, done, flush
+
+
+def test_read_journal_skips_torn_last_line(tmp_path):
+    path = tmp_path / 'journal-1-1.jsonl'
+    _write_journal(path, [_record(1), _record(2)], tail=b'{"id": "sub-3", "stud')
+    assert [r['id'] for r in write_behind.read_journal(path)] == ['sub-1', 'sub-2']
+
+
+def test_orphan_journal_is_replayed_and_removed(tmp_path):
+    orphan = tmp_path / 'journal-99999-1.jsonl'
+    _write_journal(orphan, [_record(1), _record(2)], tail=b'{"id": "torn')
+    flushed, done, flush = _collecting_flush()
+    queue = write_behind.WriteBehindQueue(str(tmp_path), flush, linger=0).start()
+    try:
+        assert done.wait(5)
+        assert [r['id'] for r in flushed] == ['sub-1', 'sub-2']
+        assert not orphan.exists()
+        assert queue.stats()['replayed'] == 2
+    finally:
+        queue.stop()
+
+
+def test_journal_removed_by_another_worker_is_skipped(tmp_path):
+    assert write_behind._try_lock(str(tmp_path / 'journal-1-1.jsonl')) is None
+
+
+def test_failed_flush_is_retried_from_the_queue(tmp_path):
+    attempts = []
+    done = threading.Event()
+
+    def flush(batch):
+        attempts.append([r['id'] for r in batch])
+        if len(attempts) == 1:
+            raise RuntimeError('database down')
+        done.set()
+
+    queue = write_behind.WriteBehindQueue(str(tmp_path), flush, linger=0, retry_delay=0.01).start()
+    try:
+        queue.submit(_record(1))
+        assert done.wait(5)
+        assert attempts == [['sub-1'], ['sub-1']]
+        assert queue.stats()['flush_failures'] == 1
+    finally:
+        queue.stop()
+
+
+def test_is_pending_sees_other_workers_journals(tmp_path):
+    blocked = threading.Event()
+    queue = write_behind.WriteBehindQueue(str(tmp_path), lambda batch: blocked.wait(5), linger=0).start()
+    try:
+        # a live worker's journal; the queue can't adopt it while it is locked
+        peer = write_behind._Journal(os.path.join(tmp_path, 'journal-99999-1.jsonl'))
+        peer.append([_record(1, student_id=7, exam_id=3)])
+        assert queue.is_pending(7, 3)
+        assert not queue.is_pending(7, 4)
+        peer.truncate()
+        assert not queue.is_pending(7, 3)
+        peer.close()
+
+        queue.submit(_record(2, student_id=8, exam_id=3))
+        assert queue.is_pending(8, 3)
+    finally:
+        blocked.set()
+        queue.stop()
+
+
+def test_replayed_records_are_inserted_once(repo, exam):
+    student_id, exam_id = exam
+    records = [_record(1, student_id, exam_id), _record(2, student_id, exam_id)]
+    repo.insert_results_idempotent(records)
+    # a crash before the journal was truncated replays the same records
+    repo.insert_results_idempotent(records + [_record(3, student_id, exam_id)])
+
+    assert repo.results_summary(exam_id=exam_id)['submissions'] == 3
+    leaderboard = repo.exam_leaderboard(exam_id)
+    assert [row['score'] for row in leaderboard] == [3, 2, 1]
+    # replayed records must not count twice in the score distribution
+    assert {r['standing'].submissions for r in repo.student_results(student_id)} == {3}
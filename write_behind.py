@@ -0,0 +1,287 @@
+"""Durable write-behind queue for exam submissions.
+
+A submission is acknowledged once it has been appended (and fsynced) to a
+per-process journal file. A background thread then writes queued records
+to the database in groups through the `flush` callback, so an end-of-exam
+burst turns into a few multi-row transactions instead of hundreds of
+single-row ones.
+
+Every record carries a unique id and `flush` must be idempotent on it
+(online.py uses INSERT IGNORE on results.submission_id). Replaying a
+journal after a crash is therefore always safe: records written before the
+crash are ignored and the rest are inserted.
+
+Journal files are named journal-<pid>-<start time>.jsonl. While a process
+runs it holds an exclusive lock on its own file; at start-up any journal
+that is not locked belongs to a dead process and is adopted and replayed.
+Without fcntl (Windows) every other journal in the directory is adopted,
+so only one app process should share a journal directory there.
+
+A journal only ever holds records that are queued or already written, so
+is_pending() also looks at the other processes' journals in the directory:
+a student whose submission is still queued in another worker counts as
+having taken the exam there too.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Rewrite the journal with only the pending records once it grows past this
+COMPACT_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+
+class _Journal:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, records):
+        data = b''.join(json.dumps(r, separators=(',', ':')).encode() + b'\n' for r in records)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def truncate(self):
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def rewrite(self, records):
+        # write the survivors to a temp file and swap it in atomically; the
+        # lock moves with the new file handle
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            for r in records:
+                f.write(json.dumps(r, separators=(',', ':')).encode() + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        new_file = open(tmp, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(new_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(tmp, self.path)
+        self._file.close()
+        self._file = new_file
+
+    def close(self):
+        self._file.close()
+
+
+def read_journal(path):
+    """Records in a journal file; a torn last line (crash mid-write) is skipped."""
+    records = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def _try_lock(path):
+    # returns an open, exclusively locked handle if no live process owns the
+    # file; None if it is owned, or if another process starting at the same
+    # time has already replayed and removed it
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # the lock may be on a file that was removed after we opened it
+        if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+            return f
+    except OSError:
+        pass
+    f.close()
+    return None
+
+
+def _record_key(record):
+    return (record['student_id'], record['exam_id'])
+
+
+class WriteBehindQueue:
+    def __init__(self, journal_dir, flush, batch_size=500, linger=0.2, retry_delay=2.0):
+        self._dir = journal_dir
+        self._flush = flush
+        self._batch_size = batch_size
+        self._linger = linger
+        self._retry_delay = retry_delay
+        self._pending = []
+        self._pending_keys = {}
+        # other processes' journals: path -> ((size, mtime), {(student_id, exam_id)})
+        self._peer_keys = {}
+        self._peer_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._journal = None
+        self._stats = {
+            'acknowledged': 0,
+            'replayed': 0,
+            'flushed': 0,
+            'batches': 0,
+            'flush_failures': 0,
+            'last_error': None,
+        }
+
+    def start(self):
+        os.makedirs(self._dir, exist_ok=True)
+        name = f"journal-{os.getpid()}-{int(time.time() * 1000)}.jsonl"
+        self._journal = _Journal(os.path.join(self._dir, name))
+        self._adopt_orphans()
+        self._thread = threading.Thread(target=self._run, name='submission-write-behind', daemon=True)
+        self._thread.start()
+        return self
+
+    def _adopt_orphans(self):
+        for name in sorted(os.listdir(self._dir)):
+            path = os.path.join(self._dir, name)
+            if not name.endswith('.jsonl') or path == self._journal.path:
+                continue
+            handle = _try_lock(path)
+            if handle is None:
+                continue
+            try:
+                records = read_journal(path)
+                if records:
+                    with self._cond:
+                        self._journal.append(records)
+                        for r in records:
+                            self._add_pending(r)
+                        self._stats['replayed'] += len(records)
+                os.remove(path)
+            finally:
+                handle.close()
+
+    def _add_pending(self, record):
+        self._pending.append(record)
+        key = _record_key(record)
+        self._pending_keys[key] = self._pending_keys.get(key, 0) + 1
+
+    def _drop_pending(self, count):
+        for record in self._pending[:count]:
+            key = _record_key(record)
+            self._pending_keys[key] -= 1
+            if not self._pending_keys[key]:
+                del self._pending_keys[key]
+        del self._pending[:count]
+
+    def submit(self, record):
+        """Durably journal a record and queue it for the database. Returns
+        the record's id once it is safe on disk."""
+        record = dict(record, id=record.get('id') or uuid.uuid4().hex)
+        with self._cond:
+            self._journal.append([record])
+            self._add_pending(record)
+            self._stats['acknowledged'] += 1
+            self._cond.notify()
+        return record['id']
+
+    def is_pending(self, student_id, exam_id):
+        """True while a submission for the student and exam is queued here
+        or in the journal of another process sharing the directory. Records
+        the other process has already written may still be in its journal,
+        which only makes this true for an exam that is taken anyway."""
+        key = (student_id, exam_id)
+        with self._cond:
+            if key in self._pending_keys:
+                return True
+        with self._peer_lock:
+            return key in self._peer_pending_keys()
+
+    def _peer_pending_keys(self):
+        # re-read a peer journal only when its size or mtime changed
+        keys = set()
+        seen = {}
+        try:
+            names = os.listdir(self._dir)
+        except OSError:
+            return keys
+        for name in names:
+            path = os.path.join(self._dir, name)
+            if not name.endswith('.jsonl') or path == self._journal.path:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if not st.st_size:
+                continue
+            version = (st.st_size, st.st_mtime_ns)
+            cached = self._peer_keys.get(path)
+            if cached is None or cached[0] != version:
+                try:
+                    cached = (version, {_record_key(r) for r in read_journal(path)})
+                except FileNotFoundError:
+                    continue
+            seen[path] = cached
+            keys |= cached[1]
+        self._peer_keys = seen
+        return keys
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    return
+                # linger briefly so a burst is written as one group
+                deadline = time.monotonic() + self._linger
+                while len(self._pending) < self._batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self._batch_size]
+            try:
+                self._flush(batch)
+            except Exception as e:
+                with self._cond:
+                    self._stats['flush_failures'] += 1
+                    self._stats['last_error'] = str(e)
+                    if self._stopping:
+                        return
+                time.sleep(self._retry_delay)
+                continue
+            with self._cond:
+                # submit() only appends, so the batch is still the queue head
+                self._drop_pending(len(batch))
+                self._stats['flushed'] += len(batch)
+                self._stats['batches'] += 1
+                if not self._pending:
+                    self._journal.truncate()
+                elif self._journal.size() > COMPACT_THRESHOLD_BYTES:
+                    self._journal.rewrite(self._pending)
+
+    def stop(self, timeout=10):
+        """Flush what is queued (best effort within `timeout`) and stop the
+        worker. Anything left stays in the journal for the next start."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['journal_bytes'] = self._journal.size() if self._journal else 0
+        return stats